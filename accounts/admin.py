@@ -1,6 +1,43 @@
 from django.contrib import admin
 from django.contrib.auth import get_user_model
 
+from . import bulk, tasks
+from .models import FriendShip
+
 User = get_user_model()
 
-admin.site.register(User)
+
+@admin.register(User)
+class UserAdmin(admin.ModelAdmin):
+    list_display = ["username", "email", "is_active", "tweet_count", "follower_count", "date_joined"]
+    list_filter = ["is_active", "is_staff"]
+    search_fields = ["username", "email"]
+    actions = ["deactivate", "purge", "delete"]
+
+    def get_actions(self, request):
+        # The stock action deletes row by row in one transaction; "delete" below replaces it.
+        actions = super().get_actions(request)
+        actions.pop("delete_selected", None)
+        return actions
+
+    @admin.action(description="選択されたユーザーを無効化", permissions=["change"])
+    def deactivate(self, request, queryset):
+        count = bulk.deactivate_users(list(queryset.values_list("pk", flat=True)))
+        self.message_user(request, f"{count} 人のユーザーを無効化しました。")
+
+    @admin.action(description="選択されたユーザーのツイート・いいね・フォローを削除", permissions=["delete"])
+    def purge(self, request, queryset):
+        for user_id in queryset.values_list("pk", flat=True):
+            tasks.purge_user.enqueue(user_id=user_id, idempotency_key=f"purge-user:{user_id}")
+        self.message_user(request, f"{queryset.count()} 人のユーザーのデータ削除を開始しました。")
+
+    @admin.action(description="選択されたユーザーを削除", permissions=["delete"])
+    def delete(self, request, queryset):
+        user_ids = list(queryset.values_list("pk", flat=True))
+        bulk.deactivate_users(user_ids)
+        for user_id in user_ids:
+            tasks.delete_user.enqueue(user_id=user_id, idempotency_key=f"delete-user:{user_id}")
+        self.message_user(request, f"{len(user_ids)} 人のユーザーを無効化し、削除を開始しました。")
+
+
+admin.site.register(FriendShip)
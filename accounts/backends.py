@@ -0,0 +1,62 @@
+"""Authentication backend that serves ``request.user`` from the cache.
+
+``AuthenticationMiddleware`` calls ``get_user()`` on every request. The loaded user is cached by id
+and dropped whenever the user is saved or deleted (see ``accounts.signals``), so a page view no
+longer pays for the ``accounts_user`` SELECT. Queryset ``update()`` calls bypass the signal: the
+denormalized counters on ``request.user`` may lag by up to ``USER_CACHE_TIMEOUT``, and code that
+changes other fields with ``update()`` must call :func:`invalidate_user` itself.
+
+:func:`aauthenticate` is ``authenticate()`` for the async views, with the password hashing in a
+worker thread (see ``accounts.hashers``).
+"""
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.signals import user_login_failed
+from django.core.cache import caches
+
+from .hashers import acheck_password, amake_password
+
+
+def _user_key(user_id):
+    return f"accounts:user:{user_id}"
+
+
+def invalidate_user(user_id):
+    caches[settings.USER_CACHE].delete(_user_key(user_id))
+
+
+class CachedModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        cache = caches[settings.USER_CACHE]
+        key = _user_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(key, user, settings.USER_CACHE_TIMEOUT)
+        return user
+
+
+async def aauthenticate(request, username, password):
+    """Return the active user with these credentials, or ``None``, like ``CachedModelBackend``."""
+    UserModel = get_user_model()
+    backend = CachedModelBackend()
+    try:
+        user = await UserModel._default_manager.aget(**{UserModel.USERNAME_FIELD: username})
+    except UserModel.DoesNotExist:
+        # Hash anyway so that the response time does not tell whether the username exists.
+        await amake_password(password)
+        user = None
+    else:
+        if not (await acheck_password(user, password) and backend.user_can_authenticate(user)):
+            user = None
+    if user is None:
+        await sync_to_async(user_login_failed.send)(
+            sender=__name__, credentials={"username": username, "password": "********************"}, request=request
+        )
+        return None
+    user.backend = f"{backend.__module__}.{type(backend).__qualname__}"
+    return user
@@ -0,0 +1,159 @@
+"""Bulk moderation: deactivating users and removing tweets, likes, follows and whole accounts.
+
+``Model.delete()`` collects every dependent row and sends one signal per row, so removing a large
+account runs hundreds of thousands of queries inside a single transaction. These helpers instead
+delete in primary-key batches of set-based ``DELETE``/``UPDATE`` statements, one short transaction
+per batch, bypassing the per-row signals. What those signals would have done (the counters in
+``mysite.counters``, tweet card and viewer caches, the search index, the follow graph and the home
+timelines) is applied per batch instead; the trending counts are dropped once the tweets or likes
+are gone, to be recounted by the next refresh.
+
+The generators yield ``(step, rows done)`` after each batch so callers can report progress.
+"""
+
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from mysite import counters
+from tweets import cards, conditional, search, trending, viewer_state
+from tweets.models import Attachment, Like, TimelineEntry, Tweet, TweetHashtag
+
+from . import graph
+from .backends import invalidate_user
+from .models import FriendShip, User
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def _raw_delete(queryset):
+    """One ``DELETE`` for a model with delete signal receivers (tweets, likes, follows).
+
+    ``QuerySet.delete()`` sends the receivers one signal per row, so this skips the deletion collector
+    through the private ``QuerySet._raw_delete()`` (unchanged since Django 1.9; check it on upgrades).
+    Callers remove the dependent rows and do the receivers' work themselves. Models without receivers
+    or dependents are deleted with ``QuerySet.delete()``, which Django turns into a single ``DELETE``.
+    """
+    return queryset._raw_delete(queryset.db)
+
+
+def _batches(queryset, fields, batch_size):
+    """Yield lists of ``fields`` tuples of ``queryset`` in primary-key order.
+
+    The rows of each batch are expected to be deleted before the next one is read, so every batch
+    simply reads the lowest remaining primary keys.
+    """
+    while rows := list(queryset.order_by("pk").values_list("pk", *fields)[:batch_size]):
+        yield rows
+
+
+def deactivate_users(user_ids):
+    """Deactivate users in one ``UPDATE``; they are logged out on their next request."""
+    count = User.objects.filter(pk__in=user_ids, is_active=True).update(is_active=False)
+    for user_id in user_ids:
+        invalidate_user(user_id)
+    return count
+
+
+def _delete_tweet_batch(tweet_ids):
+    liker_ids = set(Like.objects.filter(tweet_id__in=tweet_ids).values_list("user_id", flat=True))
+    _raw_delete(Like.objects.filter(tweet_id__in=tweet_ids))
+    TimelineEntry.objects.filter(tweet_id__in=tweet_ids).delete()
+    TweetHashtag.objects.filter(tweet_id__in=tweet_ids).delete()
+    # The files stay until purge_attachments: other tweets may share them.
+    Attachment.objects.filter(tweet_id__in=tweet_ids).delete()
+    search.remove_tweets(tweet_ids)
+    deleted = _raw_delete(Tweet.objects.filter(pk__in=tweet_ids))
+    for tweet_id in tweet_ids:
+        cards.invalidate_tweet(tweet_id)
+    for user_id in liker_ids:
+        conditional.invalidate_viewer(user_id)
+    return deleted
+
+
+def delete_tweets(queryset, batch_size=DEFAULT_BATCH_SIZE):
+    """Delete the tweets of ``queryset`` with their likes, timeline entries and index entries."""
+    done = 0
+    for rows in _batches(queryset, ["user_id"], batch_size):
+        with transaction.atomic():
+            _delete_tweet_batch([pk for pk, _ in rows])
+            for user_id, count in Counter(user_id for _, user_id in rows).items():
+                counters.adjust(User, user_id, tweet_count=-count)
+                conditional.invalidate_author(user_id)
+        done += len(rows)
+        yield "tweets", done
+    if done:
+        trending.invalidate()
+
+
+def delete_likes(user, batch_size=DEFAULT_BATCH_SIZE):
+    """Remove every like given by ``user`` and decrement the liked tweets' counters."""
+    done = 0
+    for rows in _batches(Like.objects.filter(user=user), ["tweet_id"], batch_size):
+        tweet_ids = [tweet_id for _, tweet_id in rows]
+        with transaction.atomic():
+            _raw_delete(Like.objects.filter(pk__in=[pk for pk, _ in rows]))
+            # A user likes a tweet at most once, so every tweet of the batch loses exactly one like.
+            Tweet.objects.filter(pk__in=tweet_ids).update(like_count=Greatest(F("like_count") - 1, 0))
+        for tweet_id in tweet_ids:
+            cards.invalidate_tweet(tweet_id)
+        done += len(rows)
+        yield "likes", done
+    conditional.invalidate_viewer(user.pk)
+    if done:
+        trending.invalidate()
+
+
+def delete_follows(user, batch_size=DEFAULT_BATCH_SIZE):
+    """Remove ``user`` from the follow graph in both directions, keeping counters and caches in step."""
+    done = 0
+    for rows in _batches(FriendShip.objects.filter(follower=user), ["following_id"], batch_size):
+        following_ids = [following_id for _, following_id in rows]
+        with transaction.atomic():
+            _raw_delete(FriendShip.objects.filter(pk__in=[pk for pk, _ in rows]))
+            User.objects.filter(pk__in=following_ids).update(follower_count=Greatest(F("follower_count") - 1, 0))
+            counters.adjust(User, user.pk, following_count=-len(rows))
+        for following_id in following_ids:
+            graph.remove_edge(user.pk, following_id)
+        done += len(rows)
+        yield "following", done
+    viewer_state.invalidate_following(user.pk)
+    conditional.invalidate_viewer(user.pk)
+
+    done = 0
+    for rows in _batches(FriendShip.objects.filter(following=user), ["follower_id"], batch_size):
+        follower_ids = [follower_id for _, follower_id in rows]
+        with transaction.atomic():
+            _raw_delete(FriendShip.objects.filter(pk__in=[pk for pk, _ in rows]))
+            User.objects.filter(pk__in=follower_ids).update(following_count=Greatest(F("following_count") - 1, 0))
+            counters.adjust(User, user.pk, follower_count=-len(rows))
+            TimelineEntry.objects.filter(owner_id__in=follower_ids, tweet__user=user).delete()
+        for follower_id in follower_ids:
+            viewer_state.invalidate_following(follower_id)
+            conditional.invalidate_viewer(follower_id)
+            graph.remove_edge(follower_id, user.pk)
+        done += len(rows)
+        yield "followers", done
+
+
+def purge_user(user, batch_size=DEFAULT_BATCH_SIZE):
+    """Remove all of ``user``'s tweets, likes and follows but keep the account."""
+    yield from delete_tweets(Tweet.objects.filter(user=user), batch_size)
+    yield from delete_likes(user, batch_size)
+    yield from delete_follows(user, batch_size)
+    done = 0
+    for rows in _batches(TimelineEntry.objects.filter(owner=user), [], batch_size):
+        TimelineEntry.objects.filter(pk__in=[row[0] for row in rows]).delete()
+        done += len(rows)
+        yield "timeline", done
+
+
+def delete_user(user, batch_size=DEFAULT_BATCH_SIZE):
+    """Deactivate ``user``, purge everything they own in batches, then delete the account row."""
+    deactivate_users([user.pk])
+    yield from purge_user(user, batch_size)
+    # Only small relations (sessions aside, which expire) are left for the regular cascade.
+    User.objects.filter(pk=user.pk).delete()
+    yield "user", 1
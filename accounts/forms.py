@@ -1,10 +1,51 @@
+from asgiref.sync import sync_to_async
 from django.contrib.auth import get_user_model
-from django.contrib.auth.forms import UserCreationForm
+from django.contrib.auth.forms import AuthenticationForm, UserCreationForm
+from django.core.exceptions import ValidationError
+
+from .backends import aauthenticate
+from .hashers import amake_password
 
 User = get_user_model()
 
+# The fixed routes of accounts.urls, which share the namespace of the "<username>/" profiles.
+RESERVED_USERNAMES = {"signup", "login", "logout", "export"}
+
 
 class SignupForm(UserCreationForm):
     class Meta:
         model = User
         fields = ("username", "email")
+
+    def clean_username(self):
+        username = super().clean_username()
+        if username and username.lower() in RESERVED_USERNAMES:
+            raise ValidationError("このユーザー名は使用できません。", code="reserved")
+        return username
+
+    async def asave(self):
+        """``save()`` for the async views, with the password hashed in a worker thread."""
+        self.instance.password = await amake_password(self.cleaned_data["password1"])
+        await self.instance.asave()
+        return self.instance
+
+
+class AsyncAuthenticationForm(AuthenticationForm):
+    """``AuthenticationForm`` for the async views; validate it with :meth:`ais_valid`."""
+
+    _authenticated = False
+
+    async def ais_valid(self):
+        username, password = self.data.get("username"), self.data.get("password")
+        if username and password:
+            self.user_cache = await aauthenticate(self.request, username, password)
+            self._authenticated = True
+        return await sync_to_async(self.is_valid)()
+
+    def clean(self):
+        if not self._authenticated:
+            return super().clean()
+        if self.user_cache is None:
+            raise self.get_invalid_login_error()
+        self.confirm_login_allowed(self.user_cache)
+        return self.cleaned_data
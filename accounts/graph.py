@@ -0,0 +1,211 @@
+"""In-memory follow graph for "who to follow" and mutual-follow queries.
+
+Each process keeps the follow table as two adjacency maps of sorted ``array("q")`` user ids
+(followees and followers per user, 8 bytes per edge and direction). Intersections walk the smaller
+list and binary-search the larger one, and 2-hop suggestions count the followees of a sample of
+the user's followees, so neither needs a self-join on ``accounts_friendship``.
+
+The graph is loaded on first use and reloaded when older than ``FOLLOW_GRAPH_MAX_AGE``; follows and
+unfollows committed by this process are applied incrementally in between, so other processes'
+changes show up within that window.
+"""
+
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from heapq import nlargest
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import FriendShip, User
+
+_EMPTY = array("q")
+
+
+def _ids():
+    return array("q")
+
+
+def _insert(ids, value):
+    index = bisect_left(ids, value)
+    if index == len(ids) or ids[index] != value:
+        ids.insert(index, value)
+
+
+def _remove(ids, value):
+    index = bisect_left(ids, value)
+    if index < len(ids) and ids[index] == value:
+        del ids[index]
+
+
+def _contains(ids, value):
+    index = bisect_left(ids, value)
+    return index < len(ids) and ids[index] == value
+
+
+def intersect(a, b):
+    """Sorted intersection of two sorted id arrays."""
+    if len(a) > len(b):
+        a, b = b, a
+    return [value for value in a if _contains(b, value)]
+
+
+class FollowGraph:
+    def __init__(self):
+        self.following = defaultdict(_ids)
+        self.followers = defaultdict(_ids)
+        self.loaded_at = None
+        self._popular = None
+
+    @classmethod
+    def load(cls):
+        graph = cls()
+        edges = FriendShip.objects.order_by("follower_id", "following_id").values_list("follower_id", "following_id")
+        for follower_id, following_id in edges.iterator(chunk_size=10000):
+            graph.following[follower_id].append(following_id)
+            graph.followers[following_id].append(follower_id)
+        for ids in graph.followers.values():
+            ids[:] = array("q", sorted(ids))
+        graph.loaded_at = time.monotonic()
+        return graph
+
+    def add(self, follower_id, following_id):
+        _insert(self.following[follower_id], following_id)
+        _insert(self.followers[following_id], follower_id)
+
+    def remove(self, follower_id, following_id):
+        _remove(self.following.get(follower_id, _EMPTY), following_id)
+        _remove(self.followers.get(following_id, _EMPTY), follower_id)
+
+    def followees_of(self, user_id):
+        return self.following.get(user_id, _EMPTY)
+
+    def followers_of(self, user_id):
+        return self.followers.get(user_id, _EMPTY)
+
+    def mutual_follows(self, user_id):
+        """Users that ``user_id`` follows and who follow back."""
+        return intersect(self.followees_of(user_id), self.followers_of(user_id))
+
+    def followed_by_followees(self, user_id, target_id):
+        """Followees of ``user_id`` that follow ``target_id`` ("followed by X and Y")."""
+        return intersect(self.followees_of(user_id), self.followers_of(target_id))
+
+    def suggestions(self, user_id, limit, sample):
+        """Up to ``limit`` ``(user_id, count)``, most followed among the user's followees first.
+
+        Only ``sample`` of the user's followees (evenly spread over the list) are expanded, which
+        bounds the work for users who follow many accounts. Users without followees get the most
+        followed users, with their follower count.
+        """
+        followees = self.followees_of(user_id)
+        if not followees:
+            return [(candidate, count) for candidate, count in self.popular(limit + 1) if candidate != user_id][:limit]
+        step = max(1, len(followees) // sample)
+        counts = Counter()
+        for followee_id in followees[::step]:
+            counts.update(self.followees_of(followee_id))
+        candidates = (item for item in counts.items() if item[0] != user_id and not _contains(followees, item[0]))
+        return nlargest(limit, candidates, key=_rank)
+
+    def popular(self, limit):
+        """The most followed users as ``(user_id, follower count)``, computed once per load."""
+        if self._popular is None or len(self._popular) < limit:
+            self._popular = nlargest(limit, ((pk, len(ids)) for pk, ids in self.followers.items()), key=_rank)
+        return self._popular[:limit]
+
+
+def _rank(item):
+    # Highest count first; ties go to the older (lower id) account.
+    user_id, count = item
+    return count, -user_id
+
+
+_graph = None
+_pending = None
+_lock = threading.Lock()
+_load_lock = threading.Lock()
+
+
+def _is_fresh(graph):
+    return graph is not None and time.monotonic() - graph.loaded_at <= settings.FOLLOW_GRAPH_MAX_AGE
+
+
+def get_graph():
+    """Return this process's graph, loading or reloading it first if needed.
+
+    While one thread reloads a stale graph, other threads keep reading the old one; edges changed
+    during the reload are replayed onto the new graph.
+    """
+    global _graph, _pending
+    graph = _graph
+    if _is_fresh(graph):
+        return graph
+    if not _load_lock.acquire(blocking=graph is None):
+        return graph
+    try:
+        if _is_fresh(_graph):
+            return _graph
+        with _lock:
+            _pending = []
+        fresh = FollowGraph.load()
+        with _lock:
+            for change in _pending:
+                change(fresh)
+            _graph, _pending = fresh, None
+        return fresh
+    finally:
+        _load_lock.release()
+
+
+def _apply(change):
+    with _lock:
+        if _graph is not None:
+            change(_graph)
+        if _pending is not None:
+            _pending.append(change)
+
+
+def add_edge(follower_id, following_id):
+    _apply(lambda graph: graph.add(follower_id, following_id))
+
+
+def remove_edge(follower_id, following_id):
+    _apply(lambda graph: graph.remove(follower_id, following_id))
+
+
+def reset():
+    global _graph, _pending
+    with _lock:
+        _graph, _pending = None, None
+
+
+def _suggestions_key(user_id):
+    return f"who-to-follow:{user_id}"
+
+
+def who_to_follow(user, exclude=()):
+    """Suggested accounts for ``user`` as ``{"id", "username", "count"}`` dicts, cached per user.
+
+    ``exclude`` (usually the viewer's current followee ids) is applied after the cache, so a
+    suggestion disappears as soon as it is followed. The graph keeps deactivated users' edges; they
+    are left out here.
+    """
+    cache = caches[settings.WHO_TO_FOLLOW_CACHE]
+    key = _suggestions_key(user.pk)
+    suggestions = cache.get(key)
+    if suggestions is None:
+        ranked = get_graph().suggestions(
+            user.pk, settings.WHO_TO_FOLLOW_COUNT * 2, settings.FOLLOW_GRAPH_SUGGESTION_SAMPLE
+        )
+        usernames = dict(
+            User.objects.filter(pk__in=[pk for pk, _ in ranked], is_active=True).values_list("pk", "username")
+        )
+        suggestions = [
+            {"id": pk, "username": usernames[pk], "count": count} for pk, count in ranked if pk in usernames
+        ]
+        cache.set(key, suggestions, settings.WHO_TO_FOLLOW_CACHE_TIMEOUT)
+    return [s for s in suggestions if s["id"] not in exclude][: settings.WHO_TO_FOLLOW_COUNT]
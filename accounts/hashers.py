@@ -0,0 +1,52 @@
+"""Password hashers with costs tuned in ``PASSWORD_HASHER_PARAMS``, and async hashing helpers.
+
+Each hasher reads its cost parameters from ``PASSWORD_HASHER_PARAMS[algorithm]`` (falling back to
+Django's defaults), so the cost can be tuned per deployment from the numbers of
+``python -m benchmarks.hashing``. Stored hashes with other parameters still verify and are
+re-hashed with the current ones on the next successful login.
+
+:func:`amake_password` and :func:`acheck_password` run the key derivation in a worker thread, off
+the event loop and off the single thread that serves sync code under ASGI; ``hashlib`` releases
+the GIL while deriving, so concurrent logins use all cores.
+"""
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+def _tunable(algorithm, name, default):
+    return property(lambda self: settings.PASSWORD_HASHER_PARAMS.get(algorithm, {}).get(name, default))
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    time_cost = _tunable("argon2", "time_cost", hashers.Argon2PasswordHasher.time_cost)
+    memory_cost = _tunable("argon2", "memory_cost", hashers.Argon2PasswordHasher.memory_cost)
+    parallelism = _tunable("argon2", "parallelism", hashers.Argon2PasswordHasher.parallelism)
+
+
+class ScryptPasswordHasher(hashers.ScryptPasswordHasher):
+    work_factor = _tunable("scrypt", "work_factor", hashers.ScryptPasswordHasher.work_factor)
+    block_size = _tunable("scrypt", "block_size", hashers.ScryptPasswordHasher.block_size)
+    parallelism = _tunable("scrypt", "parallelism", hashers.ScryptPasswordHasher.parallelism)
+    maxmem = _tunable("scrypt", "maxmem", hashers.ScryptPasswordHasher.maxmem)
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    iterations = _tunable("pbkdf2_sha256", "iterations", hashers.PBKDF2PasswordHasher.iterations)
+
+
+async def amake_password(password):
+    return await sync_to_async(hashers.make_password, thread_sensitive=False)(password)
+
+
+async def acheck_password(user, password):
+    """Async ``user.check_password()``: verify, and upgrade an outdated stored hash."""
+    upgraded = []
+    matches = await sync_to_async(hashers.check_password, thread_sensitive=False)(
+        password, user.password, lambda raw_password: upgraded.append(hashers.make_password(raw_password))
+    )
+    if upgraded:
+        user.password = upgraded[0]
+        await user.asave(update_fields=["password"])
+    return matches
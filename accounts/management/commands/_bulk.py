@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.bulk import DEFAULT_BATCH_SIZE
+from accounts.models import User
+
+
+class BulkUserCommand(BaseCommand):
+    """Base for the commands that run an ``accounts.bulk`` generator per user and report its progress."""
+
+    def add_arguments(self, parser):
+        parser.add_argument("usernames", nargs="+")
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+
+    def get_users(self, usernames):
+        users = list(User.objects.filter(username__in=usernames).order_by("pk"))
+        missing = set(usernames) - {user.username for user in users}
+        if missing:
+            raise CommandError(f"Unknown users: {', '.join(sorted(missing))}")
+        return users
+
+    def handle(self, *args, **options):
+        for user in self.get_users(options["usernames"]):
+            for step, done in self.run(user, options["batch_size"]):
+                if options["verbosity"] >= 1:
+                    self.stdout.write(f"{user.username}: {step} {done}")
+            self.stdout.write(f"{user.username}: done")
+
+    def run(self, user, batch_size):
+        raise NotImplementedError
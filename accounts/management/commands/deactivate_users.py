@@ -0,0 +1,12 @@
+from accounts.bulk import deactivate_users
+
+from ._bulk import BulkUserCommand
+
+
+class Command(BulkUserCommand):
+    help = "Deactivate the given users (they are logged out on their next request)."
+
+    def handle(self, *args, **options):
+        users = self.get_users(options["usernames"])
+        count = deactivate_users([user.pk for user in users])
+        self.stdout.write(f"{count} users deactivated")
@@ -0,0 +1,10 @@
+from accounts.bulk import delete_user
+
+from ._bulk import BulkUserCommand
+
+
+class Command(BulkUserCommand):
+    help = "Deactivate the given users, remove everything they own in batches, then delete the accounts."
+
+    def run(self, user, batch_size):
+        return delete_user(user, batch_size)
@@ -0,0 +1,34 @@
+import time
+
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired sessions in small batches, one short transaction each, so that logins are not "
+        "blocked behind a single long DELETE the way clearsessions does it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--sleep", type=float, default=0.0, help="Seconds to pause between batches.")
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        total = 0
+        while True:
+            keys = list(
+                Session.objects.filter(expire_date__lt=now).values_list("session_key", flat=True)[
+                    : options["batch_size"]
+                ]
+            )
+            if not keys:
+                break
+            total += Session.objects.filter(session_key__in=keys).delete()[0]
+            if options["verbosity"] >= 2:
+                self.stdout.write(f"{total} sessions deleted")
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+        self.stdout.write(f"{total} expired sessions deleted")
@@ -0,0 +1,10 @@
+from accounts.bulk import purge_user
+
+from ._bulk import BulkUserCommand
+
+
+class Command(BulkUserCommand):
+    help = "Remove all tweets, likes and follows of the given users in batches, keeping the accounts."
+
+    def run(self, user, batch_size):
+        return purge_user(user, batch_size)
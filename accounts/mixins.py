@@ -0,0 +1,11 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+
+
+class AsyncLoginRequiredMixin:
+    """``LoginRequiredMixin`` for async views; the lazy ``request.user`` is loaded off the event loop."""
+
+    async def dispatch(self, request, *args, **kwargs):
+        if not await sync_to_async(lambda: request.user.is_authenticated)():
+            return redirect_to_login(request.get_full_path())
+        return await super().dispatch(request, *args, **kwargs)
@@ -4,6 +4,20 @@ from django.db import models
 
 class User(AbstractUser):
     email = models.EmailField()
+    follower_count = models.PositiveIntegerField(default=0, editable=False)
+    following_count = models.PositiveIntegerField(default=0, editable=False)
+    tweet_count = models.PositiveIntegerField(default=0, editable=False)
 
 
-# class FriendShip(models.Model):
+class FriendShip(models.Model):
+    follower = models.ForeignKey(User, on_delete=models.CASCADE, related_name="followings")
+    following = models.ForeignKey(User, on_delete=models.CASCADE, related_name="followers")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["follower", "following"], name="unique_friendship"),
+        ]
+
+    def __str__(self):
+        return f"{self.follower} -> {self.following}"
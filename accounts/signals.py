@@ -0,0 +1,30 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from mysite import counters
+
+from . import graph
+from .backends import invalidate_user
+from .models import FriendShip, User
+
+
+@receiver(post_save, sender=FriendShip)
+def increment_follow_counters(sender, instance, created, **kwargs):
+    if created:
+        counters.adjust(User, instance.follower_id, following_count=1)
+        counters.adjust(User, instance.following_id, follower_count=1)
+        transaction.on_commit(lambda: graph.add_edge(instance.follower_id, instance.following_id))
+
+
+@receiver(post_delete, sender=FriendShip)
+def decrement_follow_counters(sender, instance, **kwargs):
+    counters.adjust(User, instance.follower_id, following_count=-1)
+    counters.adjust(User, instance.following_id, follower_count=-1)
+    transaction.on_commit(lambda: graph.remove_edge(instance.follower_id, instance.following_id))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
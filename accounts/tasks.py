@@ -0,0 +1,27 @@
+from tasks.queue import task
+from tweets.models import Tweet
+
+from . import bulk
+from .models import User
+
+
+@task()
+def delete_tweets(tweet_ids):
+    for _ in bulk.delete_tweets(Tweet.objects.filter(pk__in=tweet_ids)):
+        pass
+
+
+@task()
+def purge_user(user_id):
+    user = User.objects.filter(pk=user_id).first()
+    if user is not None:
+        for _ in bulk.purge_user(user):
+            pass
+
+
+@task()
+def delete_user(user_id):
+    user = User.objects.filter(pk=user_id).first()
+    if user is not None:
+        for _ in bulk.delete_user(user):
+            pass
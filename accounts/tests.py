@@ -1,8 +1,34 @@
+import csv
+import json
+import tracemalloc
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from asgiref.sync import sync_to_async
 from django.contrib.auth import SESSION_KEY, get_user_model
-from django.test import TestCase
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.contrib.sessions.backends.cached_db import SessionStore
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.http import Http404
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 
 from mysite.settings import LOGIN_REDIRECT_URL, LOGOUT_REDIRECT_URL
+from tasks.models import Task
+from tasks.worker import Worker
+from tweets import conditional, search
+from tweets.models import Like, TimelineEntry, Tweet
+
+from . import bulk, export, graph
+from .backends import CachedModelBackend, aauthenticate
+from .models import FriendShip
+from .views import AsyncLoginView, AsyncSignupView, AsyncUserProfileView, ExportView
 
 User = get_user_model()
 
@@ -35,6 +61,18 @@ class TestSignupView(TestCase):
         self.assertTrue(User.objects.filter(username=valid_data["username"]).exists())
         self.assertIn(SESSION_KEY, self.client.session)
 
+    def test_failure_post_with_reserved_username(self):
+        data = {
+            "username": "Export",
+            "email": "test@example.com",
+            "password1": "testpassword",
+            "password2": "testpassword",
+        }
+        response = self.client.post(self.url, data)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("このユーザー名は使用できません。", response.context["form"].errors["username"])
+        self.assertFalse(User.objects.filter(username="Export").exists())
+
     def test_failure_post_with_empty_form(self):
         invalid_data = {
             "username": "",
@@ -180,6 +218,96 @@ class TestSignupView(TestCase):
         self.assertIn("確認用パスワードが一致しません。", form.errors["password2"])
 
 
+class TestPasswordHashing(TestCase):
+    valid_data = {
+        "username": "testuser",
+        "email": "test@example.com",
+        "password1": "testpassword",
+        "password2": "testpassword",
+    }
+
+    def test_signup_hashes_the_password_once(self):
+        with mock.patch("django.contrib.auth.base_user.make_password", wraps=make_password) as hashed, mock.patch(
+            "django.contrib.auth.base_user.check_password"
+        ) as checked:
+            self.client.post(reverse("accounts:signup"), self.valid_data)
+        self.assertEqual(hashed.call_count, 1)
+        checked.assert_not_called()
+        self.assertIn(SESSION_KEY, self.client.session)
+
+    @override_settings(
+        PASSWORD_HASHERS=["accounts.hashers.ScryptPasswordHasher", "accounts.hashers.PBKDF2PasswordHasher"],
+        PASSWORD_HASHER_PARAMS={"scrypt": {"work_factor": 2**10}, "pbkdf2_sha256": {"iterations": 1000}},
+    )
+    def test_costs_come_from_settings_and_outdated_hashes_are_upgraded(self):
+        self.assertEqual(make_password("testpassword").split("$")[1], "1024")
+        user = User.objects.create_user(username="tester")
+        user.password = identify_hasher("pbkdf2_sha256$").encode("testpassword", "salt")
+        user.save()
+        self.assertEqual(user.password.split("$")[1], "1000")
+
+        self.assertTrue(self.client.login(username="tester", password="testpassword"))
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith("scrypt$1024$"))
+
+    @override_settings(
+        PASSWORD_HASHERS=["accounts.hashers.ScryptPasswordHasher", "django.contrib.auth.hashers.MD5PasswordHasher"],
+        PASSWORD_HASHER_PARAMS={"scrypt": {"work_factor": 2**10}},
+    )
+    async def test_aauthenticate(self):
+        user = await User.objects.acreate(username="tester", password=make_password("testpassword", "salt", "md5"))
+        self.assertIsNone(await aauthenticate(None, "tester", "wrong"))
+        self.assertIsNone(await aauthenticate(None, "nobody", "testpassword"))
+        authenticated = await aauthenticate(None, "tester", "testpassword")
+        self.assertEqual(authenticated, user)
+        self.assertEqual(authenticated.backend, "accounts.backends.CachedModelBackend")
+        await user.arefresh_from_db()
+        self.assertTrue(user.password.startswith("scrypt$"))
+
+        user.is_active = False
+        await user.asave()
+        self.assertIsNone(await aauthenticate(None, "tester", "testpassword"))
+
+
+class TestAsyncSignupAndLoginViews(TestCase):
+    async def post(self, view, data, **initkwargs):
+        request = AsyncRequestFactory().post("/", data)
+        request.session = SessionStore()
+        request.user = None
+        return await view.as_view(**initkwargs)(request), request
+
+    async def test_signup(self):
+        data = {"username": "testuser", "email": "test@example.com", "password1": "pass0rd!", "password2": "pass0rd!"}
+        response, request = await self.post(AsyncSignupView, data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.url, reverse(LOGIN_REDIRECT_URL))
+        user = await User.objects.aget(username="testuser")
+        self.assertTrue(await sync_to_async(user.check_password)("pass0rd!"))
+        self.assertEqual(request.session[SESSION_KEY], str(user.pk))
+
+        response, _ = await self.post(AsyncSignupView, data)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("username", response.context_data["form"].errors)
+
+    async def test_login(self):
+        user = await sync_to_async(User.objects.create_user)(username="tester", password="testpassword")
+        response, request = await self.post(
+            AsyncLoginView, {"username": "tester", "password": "wrong", "next": "/tweets/"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context_data["form"].non_field_errors())
+        self.assertEqual(response.context_data["next"], "/tweets/")
+        self.assertIn("no-cache", response["Cache-Control"])
+        self.assertEqual(request.sensitive_post_parameters, "__ALL__")
+
+        response, request = await self.post(
+            AsyncLoginView, {"username": "tester", "password": "testpassword", "next": "https://evil.example/"}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.url, reverse(LOGIN_REDIRECT_URL))
+        self.assertEqual(request.session[SESSION_KEY], str(user.pk))
+
+
 class TestLoginView(TestCase):
     def setUp(self):
         self.url = reverse("accounts:login")
@@ -212,7 +340,10 @@ class TestLoginView(TestCase):
         response = self.client.post(self.url, invalid_data)
         form = response.context["form"]
         self.assertEqual(response.status_code, 200)
-        self.assertIn("正しいユーザー名とパスワードを入力してください。どちらのフィールドも大文字と小文字は区別されます。", form.errors["__all__"])
+        self.assertIn(
+            "正しいユーザー名とパスワードを入力してください。どちらのフィールドも大文字と小文字は区別されます。",
+            form.errors["__all__"],
+        )
         self.assertNotIn(SESSION_KEY, self.client.session)
 
     def test_failure_post_with_empty_password(self):
@@ -244,8 +375,54 @@ class TestLogoutView(TestCase):
         self.assertNotIn(SESSION_KEY, self.client.session)
 
 
-# class TestUserProfileView(TestCase):
-#     def test_success_get(self):
+class TestUserProfileView(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="tester", password="testpassword")
+        self.other = User.objects.create_user(username="other", password="testpassword")
+        self.url = reverse("accounts:user_profile", kwargs={"username": "other"})
+        self.client.login(username="tester", password="testpassword")
+
+    def test_success_get(self):
+        Tweet.objects.create(user=self.other, content="hello")
+        FriendShip.objects.create(follower=self.user, following=self.other)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, "accounts/profile.html")
+        profile_user = response.context["profile_user"]
+        self.assertEqual(profile_user, self.other)
+        self.assertEqual(profile_user.tweet_count, 1)
+        self.assertEqual(profile_user.follower_count, 1)
+        self.assertEqual(profile_user.following_count, 0)
+        self.assertQuerysetEqual(response.context["tweet_list"], Tweet.objects.filter(user=self.other))
+
+    def test_failure_get_with_not_exists_user(self):
+        response = self.client.get(reverse("accounts:user_profile", kwargs={"username": "nobody"}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_query_count_does_not_grow_with_users_or_tweets(self):
+        Tweet.objects.create(user=self.other, content="hello")
+        self.client.get(self.url)
+        # profile user, tweet page, liked tweets (session, request.user and follow state are cached)
+        with self.assertNumQueries(3):
+            self.client.get(self.url)
+        for i in range(5):
+            follower = User.objects.create_user(username=f"follower{i}", password="testpassword")
+            FriendShip.objects.create(follower=follower, following=self.other)
+            Tweet.objects.create(user=self.other, content=f"tweet {i}")
+        # plus the attachments of the new tweets, whose cards are not cached yet
+        with self.assertNumQueries(4):
+            self.client.get(self.url)
+
+    def test_unchanged_profile_is_not_modified(self):
+        Tweet.objects.create(user=self.other, content="hello")
+        etag = self.client.get(self.url)["ETag"]
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Tweet.objects.create(user=self.other, content="new")
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
 
 
 # class TestUserProfileEditView(TestCase):
@@ -258,20 +435,109 @@ class TestLogoutView(TestCase):
 #     def test_failure_post_with_incorrect_user(self):
 
 
-# class TestFollowView(TestCase):
-#     def test_success_post(self):
-
-#     def test_failure_post_with_not_exist_user(self):
-
-#     def test_failure_post_with_self(self):
+class TestAsyncUserProfileView(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="tester", password="testpassword")
+        self.other = User.objects.create_user(username="other", password="testpassword")
+        FriendShip.objects.create(follower=self.user, following=self.other)
+        self.tweet = Tweet.objects.create(user=self.other, content="hello")
+
+    async def get(self, username, **kwargs):
+        url = reverse("accounts:user_profile", kwargs={"username": username})
+        request = AsyncRequestFactory().get(url, **kwargs)
+        request.user = self.user
+        return await AsyncUserProfileView.as_view()(request, username=username)
+
+    async def test_success_get(self):
+        response = await self.get("other")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.template_name, "accounts/profile.html")
+        profile_user = response.context_data["profile_user"]
+        self.assertEqual(profile_user, self.other)
+        self.assertEqual(profile_user.tweet_count, 1)
+        self.assertEqual(profile_user.follower_count, 1)
+        self.assertTrue(response.context_data["is_following"])
+        self.assertEqual(response.context_data["tweet_list"], [self.tweet])
+
+    async def test_failure_get_with_not_exists_user(self):
+        with self.assertRaises(Http404):
+            await self.get("nobody")
+
+    async def test_unchanged_profile_is_not_modified(self):
+        etag = (await self.get("other"))["ETag"]
+        response = await self.get("other", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        await Tweet.objects.acreate(user=self.other, content="new")
+        self.assertEqual((await self.get("other", headers={"If-None-Match": etag})).status_code, 200)
+
+
+class TestFollowView(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="tester", password="testpassword")
+        self.other = User.objects.create_user(username="other", password="testpassword")
+        self.client.login(username="tester", password="testpassword")
 
+    def test_success_post(self):
+        response = self.client.post(reverse("accounts:follow", kwargs={"username": "other"}))
+        self.assertRedirects(
+            response,
+            reverse("accounts:user_profile", kwargs={"username": "other"}),
+            status_code=302,
+            target_status_code=200,
+        )
+        self.assertTrue(FriendShip.objects.filter(follower=self.user, following=self.other).exists())
+        self.user.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual(self.user.following_count, 1)
+        self.assertEqual(self.other.follower_count, 1)
+
+    def test_failure_post_with_not_exist_user(self):
+        response = self.client.post(reverse("accounts:follow", kwargs={"username": "nobody"}))
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(FriendShip.objects.exists())
+
+    def test_failure_post_with_self(self):
+        response = self.client.post(reverse("accounts:follow", kwargs={"username": "tester"}))
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(FriendShip.objects.exists())
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.following_count, 0)
+
+
+class TestUnfollowView(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="tester", password="testpassword")
+        self.other = User.objects.create_user(username="other", password="testpassword")
+        self.client.login(username="tester", password="testpassword")
+        FriendShip.objects.create(follower=self.user, following=self.other)
 
-# class TestUnfollowView(TestCase):
-#     def test_success_post(self):
+    def test_success_post(self):
+        response = self.client.post(reverse("accounts:unfollow", kwargs={"username": "other"}))
+        self.assertRedirects(
+            response,
+            reverse("accounts:user_profile", kwargs={"username": "other"}),
+            status_code=302,
+            target_status_code=200,
+        )
+        self.assertFalse(FriendShip.objects.exists())
+        self.user.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual(self.user.following_count, 0)
+        self.assertEqual(self.other.follower_count, 0)
 
-#     def test_failure_post_with_not_exist_tweet(self):
+    def test_failure_post_with_not_exist_tweet(self):
+        response = self.client.post(reverse("accounts:unfollow", kwargs={"username": "nobody"}))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(FriendShip.objects.count(), 1)
 
-#     def test_failure_post_with_incorrect_user(self):
+    def test_failure_post_with_incorrect_user(self):
+        User.objects.create_user(username="stranger", password="testpassword")
+        self.client.post(reverse("accounts:unfollow", kwargs={"username": "stranger"}))
+        self.assertEqual(FriendShip.objects.count(), 1)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.following_count, 1)
 
 
 # class TestFollowingListView(TestCase):
@@ -280,3 +546,307 @@ class TestLogoutView(TestCase):
 
 # class TestFollowerListView(TestCase):
 #     def test_success_get(self):
+
+
+class TestCachedSessionAndUser(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="tester", password="testpassword")
+        self.client.login(username="tester", password="testpassword")
+
+    def test_warm_page_view_skips_session_and_user_queries(self):
+        self.client.get(reverse("tweets:home"))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("tweets:home"))
+        self.assertEqual(response.context["user"], self.user)
+        sql = [query["sql"] for query in queries.captured_queries]
+        self.assertFalse([query for query in sql if 'FROM "django_session"' in query])
+        self.assertFalse([query for query in sql if 'WHERE "accounts_user"."id" = ' in query])
+
+    def test_saving_the_user_invalidates_the_cache(self):
+        backend = CachedModelBackend()
+        self.assertEqual(backend.get_user(self.user.pk).email, "")
+        self.user.email = "tester@example.com"
+        self.user.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(backend.get_user(self.user.pk).email, "tester@example.com")
+        with self.assertNumQueries(0):
+            backend.get_user(self.user.pk)
+
+    def test_deactivated_user_is_logged_out(self):
+        self.client.get(reverse("tweets:home"))
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(reverse("tweets:home"))
+        self.assertEqual(response.status_code, 302)
+
+    def test_session_is_written_through_to_the_database(self):
+        self.assertTrue(Session.objects.filter(session_key=self.client.session.session_key).exists())
+
+
+class TestPurgeSessions(TestCase):
+    def test_only_expired_sessions_are_deleted(self):
+        now = timezone.now()
+        for i in range(5):
+            Session.objects.create(session_key=f"expired{i}", session_data="", expire_date=now - timedelta(days=1))
+        Session.objects.create(session_key="active", session_data="", expire_date=now + timedelta(days=1))
+
+        out = StringIO()
+        call_command("purge_sessions", batch_size=2, stdout=out)
+        self.assertIn("5 expired sessions deleted", out.getvalue())
+        self.assertEqual(list(Session.objects.values_list("session_key", flat=True)), ["active"])
+
+
+class TestFollowGraph(TestCase):
+    def setUp(self):
+        cache.clear()
+        graph.reset()
+        self.users = {
+            name: User.objects.create_user(username=name, password="testpassword")
+            for name in ["me", "alice", "bob", "carol", "dave", "erin"]
+        }
+        for follower, following in [
+            ("me", "alice"),
+            ("me", "bob"),
+            ("alice", "me"),
+            ("alice", "carol"),
+            ("bob", "carol"),
+            ("bob", "dave"),
+            ("carol", "erin"),
+        ]:
+            self.follow(follower, following)
+
+    def follow(self, follower, following):
+        return FriendShip.objects.create(follower=self.users[follower], following=self.users[following])
+
+    def pk(self, name):
+        return self.users[name].pk
+
+    def test_intersections(self):
+        follow_graph = graph.get_graph()
+        self.assertEqual(follow_graph.mutual_follows(self.pk("me")), [self.pk("alice")])
+        self.assertEqual(
+            follow_graph.followed_by_followees(self.pk("me"), self.pk("carol")), [self.pk("alice"), self.pk("bob")]
+        )
+
+    def test_two_hop_suggestions(self):
+        with self.assertNumQueries(1):
+            suggestions = graph.get_graph().suggestions(self.pk("me"), limit=5, sample=100)
+        # carol is followed by two of my followees, dave by one; people I follow and I am never suggested.
+        self.assertEqual(suggestions, [(self.pk("carol"), 2), (self.pk("dave"), 1)])
+
+    def test_users_without_followees_get_popular_accounts(self):
+        self.assertEqual(graph.get_graph().suggestions(self.pk("erin"), limit=1, sample=100), [(self.pk("carol"), 2)])
+
+    def test_follow_and_unfollow_update_the_loaded_graph(self):
+        follow_graph = graph.get_graph()
+        with self.captureOnCommitCallbacks(execute=True):
+            friendship = self.follow("me", "carol")
+        self.assertEqual(
+            list(follow_graph.followees_of(self.pk("me"))),
+            sorted([self.pk("alice"), self.pk("bob"), self.pk("carol")]),
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            friendship.delete()
+        self.assertNotIn(self.pk("carol"), follow_graph.followees_of(self.pk("me")))
+        self.assertIs(graph.get_graph(), follow_graph)
+
+    def test_stale_graph_is_reloaded(self):
+        follow_graph = graph.get_graph()
+        with self.settings(FOLLOW_GRAPH_MAX_AGE=-1):
+            self.assertIsNot(graph.get_graph(), follow_graph)
+
+    def test_home_shows_who_to_follow(self):
+        self.client.login(username="me", password="testpassword")
+        response = self.client.get(reverse("tweets:home"))
+        self.assertEqual([s["username"] for s in response.context["who_to_follow"]], ["carol", "dave"])
+        self.assertContains(response, reverse("accounts:follow", kwargs={"username": "carol"}))
+
+        # A followed suggestion disappears right away although the suggestions are cached.
+        self.client.post(reverse("accounts:follow", kwargs={"username": "carol"}))
+        response = self.client.get(reverse("tweets:home"))
+        self.assertEqual([s["username"] for s in response.context["who_to_follow"]], ["dave"])
+
+    def test_inactive_users_are_not_suggested(self):
+        bulk.deactivate_users([self.pk("carol")])
+        suggestions = graph.who_to_follow(self.users["me"])
+        self.assertEqual([s["username"] for s in suggestions], ["dave"])
+
+
+class TestExport(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="tester", password="testpassword")
+        self.other = User.objects.create_user(username="other", password="testpassword")
+        FriendShip.objects.create(follower=self.user, following=self.other)
+        FriendShip.objects.create(follower=self.other, following=self.user)
+        tweets = Tweet.objects.bulk_create([Tweet(user=self.user, content=f"ツイート {i}") for i in range(5)])
+        Like.objects.bulk_create([Like(user=self.user, tweet=tweet) for tweet in tweets[:2]])
+        self.client.login(username="tester", password="testpassword")
+
+    def test_ndjson(self):
+        response = self.client.get(reverse("accounts:export"))
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="tester.ndjson"')
+        records = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(
+            [record["type"] for record in records], ["tweet"] * 5 + ["like"] * 2 + ["following", "follower"]
+        )
+        self.assertEqual(records[0]["content"], "ツイート 0")
+        self.assertEqual(records[-1]["username"], "other")
+
+    def test_csv(self):
+        response = self.client.get(reverse("accounts:export"), {"format": "csv"})
+        rows = list(csv.DictReader(b"".join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(len(rows), 9)
+        self.assertEqual(rows[5]["type"], "like")
+        self.assertTrue(rows[5]["tweet_id"])
+
+    def test_unknown_format(self):
+        self.assertEqual(self.client.get(reverse("accounts:export"), {"format": "xml"}).status_code, 400)
+
+    def test_command(self):
+        out = StringIO()
+        call_command("export_user", "tester", format="csv", stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 10)
+
+    def test_memory_stays_flat(self):
+        Tweet.objects.bulk_create([Tweet(user=self.user, content="x" * 140) for _ in range(5000)])
+        tracemalloc.start()
+        try:
+            size = sum(len(line) for line in export.lines(self.user, "ndjson", chunk_size=200))
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        self.assertGreater(size, 1_000_000)
+        self.assertLess(peak, 512 * 1024)
+
+    @override_settings(EXPORT_CHUNK_SIZE=200)
+    async def test_memory_stays_flat_under_asgi(self):
+        await Tweet.objects.abulk_create([Tweet(user=self.user, content="x" * 140) for _ in range(5000)])
+        request = AsyncRequestFactory().get(reverse("accounts:export"))
+        request.user = self.user
+        response = await sync_to_async(ExportView.as_view())(request)
+        self.assertTrue(response.is_async)
+        tracemalloc.start()
+        try:
+            size = 0
+            async for chunk in response:
+                size += len(chunk)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        self.assertGreater(size, 1_000_000)
+        self.assertLess(peak, 512 * 1024)
+
+
+class TestBulkDeletion(TestCase):
+    def setUp(self):
+        cache.clear()
+        graph.reset()
+        self.spammer = User.objects.create_user(username="spammer", password="testpassword")
+        self.alice = User.objects.create_user(username="alice", password="testpassword")
+        self.bob = User.objects.create_user(username="bob", password="testpassword")
+        for follower, following in [
+            (self.spammer, self.alice),
+            (self.alice, self.spammer),
+            (self.bob, self.spammer),
+            (self.alice, self.bob),
+        ]:
+            FriendShip.objects.create(follower=follower, following=following)
+        self.spam = [Tweet.objects.create(user=self.spammer, content=f"spam offer {i}") for i in range(5)]
+        self.keep = Tweet.objects.create(user=self.alice, content="hello offer")
+        Like.objects.create(user=self.spammer, tweet=self.keep)
+        Like.objects.create(user=self.alice, tweet=self.spam[0])
+
+    def assertCountersConsistent(self):
+        out = StringIO()
+        call_command("reconcile_counters", dry_run=True, stdout=out)
+        self.assertIn("accounts.User: 0 drifted rows found", out.getvalue())
+        self.assertIn("tweets.Tweet: 0 drifted rows found", out.getvalue())
+
+    def test_delete_user_removes_everything_in_batches(self):
+        steps = list(bulk.delete_user(self.spammer, batch_size=2))
+        self.assertIn(("tweets", 5), steps)
+        self.assertEqual(steps[-1], ("user", 1))
+
+        self.assertFalse(User.objects.filter(username="spammer").exists())
+        self.assertFalse(Tweet.objects.filter(pk__in=[tweet.pk for tweet in self.spam]).exists())
+        self.assertFalse(TimelineEntry.objects.filter(tweet__in=self.spam).exists())
+        self.assertEqual([tweet_id for tweet_id, _ in search.search("offer", 10)], [self.keep.pk])
+        self.assertEqual(list(graph.get_graph().followers_of(self.alice.pk)), [])
+        self.assertCountersConsistent()
+
+    def test_purge_keeps_account_and_runs_few_queries_per_batch(self):
+        for i in range(40):
+            Tweet.objects.create(user=self.spammer, content=f"more spam {i}")
+        with CaptureQueriesContext(connection) as queries:
+            list(bulk.purge_user(self.spammer, batch_size=100))
+        self.assertLess(len(queries), 40)
+
+        self.spammer.refresh_from_db()
+        self.assertTrue(self.spammer.is_active)
+        self.assertEqual(
+            (self.spammer.tweet_count, self.spammer.follower_count, self.spammer.following_count), (0, 0, 0)
+        )
+        self.assertFalse(TimelineEntry.objects.filter(owner=self.spammer).exists())
+        self.assertCountersConsistent()
+
+    def test_deactivated_user_is_logged_out(self):
+        self.client.force_login(self.spammer)
+        self.assertEqual(self.client.get(reverse("tweets:home")).status_code, 200)
+
+        call_command("deactivate_users", "spammer", stdout=StringIO())
+        response = self.client.get(reverse("tweets:home"))
+        self.assertRedirects(response, f"{reverse('accounts:login')}?next={reverse('tweets:home')}")
+
+    def test_delete_users_command_reports_progress(self):
+        out = StringIO()
+        call_command("delete_users", "spammer", batch_size=2, stdout=out)
+        self.assertIn("spammer: tweets 4", out.getvalue())
+        self.assertIn("spammer: done", out.getvalue())
+        self.assertFalse(User.objects.filter(username="spammer").exists())
+
+    def test_admin_delete_action(self):
+        admin_user = User.objects.create_superuser(username="admin", password="testpassword")
+        self.client.force_login(admin_user)
+        response = self.client.post(
+            reverse("admin:accounts_user_changelist"),
+            {"action": "delete", "_selected_action": [self.spammer.pk]},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(User.objects.filter(username="spammer").exists())
+        self.assertCountersConsistent()
+
+    @override_settings(TASKS_EAGER=False)
+    def test_admin_purge_action_is_queued_once_per_user(self):
+        admin_user = User.objects.create_superuser(username="admin", password="testpassword")
+        self.client.force_login(admin_user)
+        for _ in range(2):
+            self.client.post(
+                reverse("admin:accounts_user_changelist"), {"action": "purge", "_selected_action": [self.spammer.pk]}
+            )
+        self.assertEqual(
+            list(Task.objects.values_list("idempotency_key", flat=True)), [f"purge-user:{self.spammer.pk}"]
+        )
+
+        Worker(batch_size=10).run(once=True)
+        self.assertFalse(Tweet.objects.filter(user=self.spammer).exists())
+        self.assertCountersConsistent()
+
+    @override_settings(TASKS_EAGER=False)
+    def test_admin_tweet_delete_action_is_queued(self):
+        admin_user = User.objects.create_superuser(username="admin", password="testpassword")
+        self.client.force_login(admin_user)
+        response = self.client.post(
+            reverse("admin:tweets_tweet_changelist"),
+            {"action": "delete", "_selected_action": [tweet.pk for tweet in self.spam]},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Tweet.objects.filter(user=self.spammer).count(), 5)
+
+        liker_stamp = cache.get(conditional.viewer_stamp(self.alice.pk))
+        Worker(batch_size=10).run(once=True)
+        self.assertFalse(Tweet.objects.filter(user=self.spammer).exists())
+        # Alice liked one of the tweets: her pages showed it.
+        self.assertNotEqual(cache.get(conditional.viewer_stamp(self.alice.pk)), liker_stamp)
+        self.assertCountersConsistent()
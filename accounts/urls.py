@@ -1,25 +1,36 @@
 # from django.contrib.auth import views as auth_views
+from django.conf import settings
 from django.contrib.auth import views as auth_views
 from django.urls import path
 
+from mysite.ratelimit import rate_limit
+
 from . import views
 
 app_name = "accounts"
 
 urlpatterns = [
-    path("signup/", views.SignupView.as_view(), name="signup"),
+    path("signup/", (views.AsyncSignupView if settings.ASYNC_VIEWS else views.SignupView).as_view(), name="signup"),
     path(
         "login/",
-        auth_views.LoginView.as_view(
-            redirect_authenticated_user=True,
-            template_name="accounts/login.html",
+        rate_limit(
+            (views.AsyncLoginView if settings.ASYNC_VIEWS else auth_views.LoginView).as_view(
+                redirect_authenticated_user=True,
+                template_name="accounts/login.html",
+            )
         ),
         name="login",
     ),
     path("logout/", auth_views.LogoutView.as_view(), name="logout"),
-    path("<str:username>/", views.UserProfileView.as_view(), name="user_profile"),
-    # path('<str:username>/follow/', views.FollowView.as_view(), name='follow'),
-    # path('<str:username>/unfollow/', views.UnFollowView, name='unfollow'),
+    # Must precede "<str:username>/".
+    path("export/", views.ExportView.as_view(), name="export"),
+    path(
+        "<str:username>/",
+        (views.AsyncUserProfileView if settings.ASYNC_VIEWS else views.UserProfileView).as_view(),
+        name="user_profile",
+    ),
+    path("<str:username>/follow/", views.FollowView.as_view(), name="follow"),
+    path("<str:username>/unfollow/", views.UnFollowView.as_view(), name="unfollow"),
     # path('<str:username>/following_list/', views.FollowingListView.as_view(), name='following_list'),
     # path('<str:username>/follower_list/', views.FollowerListView.as_view(), name='follower_list'),
 ]
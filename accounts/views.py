@@ -1,28 +1,208 @@
-from django.contrib.auth import authenticate, login
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import REDIRECT_FIELD_NAME, login
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.contrib.sites.shortcuts import get_current_site
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import Http404, HttpResponseBadRequest, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, redirect, resolve_url
+from django.template.response import TemplateResponse
 from django.urls import reverse_lazy
+from django.utils.cache import add_never_cache_headers
+from django.utils.decorators import method_decorator
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.views import View
+from django.views.decorators.debug import sensitive_post_parameters
 from django.views.generic import CreateView, ListView
 
+from mysite.ratelimit import RateLimitMixin
 from mysite.settings import LOGIN_REDIRECT_URL
+from tweets import cards
+from tweets.conditional import ConditionalGetMixin, author_stamp
+from tweets.models import Tweet
+from tweets.pagination import KeysetPaginationMixin
+from tweets.viewer_state import ViewerState
 
-from .forms import SignupForm
-from .models import User
+from . import export
+from .forms import AsyncAuthenticationForm, SignupForm
+from .mixins import AsyncLoginRequiredMixin
+from .models import FriendShip, User
 
 
-class SignupView(CreateView):
+class SignupView(RateLimitMixin, CreateView):
     form_class = SignupForm
     template_name = "accounts/signup.html"
     success_url = reverse_lazy(LOGIN_REDIRECT_URL)
 
     def form_valid(self, form):
         response = super().form_valid(form)
-        username = form.cleaned_data["username"]
-        password = form.cleaned_data["password1"]
-        user = authenticate(self.request, username=username, password=password)
-        login(self.request, user)
+        # The password was just hashed by save(); authenticate() would derive it a second time.
+        login(self.request, self.object, backend="accounts.backends.CachedModelBackend")
         return response
 
 
-class UserProfileView(LoginRequiredMixin, ListView):
+class AsyncSignupView(RateLimitMixin, View):
+    """SignupView for the ASGI deployment; the password is hashed off the event loop."""
+
+    template_name = "accounts/signup.html"
+
+    async def get(self, request, *args, **kwargs):
+        return TemplateResponse(request, self.template_name, {"form": SignupForm()})
+
+    async def post(self, request, *args, **kwargs):
+        form = SignupForm(request.POST)
+        if not await sync_to_async(form.is_valid)():
+            return TemplateResponse(request, self.template_name, {"form": form})
+        user = await form.asave()
+        await sync_to_async(login)(request, user, backend="accounts.backends.CachedModelBackend")
+        return redirect(LOGIN_REDIRECT_URL)
+
+
+@method_decorator(sensitive_post_parameters(), name="dispatch")
+class AsyncLoginView(View):
+    """``LoginView`` for the ASGI deployment; the password is checked off the event loop."""
+
+    template_name = "accounts/login.html"
+    redirect_authenticated_user = False
+    redirect_field_name = REDIRECT_FIELD_NAME
+
+    async def dispatch(self, request, *args, **kwargs):
+        response = await super().dispatch(request, *args, **kwargs)
+        # What never_cache does; on Django 4.2 the decorator cannot wrap a coroutine.
+        add_never_cache_headers(response)
+        return response
+
+    async def get(self, request, *args, **kwargs):
+        if self.redirect_authenticated_user and await sync_to_async(lambda: request.user.is_authenticated)():
+            return redirect(self.get_success_url())
+        return TemplateResponse(request, self.template_name, self.get_context_data(AsyncAuthenticationForm(request)))
+
+    async def post(self, request, *args, **kwargs):
+        form = AsyncAuthenticationForm(request, data=request.POST)
+        if not await form.ais_valid():
+            return TemplateResponse(request, self.template_name, self.get_context_data(form))
+        await sync_to_async(login)(request, form.get_user())
+        return redirect(self.get_success_url())
+
+    def get_context_data(self, form):
+        current_site = get_current_site(self.request)
+        return {
+            "form": form,
+            self.redirect_field_name: self.get_redirect_url(),
+            "site": current_site,
+            "site_name": current_site.name,
+        }
+
+    def get_redirect_url(self):
+        """The ``next`` URL if it is safe to redirect to, otherwise an empty string."""
+        url = self.request.POST.get(self.redirect_field_name, self.request.GET.get(self.redirect_field_name, ""))
+        if url_has_allowed_host_and_scheme(url, {self.request.get_host()}, require_https=self.request.is_secure()):
+            return url
+        return ""
+
+    def get_success_url(self):
+        return self.get_redirect_url() or resolve_url(settings.LOGIN_REDIRECT_URL)
+
+
+class UserProfileView(LoginRequiredMixin, ConditionalGetMixin, KeysetPaginationMixin, ListView):
     template_name = "accounts/profile.html"
-    model = User
+    context_object_name = "tweet_list"
+
+    def get_validator(self):
+        self.profile_user = get_object_or_404(User, username=self.kwargs["username"])
+        profile_user = self.profile_user
+        return profile_user.pk, profile_user.follower_count, profile_user.following_count, profile_user.tweet_count
+
+    def get_stamp_keys(self):
+        return super().get_stamp_keys() + [author_stamp(self.profile_user.pk)]
+
+    def get_queryset(self):
+        return Tweet.objects.filter(user=self.profile_user).select_related("user")
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        viewer_state = ViewerState(self.request.user, context["tweet_list"])
+        context["card_list"] = cards.render_cards(context["tweet_list"], viewer_state)
+        context["profile_user"] = self.profile_user
+        context["is_following"] = viewer_state.follows(self.profile_user)
+        return context
+
+    def get_paginate_by(self, queryset):
+        return settings.TWEET_PAGE_SIZE
+
+
+class AsyncUserProfileView(AsyncLoginRequiredMixin, ConditionalGetMixin, KeysetPaginationMixin, View):
+    """UserProfileView for the ASGI deployment, built on the async ORM."""
+
+    template_name = "accounts/profile.html"
+
+    async def aget_validator(self):
+        try:
+            self.profile_user = await User.objects.aget(username=self.kwargs["username"])
+        except User.DoesNotExist:
+            raise Http404
+        profile_user = self.profile_user
+        return profile_user.pk, profile_user.follower_count, profile_user.following_count, profile_user.tweet_count
+
+    async def aget_stamp_keys(self):
+        return self.get_stamp_keys() + [author_stamp(self.profile_user.pk)]
+
+    async def get(self, request, *args, **kwargs):
+        profile_user = self.profile_user
+        page_size = settings.TWEET_PAGE_SIZE
+        viewer_state = ViewerState(request.user)
+        page, _ = await asyncio.gather(
+            self.apaginate_queryset(Tweet.objects.filter(user=profile_user).select_related("user"), page_size),
+            viewer_state.aload_following(),
+        )
+        await viewer_state.aresolve(page.object_list)
+        context = {
+            "view": self,
+            "profile_user": profile_user,
+            "is_following": viewer_state.follows(profile_user),
+            "page_obj": page,
+            "tweet_list": page.object_list,
+            "card_list": await sync_to_async(cards.render_cards)(page.object_list, viewer_state),
+        }
+        return TemplateResponse(request, self.template_name, context)
+
+
+class FollowView(LoginRequiredMixin, RateLimitMixin, View):
+    def post(self, request, *args, **kwargs):
+        following = get_object_or_404(User, username=kwargs["username"])
+        if following == request.user:
+            return HttpResponseBadRequest("自分自身をフォローすることはできません。")
+        with transaction.atomic():
+            FriendShip.objects.get_or_create(follower=request.user, following=following)
+        return redirect("accounts:user_profile", username=following.username)
+
+
+class UnFollowView(LoginRequiredMixin, RateLimitMixin, View):
+    def post(self, request, *args, **kwargs):
+        following = get_object_or_404(User, username=kwargs["username"])
+        with transaction.atomic():
+            # A concurrent unfollow waits for the lock and then finds no row, so post_delete (and the
+            # counter decrements) fire once.
+            friendship = (
+                FriendShip.objects.select_for_update().filter(follower=request.user, following=following).first()
+            )
+            if friendship is not None:
+                friendship.delete()
+        return redirect("accounts:user_profile", username=following.username)
+
+
+class ExportView(LoginRequiredMixin, View):
+    """Stream the requesting user's tweets, likes and follows as NDJSON (default) or CSV."""
+
+    def get(self, request, *args, **kwargs):
+        format = request.GET.get("format", "ndjson")
+        if format not in export.CONTENT_TYPES:
+            return HttpResponseBadRequest("format must be ndjson or csv.")
+        # An async iterator under ASGI, where a sync one would be read into memory as a whole.
+        lines = export.alines if isinstance(request, ASGIRequest) else export.lines
+        response = StreamingHttpResponse(lines(request.user, format), content_type=export.CONTENT_TYPES[format])
+        response["Content-Disposition"] = f'attachment; filename="{request.user.username}.{format}"'
+        return response
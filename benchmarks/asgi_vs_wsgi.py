@@ -0,0 +1,148 @@
+"""Compare the sync views under WSGI with the async views under ASGI.
+
+Each mode runs in its own process (the URLconf picks the view class at import time) and drives the
+Django handler in-process, so the numbers isolate the framework/ORM path from any HTTP server:
+
+    python -m benchmarks.asgi_vs_wsgi --requests 2000 --concurrency 16
+"""
+
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from . import common
+
+
+def seed(users, tweets_per_user, follows_per_user):
+    from accounts.models import FriendShip, User
+    from tweets.models import Tweet
+
+    members = [User.objects.create_user(username=f"user{i}", password="benchmark") for i in range(users)]
+    for i, user in enumerate(members):
+        for j in range(1, follows_per_user + 1):
+            FriendShip.objects.create(follower=user, following=members[(i + j) % users])
+    for n in range(tweets_per_user):
+        for user in members:
+            Tweet.objects.create(user=user, content=f"{user.username} tweet {n}")
+    return members
+
+
+def paths(members):
+    viewer = members[0]
+    return [
+        "/tweets/home/",
+        f"/accounts/{members[1].username}/",
+    ], common.session_cookie(viewer)
+
+
+def run_wsgi(urls, cookie, requests, concurrency):
+    from django.core.handlers.wsgi import WSGIHandler
+
+    application = WSGIHandler()
+
+    def call(i):
+        statuses = []
+        with common.Timer() as timer:
+            body = application(
+                common.wsgi_environ(urls[i % len(urls)], cookie), lambda s, h, e=None: statuses.append(s)
+            )
+            b"".join(body)
+            body.close()
+        assert statuses[0].startswith("200"), statuses[0]
+        return timer.elapsed
+
+    with ThreadPoolExecutor(concurrency) as executor, common.Timer() as total:
+        latencies = list(executor.map(call, range(requests)))
+    return common.summarize(latencies, total.elapsed)
+
+
+def run_asgi(urls, cookie, requests, concurrency):
+    from django.core.handlers.asgi import ASGIHandler
+
+    application = ASGIHandler()
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def call(i):
+        statuses = []
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                statuses.append(message["status"])
+
+        with common.Timer() as timer:
+            await application(common.asgi_scope(urls[i % len(urls)], cookie), receive, send)
+        assert statuses[0] == 200, statuses[0]
+        return timer.elapsed
+
+    async def main():
+        queue = list(range(requests))
+        latencies = []
+
+        async def worker():
+            while queue:
+                latencies.append(await call(queue.pop()))
+
+        with common.Timer() as total:
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return common.summarize(latencies, total.elapsed)
+
+    return asyncio.run(main())
+
+
+def run_mode(args):
+    common.setup(DJANGO_ASYNC_VIEWS="1" if args.mode == "asgi" else "0")
+    with common.test_database():
+        members = seed(args.users, args.tweets_per_user, args.follows_per_user)
+        urls, cookie = paths(members)
+        run = run_asgi if args.mode == "asgi" else run_wsgi
+        run(urls, cookie, min(args.requests, 50), args.concurrency)  # warm up caches and connections
+        print(json.dumps({"mode": args.mode, **run(urls, cookie, args.requests, args.concurrency)}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["wsgi", "asgi"], help="Run a single mode in this process.")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--tweets-per-user", type=int, default=20)
+    parser.add_argument("--follows-per-user", type=int, default=10)
+    parser.add_argument("--output", help="Also write the results to this JSON file.")
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args)
+        return
+
+    results = []
+    forwarded = [
+        f"--{name.replace('_', '-')}={getattr(args, name)}"
+        for name in ("requests", "concurrency", "users", "tweets_per_user", "follows_per_user")
+    ]
+    for mode in ("wsgi", "asgi"):
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.asgi_vs_wsgi", "--mode", mode, *forwarded],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"{'mode':<6} {'requests':>9} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for result in results:
+        print(
+            f"{result['mode']:<6} {result['requests']:>9} {result['rps']:>9} "
+            f"{result['p50_ms']:>9} {result['p95_ms']:>9} {result['p99_ms']:>9}"
+        )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
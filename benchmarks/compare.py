@@ -0,0 +1,68 @@
+"""Compare two ``benchmarks.load`` result files and flag regressions.
+
+    python -m benchmarks.compare benchmarks/results/<old>.json benchmarks/results/<new>.json
+
+Exits with status 1 when a scenario's p95 latency grew by more than ``--threshold`` percent or it
+issues more queries per request than before.
+"""
+
+import argparse
+import json
+import sys
+
+METRICS = ["rps", "p50_ms", "p95_ms", "p99_ms", "queries_per_request"]
+
+
+def change(old, new):
+    if old is None or new is None:
+        return ""
+    if not old:
+        return "" if old == new else "new"
+    return f"{(new - old) / old * 100:+.1f}%"
+
+
+def regressions(old, new, threshold):
+    found = []
+    for name, row in new["scenarios"].items():
+        before = old["scenarios"].get(name)
+        if before is None:
+            continue
+        if before["p95_ms"] and (row["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100 > threshold:
+            found.append(f"{name}: p95 {before['p95_ms']} ms -> {row['p95_ms']} ms")
+        if row.get("queries_per_request", 0) > before.get("queries_per_request", float("inf")):
+            found.append(
+                f"{name}: {before['queries_per_request']} -> {row['queries_per_request']} queries per request"
+            )
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Allowed p95 growth in percent.")
+    args = parser.parse_args()
+
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+
+    print(f"{old['commit']} -> {new['commit']}")
+    print(f"{'scenario':<9} " + " ".join(f"{metric:>28}" for metric in METRICS))
+    for name, row in new["scenarios"].items():
+        before = old["scenarios"].get(name, {})
+        cells = []
+        for metric in METRICS:
+            a, b = before.get(metric), row.get(metric)
+            cells.append(f"{'-' if a is None else a} -> {'-' if b is None else b} {change(a, b):>7}".rjust(28))
+        print(f"{name:<9} " + " ".join(cells))
+
+    found = regressions(old, new, args.threshold)
+    for line in found:
+        print(f"REGRESSION {line}")
+    sys.exit(1 if found else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Measure password hashing cost and the signup/login throughput it allows per core.
+
+For each hasher (the configured ``PASSWORD_HASHERS`` plus the previous PBKDF2 default) the script
+times ``make_password``/``check_password`` with the costs from ``PASSWORD_HASHER_PARAMS``, then
+posts the signup and login forms through the Django test client in a single thread, so the rates
+are per core:
+
+    python -m benchmarks.hashing --rounds 20
+
+Use the numbers to pick the costs in ``PASSWORD_HASHER_PARAMS``: the highest the login traffic
+(and the rate limits in ``RATE_LIMITS``) leave room for.
+"""
+
+import argparse
+import itertools
+import json
+
+from . import common
+
+HASHERS = {
+    "argon2": "accounts.hashers.Argon2PasswordHasher",
+    "scrypt": "accounts.hashers.ScryptPasswordHasher",
+    "pbkdf2_sha256": "accounts.hashers.PBKDF2PasswordHasher",
+}
+
+
+def rate(function, rounds):
+    latencies = []
+    for _ in range(rounds):
+        with common.Timer() as timer:
+            function()
+        latencies.append(timer.elapsed)
+    return round(rounds / sum(latencies), 1)
+
+
+def measure(hasher, rounds, counter):
+    from django.contrib.auth.hashers import check_password, make_password
+    from django.test import Client, override_settings
+
+    from accounts.models import User
+
+    with override_settings(PASSWORD_HASHERS=[hasher]):
+        encoded = make_password("benchmark password")
+        client = Client()
+
+        def signup():
+            username = f"user{next(counter)}"
+            data = {
+                "username": username,
+                "email": f"{username}@example.com",
+                "password1": "s3cret-pass",
+                "password2": "s3cret-pass",
+            }
+            response = client.post("/accounts/signup/", data, HTTP_HOST="localhost")
+            assert response.status_code == 302, response.status_code
+            client.cookies.clear()
+
+        User.objects.create_user(username="login", password="s3cret-pass")
+
+        def login():
+            data = {"username": "login", "password": "s3cret-pass"}
+            response = client.post("/accounts/login/", data, HTTP_HOST="localhost")
+            assert response.status_code == 302, response.status_code
+            client.cookies.clear()
+
+        result = {
+            "make_per_s": rate(lambda: make_password("benchmark password"), rounds),
+            "check_per_s": rate(lambda: check_password("benchmark password", encoded), rounds),
+            "signups_per_s": rate(signup, rounds),
+            "logins_per_s": rate(login, rounds),
+        }
+        User.objects.filter(username="login").delete()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=20, help="Operations to time per hasher and measure.")
+    parser.add_argument("--output", help="Also write the results to this JSON file.")
+    args = parser.parse_args()
+
+    common.setup()
+    from django.conf import settings
+
+    configured = [path for path in settings.PASSWORD_HASHERS if path in HASHERS.values()]
+    # The previous default, for comparison: PBKDF2 at Django's iteration count.
+    hashers = {name: path for name, path in HASHERS.items() if path in configured}
+    hashers["pbkdf2_sha256 (django)"] = "django.contrib.auth.hashers.PBKDF2PasswordHasher"
+
+    counter = itertools.count()
+    results = {}
+    with common.test_database():
+        for name, path in hashers.items():
+            results[name] = measure(path, args.rounds, counter)
+
+    print(f"{'hasher':<24} {'make/s':>8} {'check/s':>8} {'signups/s':>10} {'logins/s':>9}")
+    for name, row in results.items():
+        print(
+            f"{name:<24} {row['make_per_s']:>8} {row['check_per_s']:>8} "
+            f"{row['signups_per_s']:>10} {row['logins_per_s']:>9}"
+        )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""Drive the main user flows and record throughput, latency percentiles and queries per request.
+
+Every virtual user logs in, then picks weighted scenarios (home, profile, tweet create, like) until
+the request budget is spent; ``login`` is measured on a fresh session each time it is picked.
+
+By default the site runs in-process against a throwaway database filled by ``manage.py seed``, and
+the queries issued by each request are counted:
+
+    python -m benchmarks.load --users 2000 --tweets 20000 --likes 50000 --requests 2000
+
+With ``--url`` the same scenarios run over HTTP against a running server whose data was created
+with ``manage.py seed`` (use the same ``--prefix``, ``--users`` and ``--password``); queries per
+request are then read from the ``X-Query-Count`` header when the server sends it:
+
+    python -m benchmarks.load --url http://127.0.0.1:8000 --users 2000
+
+Results are written to ``benchmarks/results/<commit>.json``; compare two runs with
+``python -m benchmarks.compare``.
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import subprocess
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from http.cookiejar import CookieJar
+
+from . import common
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+SCENARIOS = {"home": 50, "profile": 20, "like": 15, "create": 10, "login": 5}
+TWEET_LINK = re.compile(rb'href="/tweets/(\d+)/"')
+
+
+class ClientSession:
+    """One browser session against the in-process Django handler."""
+
+    def __init__(self):
+        from django.test import Client
+
+        self.client = Client(HTTP_HOST="localhost")
+
+    def request(self, method, path, data=None):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method.lower())(path, data or {})
+        return response.status_code, response.content, len(queries)
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpSession:
+    """One browser session against a running server; CSRF tokens are taken from the cookie jar."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+        self.cookies = CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies), _NoRedirect)
+
+    def csrf_token(self):
+        return next((cookie.value for cookie in self.cookies if cookie.name == "csrftoken"), "")
+
+    def request(self, method, path, data=None):
+        body = None
+        headers = {}
+        if method == "POST":
+            body = urllib.parse.urlencode(data or {}).encode()
+            headers = {"X-CSRFToken": self.csrf_token(), "Referer": self.base_url + path}
+        request = urllib.request.Request(self.base_url + path, data=body, headers=headers, method=method)
+        try:
+            with self.opener.open(request) as response:
+                return response.status, response.read(), self.query_count(response)
+        except urllib.error.HTTPError as e:
+            return e.code, e.read(), self.query_count(e)
+
+    @staticmethod
+    def query_count(response):
+        count = response.headers.get("X-Query-Count")
+        return None if count is None else int(count)
+
+
+class VirtualUser:
+    def __init__(self, new_session, args, rng):
+        self.new_session = new_session
+        self.args = args
+        self.random = rng
+        self.username = self.random_username()
+        self.session = None
+        self.tweet_ids = []
+
+    def random_username(self):
+        return f"{self.args.prefix}{self.random.randrange(self.args.users)}"
+
+    def log_in(self, session, username):
+        session.request("GET", "/accounts/login/")  # sets the CSRF cookie
+        return session.request("POST", "/accounts/login/", {"username": username, "password": self.args.password})
+
+    def run(self, scenario):
+        """Run one scenario and return ``(status, queries, expected status)``."""
+        if self.session is None:
+            self.session = self.new_session()
+            self.log_in(self.session, self.username)
+        if scenario == "login":
+            status, _, queries = self.log_in(self.new_session(), self.random_username())
+            return status, queries, 302
+        if scenario == "home":
+            status, body, queries = self.session.request("GET", "/tweets/home/")
+            self.tweet_ids = [int(pk) for pk in TWEET_LINK.findall(body)] or self.tweet_ids
+            return status, queries, 200
+        if scenario == "profile":
+            status, _, queries = self.session.request("GET", f"/accounts/{self.random_username()}/")
+            return status, queries, 200
+        if scenario == "create":
+            status, _, queries = self.session.request(
+                "POST", "/tweets/create/", {"content": f"load test {self.random.getrandbits(32)}"}
+            )
+            return status, queries, 302
+        if scenario == "like":
+            if not self.tweet_ids:
+                return self.run("home")
+            status, _, queries = self.session.request("POST", f"/tweets/{self.random.choice(self.tweet_ids)}/like/")
+            return status, queries, 200
+        raise ValueError(scenario)
+
+
+def drive(new_session, args):
+    """Run ``args.requests`` scenarios over ``args.concurrency`` virtual users and summarize them per scenario."""
+    names, weights = zip(*SCENARIOS.items())
+    samples = defaultdict(list)
+    lock = threading.Lock()
+    budget = iter(range(args.requests))
+
+    def virtual_user(n):
+        rng = random.Random(None if args.random_seed is None else args.random_seed + n)
+        user = VirtualUser(new_session, args, rng)
+        for _ in budget:
+            scenario = rng.choices(names, weights)[0]
+            with common.Timer() as timer:
+                status, queries, expected = user.run(scenario)
+            with lock:
+                samples[scenario].append((timer.elapsed, queries, status == expected))
+
+    with ThreadPoolExecutor(args.concurrency) as executor, common.Timer() as total:
+        list(executor.map(virtual_user, range(args.concurrency)))
+
+    results = {}
+    for scenario, rows in sorted(samples.items()):
+        latencies, queries, ok = zip(*rows)
+        results[scenario] = common.summarize(latencies, total.elapsed)
+        results[scenario]["errors"] = ok.count(False)
+        if None not in queries:
+            results[scenario]["queries_per_request"] = round(sum(queries) / len(queries), 2)
+    results["total"] = common.summarize([row[0] for rows in samples.values() for row in rows], total.elapsed)
+    return results
+
+
+def git(*args):
+    try:
+        return subprocess.run(["git", *args], check=True, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def run_in_process(args):
+    common.setup()
+    from django.core.management import call_command
+
+    with common.test_database():
+        call_command(
+            "seed",
+            users=args.users,
+            follows=args.follows,
+            tweets=args.tweets,
+            likes=args.likes,
+            prefix=args.prefix,
+            password=args.password,
+            random_seed=args.random_seed,
+            verbosity=0,
+        )
+        warmup = argparse.Namespace(**{**vars(args), "requests": min(args.requests, 50)})
+        drive(ClientSession, warmup)
+        return drive(ClientSession, args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Benchmark a running server instead of the in-process handler.")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--follows", type=int, default=20)
+    parser.add_argument("--tweets", type=int, default=5000)
+    parser.add_argument("--likes", type=int, default=20000)
+    parser.add_argument("--prefix", default="seed")
+    parser.add_argument("--password", default="password")
+    parser.add_argument("--random-seed", type=int, default=0)
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/<commit>.json).")
+    args = parser.parse_args()
+
+    if args.url:
+        scenarios = drive(lambda: HttpSession(args.url), args)
+    else:
+        scenarios = run_in_process(args)
+
+    commit = git("rev-parse", "--short", "HEAD") or "unknown"
+    result = {
+        "commit": commit,
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "target": args.url or "in-process",
+        "parameters": {name: value for name, value in vars(args).items() if name not in ("url", "output")},
+        "scenarios": scenarios,
+    }
+
+    columns = ["requests", "rps", "p50 ms", "p95 ms", "p99 ms", "queries", "errors"]
+    print(f"{'scenario':<9} " + " ".join(f"{column:>9}" for column in columns))
+    for name, row in scenarios.items():
+        print(
+            f"{name:<9} {row['requests']:>9} {row['rps']:>9} {row['p50_ms']:>9} {row['p95_ms']:>9} "
+            f"{row['p99_ms']:>9} {row.get('queries_per_request', '-'):>9} {row.get('errors', '-'):>9}"
+        )
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"written to {output}")
+
+
+if __name__ == "__main__":
+    main()
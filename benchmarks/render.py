@@ -0,0 +1,138 @@
+"""Compare template render time and response size of the template profiles.
+
+Each profile runs in its own process (the template engines are configured once per process):
+
+* ``uncached``: plain filesystem/app-directories loaders, every render reads and compiles again;
+* ``development``: the default settings, Django's cached loader without minification;
+* ``production``: the production profile's cached, minifying loaders, warmed up at startup.
+
+For every page the view runs once and its ``TemplateResponse`` is then re-rendered ``--renders``
+times, so the numbers isolate template loading and rendering from the queries:
+
+    python -m benchmarks.render --renders 500
+"""
+
+import argparse
+import gzip
+import json
+import os
+import subprocess
+import sys
+
+from . import common
+
+PROFILES = ["uncached", "development", "production"]
+PROFILE_ENVIRON = {
+    "production": {
+        "DJANGO_ENV": "production",
+        "DJANGO_DB_ENGINE": "sqlite",
+        "DJANGO_SECRET_KEY": "benchmark",
+        "DJANGO_ALLOWED_HOSTS": "localhost",
+    },
+}
+
+
+def pages():
+    from accounts.models import User
+    from tweets.models import Tweet
+
+    viewer = User.objects.order_by("-follower_count").first()
+    tweet = Tweet.objects.first()
+    return viewer, {
+        "home": "/tweets/home/",
+        "profile": f"/accounts/{viewer.username}/",
+        "detail": f"/tweets/{tweet.pk}/",
+        "login": "/accounts/login/",
+    }
+
+
+def run_profile(args):
+    common.setup(**PROFILE_ENVIRON.get(args.profile, {"DJANGO_ENV": "development"}))
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.test import Client
+
+    from mysite.templating import warm_up
+
+    if args.profile == "uncached":
+        settings.TEMPLATES = [
+            {
+                **settings.TEMPLATES[0],
+                "APP_DIRS": False,
+                "OPTIONS": {
+                    **settings.TEMPLATES[0]["OPTIONS"],
+                    "loaders": [
+                        "django.template.loaders.filesystem.Loader",
+                        "django.template.loaders.app_directories.Loader",
+                    ],
+                },
+            }
+        ]
+
+    with common.test_database():
+        call_command("seed", users=50, follows=10, tweets=1000, likes=2000, random_seed=0, verbosity=0)
+        result = {"profile": args.profile, "pages": {}}
+        if settings.TEMPLATE_WARM_UP:
+            with common.Timer() as timer:
+                count = warm_up()
+            result["warm_up"] = {"templates": count, "ms": round(timer.elapsed * 1000, 2)}
+        viewer, urls = pages()
+        for name, url in urls.items():
+            client = Client(HTTP_HOST="localhost")
+            if name != "login":
+                client.force_login(viewer)
+            response = client.get(url)
+            assert response.status_code == 200, (url, response.status_code)
+            latencies = []
+            for _ in range(args.renders):
+                with common.Timer() as timer:
+                    content = response.rendered_content
+                latencies.append(timer.elapsed)
+            body = content.encode()
+            result["pages"][name] = {
+                **common.summarize(latencies, sum(latencies)),
+                "bytes": len(body),
+                "gzip_bytes": len(gzip.compress(body)),
+            }
+        print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profile", choices=PROFILES, help="Run a single profile in this process.")
+    parser.add_argument("--renders", type=int, default=500)
+    parser.add_argument("--output", help="Also write the results to this JSON file.")
+    args = parser.parse_args()
+
+    if args.profile:
+        run_profile(args)
+        return
+
+    results = []
+    for profile in PROFILES:
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.render", "--profile", profile, f"--renders={args.renders}"],
+            check=True,
+            capture_output=True,
+            text=True,
+            env={**os.environ, "DJANGO_ENV": "development"},
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"{'profile':<12} {'page':<8} {'p50 ms':>9} {'p95 ms':>9} {'bytes':>9} {'gzip':>9}")
+    for result in results:
+        for page, row in result["pages"].items():
+            print(
+                f"{result['profile']:<12} {page:<8} {row['p50_ms']:>9} {row['p95_ms']:>9} "
+                f"{row['bytes']:>9} {row['gzip_bytes']:>9}"
+            )
+        if "warm_up" in result:
+            warm_up = result["warm_up"]
+            print(f"{result['profile']:<12} warm-up: {warm_up['templates']} templates in {warm_up['ms']} ms")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
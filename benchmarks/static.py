@@ -0,0 +1,121 @@
+"""Compare serving the collected static assets before and after the static pipeline.
+
+* ``before``: unversioned, uncompressed files through ``django.views.static.serve``; browsers must
+  revalidate every asset on each visit (``If-Modified-Since``, answered with 304).
+* ``after``: hashed, precompressed files through ``mysite.staticfiles.StaticFilesMiddleware``;
+  immutable assets are not requested again on later visits.
+
+Every CSS/JS file collected by ``collectstatic`` (the project's and the admin's) is requested with
+``Accept-Encoding: gzip, br``, and per-request serving time plus the bytes of a first and a
+repeat visit are reported:
+
+    python -m benchmarks.static --rounds 50
+"""
+
+import argparse
+import json
+import os
+import tempfile
+
+from . import common
+
+
+def first_visit(serve, urls):
+    latencies, transferred = [], 0
+    for url in urls:
+        with common.Timer() as timer:
+            response = serve(url, {})
+            body = b"".join(response.streaming_content) if response.streaming else response.content
+        assert response.status_code == 200, (url, response.status_code)
+        latencies.append(timer.elapsed)
+        transferred += len(body)
+    return latencies, transferred
+
+
+def repeat_visit(serve, urls, cached):
+    """Requests and bytes of a second visit by a browser that kept the first visit's responses."""
+    requests, transferred = 0, 0
+    for url in urls:
+        response = cached[url]
+        if "immutable" in response.get("Cache-Control", ""):
+            continue
+        headers = {}
+        if response.has_header("Last-Modified"):
+            headers["HTTP_IF_MODIFIED_SINCE"] = response["Last-Modified"]
+        if response.has_header("ETag"):
+            headers["HTTP_IF_NONE_MATCH"] = response["ETag"]
+        response = serve(url, headers)
+        requests += 1
+        transferred += len(b"".join(response.streaming_content) if response.streaming else response.content)
+    return requests, transferred
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=50, help="First visits to time per mode.")
+    parser.add_argument("--output", help="Also write the results to this JSON file.")
+    args = parser.parse_args()
+
+    common.setup()
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.http import HttpResponseNotFound
+    from django.test import RequestFactory
+    from django.views.static import serve as django_serve
+
+    from mysite.staticfiles import StaticFilesMiddleware
+
+    factory = RequestFactory()
+    with tempfile.TemporaryDirectory() as root:
+        settings.STATIC_ROOT = root
+        settings.STATIC_SERVE = True
+        settings.STORAGES = {
+            **settings.STORAGES,
+            "staticfiles": {"BACKEND": "mysite.staticfiles.CompressedManifestStaticFilesStorage"},
+        }
+        call_command("collectstatic", interactive=False, verbosity=0)
+        with open(os.path.join(root, "staticfiles.json")) as f:
+            manifest = json.load(f)["paths"]
+        originals = sorted(name for name in manifest if name.endswith((".css", ".js")))
+        middleware = StaticFilesMiddleware(lambda request: HttpResponseNotFound())
+
+        def serve_before(url, headers):
+            request = factory.get(url, HTTP_ACCEPT_ENCODING="gzip, br", **headers)
+            return django_serve(request, url.removeprefix("/static/"), document_root=root)
+
+        def serve_after(url, headers):
+            return middleware(factory.get(url, HTTP_ACCEPT_ENCODING="gzip, br", **headers))
+
+        modes = {
+            "before": (serve_before, [f"/static/{name}" for name in originals]),
+            "after": (serve_after, [f"/static/{manifest[name]}" for name in originals]),
+        }
+        results = {}
+        for mode, (serve, urls) in modes.items():
+            latencies = []
+            for _ in range(args.rounds):
+                round_latencies, transferred = first_visit(serve, urls)
+                latencies.extend(round_latencies)
+            cached = {url: serve(url, {}) for url in urls}
+            repeat_requests, repeat_bytes = repeat_visit(serve, urls, cached)
+            results[mode] = {
+                **common.summarize(latencies, sum(latencies)),
+                "assets": len(urls),
+                "first_visit_bytes": transferred,
+                "repeat_visit_requests": repeat_requests,
+                "repeat_visit_bytes": repeat_bytes,
+            }
+
+    print(f"{'mode':<7} {'assets':>7} {'p50 ms':>8} {'p95 ms':>8} {'1st bytes':>10} {'2nd reqs':>9} {'2nd bytes':>10}")
+    for mode, row in results.items():
+        print(
+            f"{mode:<7} {row['assets']:>7} {row['p50_ms']:>8} {row['p95_ms']:>8} {row['first_visit_bytes']:>10} "
+            f"{row['repeat_visit_requests']:>9} {row['repeat_visit_bytes']:>10}"
+        )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Measure the cost of open feed streams and how fast new tweets reach them.
+
+Opens ``--connections`` Server-Sent Events streams (``/tweets/stream/``) on the ASGI handler
+in-process, one per follower of a single author, and reports the memory held per idle stream
+(tracemalloc, Python allocations only) and the latency from a tweet's creation to its event on each
+stream, over ``--tweets`` tweets:
+
+    python -m benchmarks.stream --connections 1000 --tweets 20
+
+``--coalesce`` is ``STREAM_COALESCE_DELAY`` (0 by default, so the latency is the delivery path's);
+``--celebrity`` makes the author a celebrity, whose tweets are published once to the author channel
+instead of once per follower.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import tracemalloc
+
+from . import common
+
+
+def seed(connections, celebrity):
+    from django.conf import settings
+
+    from accounts.models import FriendShip, User
+
+    author = User.objects.create_user(username="author", password="benchmark")
+    User.objects.bulk_create(User(username=f"user{i}") for i in range(connections))
+    followers = list(User.objects.exclude(pk=author.pk))
+    FriendShip.objects.bulk_create(FriendShip(follower=follower, following=author) for follower in followers)
+    limit = settings.TIMELINE_FANOUT_FOLLOWER_LIMIT
+    User.objects.filter(pk=author.pk).update(follower_count=limit + 1 if celebrity else min(connections, limit))
+    return author, [common.session_cookie(follower) for follower in followers]
+
+
+async def open_stream(application, cookie, received):
+    """Run one stream until cancelled; put ``(time, chunk)`` on ``received`` for every body chunk."""
+    started = asyncio.Event()
+    disconnect = asyncio.Event()
+
+    async def receive():
+        if not started.is_set():
+            started.set()
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await disconnect.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            assert message["status"] == 200, message["status"]
+        elif message.get("body"):
+            received.put_nowait((time.perf_counter(), message["body"]))
+
+    await application(common.asgi_scope("/tweets/stream/", cookie), receive, send)
+
+
+async def run(author, cookies, tweets):
+    from asgiref.sync import sync_to_async
+    from django.core.handlers.asgi import ASGIHandler
+
+    from tweets.models import Tweet
+
+    application = ASGIHandler()
+    queues = [asyncio.Queue() for _ in cookies]
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    tasks = [asyncio.create_task(open_stream(application, cookie, queue)) for cookie, queue in zip(cookies, queues)]
+    # Every stream has subscribed once it sent its retry line.
+    for queue in queues:
+        await queue.get()
+    per_connection = (tracemalloc.get_traced_memory()[0] - before) / len(cookies)
+    tracemalloc.stop()
+
+    latencies = []
+    create = sync_to_async(Tweet.objects.create)
+    with common.Timer() as total:
+        for n in range(tweets):
+            created = time.perf_counter()
+            await create(user=author, content=f"tweet {n}")
+            for queue in queues:
+                while True:
+                    at, chunk = await queue.get()
+                    if chunk.startswith(b"event: tweets"):
+                        latencies.append(at - created)
+                        break
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return {
+        "connections": len(cookies),
+        "bytes_per_connection": round(per_connection),
+        **common.summarize(latencies, total.elapsed),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connections", type=int, default=1000)
+    parser.add_argument("--tweets", type=int, default=20)
+    parser.add_argument("--coalesce", type=float, default=0.0)
+    parser.add_argument("--celebrity", action="store_true")
+    args = parser.parse_args()
+
+    common.setup(DJANGO_ASYNC_VIEWS="1")
+    from django.conf import settings
+
+    settings.TASKS_EAGER = True
+    settings.STREAM_COALESCE_DELAY = args.coalesce
+    settings.STREAM_MAX_AGE = 24 * 60 * 60
+    with common.test_database():
+        author, cookies = seed(args.connections, args.celebrity)
+        print(json.dumps(asyncio.run(run(author, cookies, args.tweets))))
+
+
+if __name__ == "__main__":
+    main()
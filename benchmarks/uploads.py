@@ -0,0 +1,176 @@
+"""Measure large attachment uploads: throughput and peak memory of parsing and storing them.
+
+A multipart body with one ``--size-mb`` image is parsed from disk (no HTTP server involved) and
+stored, ``--rounds`` times per mode:
+
+* ``django``: Django's default upload handlers (in memory up to 2.5 MB, then a temporary file in
+  the system temp directory), the file hashed in a second pass for deduplication and saved with
+  ``FileSystemStorage``;
+* ``streaming``: :class:`~tweets.attachments.AttachmentUploadHandler` and
+  :func:`~tweets.attachments.store`, which hash while streaming into ``MEDIA_ROOT`` and rename.
+
+Peak memory is measured with tracemalloc (Python allocations) in separate rounds, so the tracing
+overhead does not skew the throughput. With Pillow installed, ``--variants`` also times the
+``make_variants`` task on a ``--width`` x ``--height`` photo-like JPEG:
+
+    python -m benchmarks.uploads --size-mb 8 --rounds 5 --variants
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import tracemalloc
+
+from . import common
+
+BOUNDARY = "benchmark-boundary"
+
+
+def write_body(directory, size):
+    """A multipart body holding one ``size`` byte (random, JPEG-signed) file."""
+    path = os.path.join(directory, "body")
+    with open(path, "wb") as f:
+        f.write(
+            f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="attachments"; filename="image.jpg"\r\n'
+            "Content-Type: image/jpeg\r\n\r\n".encode()
+        )
+        f.write(b"\xff\xd8\xff\xe0")
+        block = os.urandom(1024 * 1024)
+        remaining = size - 4
+        while remaining > 0:
+            f.write(block[:remaining])
+            remaining -= len(block)
+        f.write(f"\r\n--{BOUNDARY}--\r\n".encode())
+    return path
+
+
+def parse(path, handlers):
+    from django.http.multipartparser import MultiPartParser
+
+    meta = {
+        "CONTENT_TYPE": f"multipart/form-data; boundary={BOUNDARY}",
+        "CONTENT_LENGTH": str(os.path.getsize(path)),
+    }
+    with open(path, "rb") as stream:
+        _, files = MultiPartParser(meta, stream, handlers).parse()
+    return files["attachments"]
+
+
+def upload_django(path):
+    from django.conf import settings
+    from django.core.files.storage import FileSystemStorage
+    from django.core.files.uploadhandler import load_handler
+
+    upload = parse(path, [load_handler(handler) for handler in settings.FILE_UPLOAD_HANDLERS])
+    hasher = hashlib.sha256()
+    for chunk in upload.chunks():
+        hasher.update(chunk)
+    storage = FileSystemStorage(os.path.join(settings.MEDIA_ROOT, "django"))
+    digest = hasher.hexdigest()
+    if not storage.exists(digest):
+        storage.save(digest, upload)
+    upload.close()
+
+
+def upload_streaming(path):
+    from tweets import attachments
+
+    upload = parse(path, [attachments.AttachmentUploadHandler()])
+    attachments.store(upload)
+    upload.close()
+
+
+MODES = {"django": upload_django, "streaming": upload_streaming}
+
+
+def run(mode, path, size, rounds):
+    from django.conf import settings
+
+    def upload():
+        MODES[mode](path)
+        # Every round stores the image anew rather than finding it deduplicated.
+        shutil.rmtree(settings.MEDIA_ROOT)
+        os.makedirs(settings.MEDIA_ROOT)
+
+    latencies = []
+    for _ in range(rounds):
+        with common.Timer() as timer:
+            upload()
+        latencies.append(timer.elapsed)
+    peaks = []
+    for _ in range(rounds):
+        tracemalloc.start()
+        upload()
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    latencies.sort()
+    return {
+        "mode": mode,
+        "size_mb": round(size / 1024 / 1024, 1),
+        "mb_per_s": round(size * rounds / sum(latencies) / 1024 / 1024, 1),
+        "p50_ms": round(common.percentile(latencies, 50) * 1000, 2),
+        "peak_kb": round(max(peaks) / 1024),
+    }
+
+
+def run_variants(width, height, rounds):
+    from django.conf import settings
+
+    from tweets import attachments
+
+    # Smooth gradients with noise compress and decode like a photo, unlike a flat or random image.
+    image = attachments.Image.linear_gradient("L").resize((width, height))
+    noise = attachments.Image.effect_noise((width, height), 40)
+    photo = attachments.Image.merge("RGB", [image, noise, image.transpose(attachments.Image.FLIP_LEFT_RIGHT)])
+    digest = "0" * 64
+    os.makedirs(os.path.dirname(attachments.blob_path(digest)), exist_ok=True)
+    photo.save(attachments.blob_path(digest), "JPEG", quality=90)
+    latencies = []
+    for _ in range(rounds):
+        shutil.rmtree(os.path.join(settings.MEDIA_ROOT, "variants"), ignore_errors=True)
+        with common.Timer() as timer:
+            written = attachments.make_variants(digest)
+        assert written, "no variant written"
+        latencies.append(timer.elapsed)
+    latencies.sort()
+    return {
+        "mode": "make_variants",
+        "source": f"{width}x{height}",
+        "size_mb": round(os.path.getsize(attachments.blob_path(digest)) / 1024 / 1024, 1),
+        "p50_ms": round(common.percentile(latencies, 50) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=float, default=8)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--variants", action="store_true", help="Also time make_variants (requires Pillow).")
+    parser.add_argument("--width", type=int, default=4000)
+    parser.add_argument("--height", type=int, default=3000)
+    args = parser.parse_args()
+
+    common.setup()
+    from django.conf import settings
+
+    from tweets import attachments
+
+    size = int(args.size_mb * 1024 * 1024)
+    settings.ATTACHMENT_MAX_SIZE = max(settings.ATTACHMENT_MAX_SIZE, size)
+    with tempfile.TemporaryDirectory() as directory:
+        path = write_body(directory, size)
+        settings.MEDIA_ROOT = os.path.join(directory, "media")
+        os.makedirs(settings.MEDIA_ROOT)
+        for mode in MODES:
+            print(json.dumps(run(mode, path, size, args.rounds)))
+        if args.variants:
+            if attachments.Image is None:
+                parser.error("--variants requires Pillow")
+            print(json.dumps(run_variants(args.width, args.height, args.rounds)))
+
+
+if __name__ == "__main__":
+    main()
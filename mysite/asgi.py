@@ -9,8 +9,20 @@ https://docs.djangoproject.com/en/4.0/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
+from mysite.pubsub import get_broker
+
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mysite.settings")
+os.environ.setdefault("DJANGO_ASYNC_VIEWS", "1")
 
 application = get_asgi_application()
+
+# Fail at startup rather than silently streaming nothing when the broker is misconfigured.
+get_broker()
+
+if settings.TEMPLATE_WARM_UP:
+    from mysite.templating import warm_up
+
+    warm_up()
@@ -0,0 +1,63 @@
+"""Denormalized counter columns.
+
+Counters are adjusted in place with ``F()`` expressions so concurrent writers never lose
+increments, and :func:`reconcile` periodically rewrites any drifted value from the source rows.
+"""
+
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+
+def adjust(model, pk, **deltas):
+    """Atomically add ``deltas`` (field name to signed delta) to the row ``pk`` of ``model``."""
+    model.objects.filter(pk=pk).update(**{field: Greatest(F(field) + delta, 0) for field, delta in deltas.items()})
+
+
+def count_subquery(related_model, fk_name):
+    """A correlated ``COUNT`` of ``related_model`` rows pointing at the outer row through ``fk_name``."""
+    counts = (
+        related_model.objects.filter(**{fk_name: OuterRef("pk")})
+        .order_by()
+        .values(fk_name)
+        .annotate(count=Count("pk"))
+        .values("count")
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def reconcile(model, counters, batch_size=1000, dry_run=False):
+    """Fix drifted counters of ``model`` batch by batch.
+
+    ``counters`` maps each counter field to the ``(related_model, fk_name)`` it counts. Every batch
+    runs in its own short transaction and only drifted rows are rewritten, so the table is never
+    locked as a whole. Yields ``(last_pk, drifted)`` after each batch.
+    """
+    last_pk = None
+    while True:
+        with transaction.atomic():
+            rows = model.objects.order_by("pk")
+            if last_pk is not None:
+                rows = rows.filter(pk__gt=last_pk)
+            rows = list(rows.values("pk", *counters)[:batch_size])
+            if not rows:
+                return
+            ids = [row["pk"] for row in rows]
+            actual = {
+                field: dict(
+                    related_model.objects.filter(**{f"{fk_name}__in": ids})
+                    .order_by()
+                    .values_list(fk_name)
+                    .annotate(Count("pk"))
+                )
+                for field, (related_model, fk_name) in counters.items()
+            }
+            drifted = [
+                row["pk"] for row in rows if any(row[field] != actual[field].get(row["pk"], 0) for field in counters)
+            ]
+            if drifted and not dry_run:
+                model.objects.filter(pk__in=drifted).update(
+                    **{field: count_subquery(*source) for field, source in counters.items()}
+                )
+        last_pk = ids[-1]
+        yield last_pk, len(drifted)
@@ -0,0 +1,265 @@
+"""Per-request query and latency instrumentation.
+
+``RequestMetricsMiddleware`` sits before every middleware that does I/O (after the security headers
+and the static files) so that session and auth I/O are included. For each request it records the
+number of queries, the time spent in the database, the time spent rendering the ``TemplateResponse``
+and the wall time, and aggregates them per URL name into fixed-bucket histograms served by
+:class:`mysite.views.RequestMetricsView`.
+
+Requests over their ``REQUEST_BUDGETS`` are logged to ``mysite.instrumentation`` together with the
+statements that ran more than once (usually an N+1). A ``REQUEST_PROFILE_SAMPLE_RATE`` fraction of
+requests runs under cProfile; the profile of a sampled request that went over budget is dumped to
+``REQUEST_PROFILE_DIR``. The profiler hooks the interpreter, so only one request per process is
+profiled at a time, and only in sync mode: under ASGI every request shares the event loop thread
+and the profile would mix them up.
+
+Queries are attributed through a context variable, so ORM calls that async views run in worker
+threads are counted too. Template time includes queries that lazy querysets issue while rendering.
+"""
+
+import cProfile
+import logging
+import os
+import random
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+MS_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144)
+RECENT_SLOW_REQUESTS = 50
+
+_current = ContextVar("request_metrics", default=None)
+_lock = threading.Lock()
+_profiling = threading.Lock()
+_routes = {}
+_slow = deque(maxlen=RECENT_SLOW_REQUESTS)
+
+
+class Histogram:
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0
+
+    def add(self, value):
+        index = next((i for i, bound in enumerate(self.bounds) if value <= bound), len(self.bounds))
+        self.counts[index] += 1
+        self.total += value
+
+    def percentile(self, pct):
+        """Upper bound of the bucket holding the ``pct``-th percentile (``None`` past the last bound)."""
+        target = sum(self.counts) * pct / 100
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= target:
+                return self.bounds[index] if index < len(self.bounds) else None
+        return None
+
+    def as_dict(self):
+        requests = sum(self.counts)
+        return {
+            "mean": round(self.total / requests, 2) if requests else None,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "buckets": {
+                **{f"le_{bound}": count for bound, count in zip(self.bounds, self.counts)},
+                "overflow": self.counts[-1],
+            },
+        }
+
+
+class RouteStats:
+    def __init__(self):
+        self.requests = 0
+        self.over_budget = 0
+        self.histograms = {
+            "wall_ms": Histogram(MS_BUCKETS),
+            "db_ms": Histogram(MS_BUCKETS),
+            "template_ms": Histogram(MS_BUCKETS),
+            "queries": Histogram(QUERY_BUCKETS),
+        }
+
+    def as_dict(self):
+        return {
+            "requests": self.requests,
+            "over_budget": self.over_budget,
+            **{name: histogram.as_dict() for name, histogram in self.histograms.items()},
+        }
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.wall_time = None
+        self.statements = Counter()
+
+    def as_dict(self):
+        return {
+            "wall_ms": round(self.wall_time * 1000, 2),
+            "db_ms": round(self.db_time * 1000, 2),
+            "template_ms": round(self.template_time * 1000, 2),
+            "queries": self.queries,
+        }
+
+    def duplicates(self):
+        return [(sql, count) for sql, count in self.statements.most_common() if count > 1]
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_time += time.perf_counter() - start
+        metrics.queries += 1
+        metrics.statements[sql] += 1
+
+
+def _install(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+connection_created.connect(_install)
+
+
+def budget_for(route):
+    budgets = settings.REQUEST_BUDGETS
+    return {**budgets.get("default", {}), **budgets.get(route, {})}
+
+
+def over_budget(metrics, budget):
+    return [
+        f"{name} {value} > {budget[name]}"
+        for name, value in metrics.as_dict().items()
+        if name in budget and value > budget[name]
+    ]
+
+
+def record(route, metrics, profiler=None):
+    """Aggregate a finished request and report it if it went over budget."""
+    values = metrics.as_dict()
+    exceeded = over_budget(metrics, budget_for(route))
+    with _lock:
+        stats = _routes.setdefault(route, RouteStats())
+        stats.requests += 1
+        stats.over_budget += bool(exceeded)
+        for name, histogram in stats.histograms.items():
+            histogram.add(values[name])
+        if exceeded:
+            _slow.append({"route": route, **values, "exceeded": exceeded})
+    if not exceeded:
+        return
+    duplicates = metrics.duplicates()
+    logger.warning(
+        "%s over budget (%s); %s",
+        route,
+        ", ".join(exceeded),
+        "; ".join(f"{count}x {sql}" for sql, count in duplicates[:5]) or "no duplicate queries",
+    )
+    if profiler is not None:
+        os.makedirs(settings.REQUEST_PROFILE_DIR, exist_ok=True)
+        path = os.path.join(settings.REQUEST_PROFILE_DIR, f"{route.replace(':', '-')}-{time.time_ns()}.prof")
+        profiler.dump_stats(path)
+        logger.warning("%s profile written to %s", route, path)
+
+
+def snapshot():
+    with _lock:
+        return {
+            "routes": {route: stats.as_dict() for route, stats in sorted(_routes.items())},
+            "slow_requests": list(_slow),
+        }
+
+
+def reset():
+    with _lock:
+        _routes.clear()
+        _slow.clear()
+
+
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        metrics, token = self.start()
+        profiler = self.start_profiler()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+            if profiler is not None:
+                profiler.disable()
+                _profiling.release()
+        return self.finish(request, response, metrics, profiler)
+
+    async def __acall__(self, request):
+        metrics, token = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    def start(self):
+        for connection in connections.all(initialized_only=True):
+            _install(connection)
+        metrics = RequestMetrics()
+        return metrics, _current.set(metrics)
+
+    def start_profiler(self):
+        if random.random() < settings.REQUEST_PROFILE_SAMPLE_RATE and _profiling.acquire(blocking=False):
+            profiler = cProfile.Profile()
+            profiler.enable()
+            return profiler
+        return None
+
+    def finish(self, request, response, metrics, profiler=None):
+        metrics.wall_time = time.perf_counter() - metrics.start
+        match = request.resolver_match
+        record(match.view_name if match else "<unresolved>", metrics, profiler)
+        if settings.REQUEST_METRICS_HEADERS:
+            values = metrics.as_dict()
+            response["X-Query-Count"] = str(metrics.queries)
+            response["Server-Timing"] = (
+                f"db;dur={values['db_ms']}, tpl;dur={values['template_ms']}, total;dur={values['wall_ms']}"
+            )
+        return response
+
+    def process_template_response(self, request, response):
+        # Template response middleware runs right before render(), so this times the render itself.
+        metrics = _current.get()
+        if metrics is not None:
+            start = time.perf_counter()
+
+            def rendered(response):
+                metrics.template_time += time.perf_counter() - start
+
+            response.add_post_render_callback(rendered)
+        return response
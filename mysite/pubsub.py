@@ -0,0 +1,171 @@
+"""Publish/subscribe for streaming responses, with a pluggable backend.
+
+:func:`get_broker` returns the process' ``PUBSUB_BACKEND``, built with ``PUBSUB_OPTIONS`` (the ASGI
+app builds it at startup, so a misconfigured broker fails there):
+
+* :class:`LocalBroker` delivers what is published in this process only. That is enough when tasks
+  run inline (``TASKS_EAGER``) and a single ASGI worker serves the streams.
+* :class:`RedisBroker` relays every message through Redis (optional ``redis`` package), so that
+  messages published by any web or task worker reach the subscribers of every ASGI worker.
+
+Publishing is thread-safe and never blocks: messages are handed to each subscriber's event loop.
+A :class:`Subscription` buffers at most ``maxsize`` messages; when a slow or stalled client lets it
+fill up, the oldest message is dropped and counted instead, so an idle connection costs a few
+hundred bytes and a stuck one no more than its buffer.
+"""
+
+import asyncio
+import json
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+try:
+    import redis
+    import redis.asyncio
+except ImportError:
+    redis = None
+
+
+class Subscription:
+    __slots__ = ("broker", "channels", "dropped", "_loop", "_messages", "_ready")
+
+    def __init__(self, broker, channels, maxsize):
+        self.broker = broker
+        self.channels = tuple(channels)
+        self.dropped = 0
+        self._loop = asyncio.get_running_loop()
+        self._messages = deque(maxlen=maxsize)
+        self._ready = asyncio.Event()
+
+    def _put(self, message):
+        if len(self._messages) == self._messages.maxlen:
+            self.dropped += 1
+        self._messages.append(message)
+        self._ready.set()
+
+    async def wait(self, timeout):
+        """Wait up to ``timeout`` seconds for a message; return whether there is one."""
+        if not self._messages:
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except TimeoutError:
+                return False
+        return True
+
+    def drain(self):
+        """Return the buffered messages and how many were dropped since the last call."""
+        messages, dropped = list(self._messages), self.dropped
+        self._messages.clear()
+        self._ready.clear()
+        self.dropped = 0
+        return messages, dropped
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    def __init__(self, **options):
+        # With task workers the fan-out publishes in another process, and no stream would hear of it.
+        if type(self) is LocalBroker and not settings.TASKS_EAGER:
+            raise ImproperlyConfigured("LocalBroker requires TASKS_EAGER; use RedisBroker with task workers.")
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, channels, maxsize):
+        """Subscribe the running event loop to ``channels``; close the subscription when done."""
+        subscription = Subscription(self, channels, maxsize)
+        with self._lock:
+            for channel in subscription.channels:
+                self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._channels.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._channels[channel]
+
+    def subscriber_count(self):
+        with self._lock:
+            return len({subscription for subscribers in self._channels.values() for subscription in subscribers})
+
+    def publish(self, channel, message):
+        self.publish_many([(channel, message)])
+
+    def publish_many(self, messages):
+        """Publish ``(channel, message)`` pairs; messages must be JSON serializable."""
+        self._deliver(messages)
+
+    def _deliver(self, messages):
+        with self._lock:
+            deliveries = [
+                (subscription, message)
+                for channel, message in messages
+                for subscription in self._channels.get(channel, ())
+            ]
+        for subscription, message in deliveries:
+            try:
+                subscription._loop.call_soon_threadsafe(subscription._put, message)
+            except RuntimeError:
+                # The subscriber's event loop is closed.
+                self.unsubscribe(subscription)
+
+
+class RedisBroker(LocalBroker):
+    """Relay messages through Redis pub/sub; each process listens on one connection for all channels."""
+
+    def __init__(self, url="redis://localhost:6379/0", prefix="mysite:pubsub:", **options):
+        if redis is None:
+            raise ImproperlyConfigured("RedisBroker requires the redis package.")
+        super().__init__(**options)
+        self.url = url
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+        self._listener = None
+
+    def subscribe(self, channels, maxsize):
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.get_running_loop().create_task(self._listen())
+        return super().subscribe(channels, maxsize)
+
+    def publish_many(self, messages):
+        pipeline = self._client.pipeline(transaction=False)
+        for channel, message in messages:
+            pipeline.publish(self.prefix + channel, json.dumps(message))
+        pipeline.execute()
+
+    async def _listen(self):
+        client = redis.asyncio.Redis.from_url(self.url)
+        async with client.pubsub() as pubsub:
+            await pubsub.psubscribe(self.prefix + "*")
+            async for message in pubsub.listen():
+                if message["type"] == "pmessage":
+                    channel = message["channel"].decode()[len(self.prefix) :]
+                    self._deliver([(channel, json.loads(message["data"]))])
+
+
+_broker = None
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        _broker = import_string(settings.PUBSUB_BACKEND)(**settings.PUBSUB_OPTIONS)
+    return _broker
+
+
+@receiver(setting_changed)
+def _reset_broker(setting, **kwargs):
+    global _broker
+    if setting in ("PUBSUB_BACKEND", "PUBSUB_OPTIONS", "TASKS_EAGER"):
+        _broker = None
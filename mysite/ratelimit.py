@@ -0,0 +1,171 @@
+"""Token-bucket rate limiting of write requests per URL name.
+
+``RATE_LIMITS`` maps URL names to ``{"rate": "10/m", "burst": 20, "key": "user"}``. Every client (the
+user, or the IP address for ``"ip"`` limits and anonymous requests) gets a bucket of ``burst``
+tokens refilled at ``rate``; each POST takes a token or is answered with ``429 Too Many Requests``.
+
+A bucket is two keys in the ``RATE_LIMIT_CACHE`` cache: the time it started filling and an
+atomically incremented count of the tokens taken since. The tokens left are ``burst`` plus what
+was refilled since the start minus what was taken, so a check is one ``get`` and one ``incr`` and
+never touches the database. The cache is per process with the default local-memory backend; use a
+shared cache (Redis, memcached) to enforce the limits across processes.
+
+Behind a reverse proxy every request comes from the proxy's address. Requests from one of the
+``RATE_LIMIT_TRUSTED_PROXIES`` (addresses or networks) are attributed to the rightmost
+``X-Forwarded-For`` address that is not a trusted proxy itself; the header is ignored otherwise,
+since any client can send it.
+"""
+
+import functools
+import ipaddress
+import math
+import threading
+import time
+from collections import Counter, defaultdict
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+LIMITED_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+PERIODS = {"s": 1, "m": 60, "h": 60 * 60, "d": 24 * 60 * 60}
+# Buckets outlive their refill time so that a slow but steady client cannot reset its bucket by
+# waiting for the keys to expire; the start is re-based instead whenever the bucket is full.
+BUCKET_TIMEOUT = 24 * 60 * 60
+
+_stats = defaultdict(Counter)
+_stats_lock = threading.Lock()
+
+
+def parse_rate(rate):
+    """Tokens per second of a ``"<count>/<s|m|h|d>"`` rate."""
+    count, _, period = rate.partition("/")
+    return int(count) / PERIODS[period]
+
+
+def take(scope, client, rate, burst, now=None):
+    """Take a token from ``client``'s bucket for ``scope``.
+
+    Returns 0 when a token was taken, otherwise the seconds until the next one is available.
+    """
+    cache = caches[settings.RATE_LIMIT_CACHE]
+    now = time.time() if now is None else now
+    start_key, taken_key = f"ratelimit:{scope}:{client}:start", f"ratelimit:{scope}:{client}:taken"
+    start = cache.get(start_key)
+    if start is None:
+        cache.add(start_key, now, BUCKET_TIMEOUT)
+        start = cache.get(start_key, now)
+    try:
+        taken = cache.incr(taken_key)
+    except ValueError:
+        cache.add(taken_key, 0, BUCKET_TIMEOUT)
+        taken = cache.incr(taken_key)
+    left = burst + (now - start) * rate - (taken - 1)
+    if left > burst:
+        # The bucket was full: move its start so that it holds exactly ``burst`` tokens.
+        cache.set(start_key, now - (taken - 1) / rate, BUCKET_TIMEOUT)
+        left = burst
+    if left >= 1:
+        return 0
+    # Rejected requests do not use up tokens.
+    cache.decr(taken_key)
+    return (1 - left) / rate
+
+
+@functools.lru_cache(maxsize=None)
+def _networks(proxies):
+    return [ipaddress.ip_network(proxy, strict=False) for proxy in proxies]
+
+
+def _is_trusted(address, proxies):
+    try:
+        address = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(address in network for network in _networks(tuple(proxies)))
+
+
+def client_ip(request):
+    """The address of the client, looking through ``RATE_LIMIT_TRUSTED_PROXIES``."""
+    proxies = settings.RATE_LIMIT_TRUSTED_PROXIES
+    address = request.META.get("REMOTE_ADDR", "")
+    if not _is_trusted(address, proxies):
+        return address
+    hops = [hop.strip() for hop in request.META.get("HTTP_X_FORWARDED_FOR", "").split(",") if hop.strip()]
+    # Each proxy appends the address it received the request from, so the right end is trustworthy.
+    for hop in reversed(hops):
+        address = hop
+        if not _is_trusted(hop, proxies):
+            break
+    return address
+
+
+def _client(request, key):
+    if key == "user" and request.user.is_authenticated:
+        return f"user:{request.user.pk}"
+    return f"ip:{client_ip(request)}"
+
+
+def check(request):
+    """Return a ``429`` response when ``request`` exceeds the limit of its URL name, else ``None``."""
+    if not settings.RATE_LIMIT_ENABLED or request.method not in LIMITED_METHODS:
+        return None
+    scope = request.resolver_match.view_name if request.resolver_match else None
+    limit = settings.RATE_LIMITS.get(scope)
+    if limit is None:
+        return None
+    wait = take(scope, _client(request, limit.get("key", "user")), parse_rate(limit["rate"]), limit["burst"])
+    with _stats_lock:
+        _stats[scope]["limited" if wait else "allowed"] += 1
+    if not wait:
+        return None
+    response = HttpResponse("リクエストが多すぎます。しばらくしてから再度お試しください。", status=429)
+    response["Retry-After"] = math.ceil(wait)
+    return response
+
+
+def rate_limit(view):
+    """Apply ``RATE_LIMITS`` to a function view (or the result of ``as_view()``)."""
+
+    if iscoroutinefunction(view):
+
+        async def wrapper(request, *args, **kwargs):
+            limited = await sync_to_async(check)(request)
+            return limited if limited is not None else await view(request, *args, **kwargs)
+
+    else:
+
+        def wrapper(request, *args, **kwargs):
+            limited = check(request)
+            return limited if limited is not None else view(request, *args, **kwargs)
+
+    return functools.wraps(view)(wrapper)
+
+
+class RateLimitMixin:
+    """Apply ``RATE_LIMITS`` to a class-based view; list it after ``LoginRequiredMixin``."""
+
+    def dispatch(self, request, *args, **kwargs):
+        if self.view_is_async:
+            return self._adispatch(request, *args, **kwargs)
+        limited = check(request)
+        return limited if limited is not None else super().dispatch(request, *args, **kwargs)
+
+    async def _adispatch(self, request, *args, **kwargs):
+        # check() may load the lazy request.user from the database.
+        limited = await sync_to_async(check)(request)
+        return limited if limited is not None else await super().dispatch(request, *args, **kwargs)
+
+
+def stats():
+    """Allowed/limited request counts per URL name of this process."""
+    with _stats_lock:
+        return {
+            scope: {"allowed": counts["allowed"], "limited": counts["limited"]} for scope, counts in _stats.items()
+        }
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
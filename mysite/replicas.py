@@ -0,0 +1,119 @@
+"""Read-replica routing with a read-your-writes window.
+
+The views named in ``REPLICA_READ_VIEWS`` read from one of the ``REPLICA_DATABASES`` aliases;
+everything else, and every write, uses the primary (``default``). Replication lags behind the
+primary, so a client that just wrote would not see its own tweet, like or follow on a replica:
+a successful write request sets the ``REPLICA_PIN_COOKIE`` cookie for ``REPLICA_PIN_SECONDS``,
+during which all of its reads stay on the primary. A request that writes while reading from a
+replica is also pinned to the primary for its remaining queries.
+
+Locally two SQLite files stand in for primary and replica (``DJANGO_DB_REPLICA=1``); the replica
+is refreshed from the primary by ``manage.py sync_replicas``. In tests the replica is a
+``TEST["MIRROR"]`` of ``default``.
+"""
+
+import contextvars
+import random
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+class _Reads:
+    """Where the current request reads from; ``alias`` is ``None`` for the primary."""
+
+    __slots__ = ("alias",)
+
+    def __init__(self, alias=None):
+        self.alias = alias
+
+
+# Holds a mutable _Reads so that the choice made in process_view() is seen by the view even when
+# the view runs in another context (sync_to_async/async_to_sync copy the context).
+_reads = contextvars.ContextVar("replica_reads", default=None)
+
+
+def replica_aliases():
+    return [alias for alias in settings.REPLICA_DATABASES if alias in connections]
+
+
+def is_pinned(request):
+    return settings.REPLICA_PIN_COOKIE in request.COOKIES
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        reads = _reads.get()
+        return reads.alias if reads is not None and reads.alias else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        reads = _reads.get()
+        if reads is not None:
+            reads.alias = None
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.REPLICA_DATABASES}
+        return obj1._state.db in databases and obj2._state.db in databases
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Replicas get the schema from the primary.
+        return db not in settings.REPLICA_DATABASES
+
+
+class ReplicaMiddleware:
+    """Route the reads of ``REPLICA_READ_VIEWS`` to a replica and pin writers to the primary."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.replicas = replica_aliases()
+        if not self.replicas:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        self.views = set(settings.REPLICA_READ_VIEWS)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = _reads.set(_Reads())
+        try:
+            response = self.get_response(request)
+        finally:
+            _reads.reset(token)
+        return self.pin_writer(request, response)
+
+    async def __acall__(self, request):
+        token = _reads.set(_Reads())
+        try:
+            response = await self.get_response(request)
+        finally:
+            _reads.reset(token)
+        return self.pin_writer(request, response)
+
+    def pin_writer(self, request, response):
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE,
+                "1",
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (
+            request.method in SAFE_METHODS
+            and request.resolver_match.view_name in self.views
+            and not is_pinned(request)
+        ):
+            _reads.get().alias = random.choice(self.replicas)
@@ -0,0 +1,23 @@
+"""
+Settings profile selected by the ``DJANGO_ENV`` environment variable.
+
+``development`` (the default) runs on a local SQLite file. ``production`` reads secrets and the
+database from the environment and keeps persistent, health-checked connections. ``test``, the
+default for ``manage.py test``, is ``development`` with a fast password hasher.
+"""
+
+import os
+import sys
+
+from django.core.exceptions import ImproperlyConfigured
+
+DJANGO_ENV = os.environ.get("DJANGO_ENV") or ("test" if sys.argv[1:2] == ["test"] else "development")
+
+if DJANGO_ENV == "development":
+    from .development import *  # noqa: F401,F403
+elif DJANGO_ENV == "test":
+    from .test import *  # noqa: F401,F403
+elif DJANGO_ENV == "production":
+    from .production import *  # noqa: F401,F403
+else:
+    raise ImproperlyConfigured(f"Unknown DJANGO_ENV {DJANGO_ENV!r}.")
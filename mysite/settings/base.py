@@ -0,0 +1,321 @@
+"""
+Django settings for mysite project.
+
+Generated by 'django-admin startproject' using Django 4.0.3.
+
+These are the settings shared by every profile; see ``mysite/settings/__init__.py``.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/4.0/topics/settings/
+
+For the full list of settings and their values, see
+https://docs.djangoproject.com/en/4.0/ref/settings/
+"""
+
+import importlib.util
+import os
+from pathlib import Path
+
+# Build paths inside the project like this: BASE_DIR / 'subdir'.
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+
+# Quick-start development settings - unsuitable for production
+# See https://docs.djangoproject.com/en/4.0/howto/deployment/checklist/
+
+# SECURITY WARNING: keep the secret key used in production secret!
+SECRET_KEY = "django-insecure-x+hlabr82)0gfep+bo%6nsehz_n%5_w4*9u*pd9tllw10dj1s1"
+
+# SECURITY WARNING: don't run with debug turned on in production!
+DEBUG = True
+
+ALLOWED_HOSTS = []
+
+
+# Application definition
+
+INSTALLED_APPS = [
+    "django.contrib.admin",
+    "django.contrib.auth",
+    "django.contrib.contenttypes",
+    "django.contrib.sessions",
+    "django.contrib.messages",
+    "django.contrib.staticfiles",
+    "accounts.apps.AccountsConfig",
+    "tweets.apps.TweetsConfig",
+    "welcome.apps.WelcomeConfig",
+    "tasks.apps.TasksConfig",
+]
+
+MIDDLEWARE = [
+    "django.middleware.security.SecurityMiddleware",
+    "mysite.staticfiles.StaticFilesMiddleware",
+    "mysite.instrumentation.RequestMetricsMiddleware",
+    "mysite.replicas.ReplicaMiddleware",
+    "django.contrib.sessions.middleware.SessionMiddleware",
+    "django.middleware.common.CommonMiddleware",
+    "django.middleware.csrf.CsrfViewMiddleware",
+    "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "django.contrib.messages.middleware.MessageMiddleware",
+    "django.middleware.clickjacking.XFrameOptionsMiddleware",
+]
+
+ROOT_URLCONF = "mysite.urls"
+
+TEMPLATES = [
+    {
+        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "DIRS": [BASE_DIR / "templates"],
+        "APP_DIRS": True,
+        "OPTIONS": {
+            "context_processors": [
+                "django.template.context_processors.debug",
+                "django.template.context_processors.request",
+                "django.contrib.auth.context_processors.auth",
+                "django.contrib.messages.context_processors.messages",
+                "mysite.templating.nav",
+            ],
+        },
+    },
+]
+
+# Compile all templates when the WSGI/ASGI application starts; see mysite.templating.warm_up.
+TEMPLATE_WARM_UP = False
+
+WSGI_APPLICATION = "mysite.wsgi.application"
+
+# Serve the read-heavy pages with their async views; mysite/asgi.py turns this on.
+ASYNC_VIEWS = os.environ.get("DJANGO_ASYNC_VIEWS") == "1"
+
+
+# Database
+# https://docs.djangoproject.com/en/4.0/ref/settings/#databases
+
+# SQLite connections get WAL, busy_timeout, synchronous=NORMAL and mmap applied by the
+# mysite.backends.sqlite3 engine; override any of them with OPTIONS["pragmas"].
+DATABASES = {
+    "default": {
+        "ENGINE": "mysite.backends.sqlite3",
+        "NAME": BASE_DIR / "db.sqlite3",
+    }
+}
+
+# Read replicas: aliases in DATABASES that the REPLICA_READ_VIEWS read from, by URL name. A client
+# that wrote stays on the primary for REPLICA_PIN_SECONDS; see mysite.replicas.
+# DJANGO_DB_REPLICA=1 adds a second SQLite file as a replica, refreshed by "manage.py sync_replicas".
+if os.environ.get("DJANGO_DB_REPLICA") == "1":
+    DATABASES["replica"] = {
+        "ENGINE": "mysite.backends.sqlite3",
+        "NAME": BASE_DIR / "db-replica.sqlite3",
+        "TEST": {"MIRROR": "default"},
+    }
+REPLICA_DATABASES = [alias for alias in DATABASES if alias != "default"]
+REPLICA_READ_VIEWS = ["tweets:home", "accounts:user_profile", "tweets:detail", "tweets:search"]
+REPLICA_PIN_SECONDS = 5
+REPLICA_PIN_COOKIE = "primary_pin"
+DATABASE_ROUTERS = ["mysite.replicas.ReplicaRouter"]
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "mysite",
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
+    "ratelimit": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "ratelimit",
+        "OPTIONS": {"MAX_ENTRIES": 100000},
+    },
+}
+
+
+# Password validation
+# https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
+
+AUTH_PASSWORD_VALIDATORS = [
+    {
+        "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
+    },
+    {
+        "NAME": "django.contrib.auth.password_validation.MinimumLengthValidator",
+    },
+    {
+        "NAME": "django.contrib.auth.password_validation.CommonPasswordValidator",
+    },
+    {
+        "NAME": "django.contrib.auth.password_validation.NumericPasswordValidator",
+    },
+]
+
+# Password hashing: argon2 when argon2-cffi is installed, otherwise scrypt. The PBKDF2 hashers only
+# verify existing hashes, which are upgraded on the next login. The costs in PASSWORD_HASHER_PARAMS
+# are read by accounts.hashers; measure them with ``python -m benchmarks.hashing`` before changing.
+
+PASSWORD_HASHERS = [
+    *(["accounts.hashers.Argon2PasswordHasher"] if importlib.util.find_spec("argon2") else []),
+    "accounts.hashers.ScryptPasswordHasher",
+    "accounts.hashers.PBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+]
+PASSWORD_HASHER_PARAMS = {
+    # memory_cost is in KiB. One lane per hash: under load, parallel requests already use every core.
+    "argon2": {"time_cost": 2, "memory_cost": 64 * 1024, "parallelism": 1},
+    "scrypt": {"work_factor": 2**14, "block_size": 8, "parallelism": 1},
+    "pbkdf2_sha256": {"iterations": 600_000},
+}
+
+
+# Internationalization
+# https://docs.djangoproject.com/en/4.0/topics/i18n/
+
+LANGUAGE_CODE = "ja"
+
+TIME_ZONE = "Asia/Tokyo"
+
+USE_I18N = True
+
+USE_TZ = True
+
+
+# Static files (CSS, JavaScript, Images)
+# https://docs.djangoproject.com/en/4.0/howto/static-files/
+
+STATIC_URL = "static/"
+STATICFILES_DIRS = [BASE_DIR / "static"]
+STATIC_ROOT = BASE_DIR / "staticfiles"
+
+# Serve STATIC_ROOT from the application itself (single-node deploys); see mysite.staticfiles.
+STATIC_SERVE = False
+
+# Tweet image attachments, stored by content under MEDIA_ROOT and served by tweets:attachment; see
+# tweets.attachments. The variants (longest side in pixels) are rendered by the task workers with Pillow.
+MEDIA_ROOT = BASE_DIR / "media"
+ATTACHMENT_MAX_SIZE = 8 * 1024 * 1024
+ATTACHMENT_MAX_COUNT = 4
+ATTACHMENT_MAX_PIXELS = 40_000_000
+ATTACHMENT_CHUNK_SIZE = 64 * 1024
+ATTACHMENT_VARIANTS = {"thumb": 400, "large": 1600}
+# Behind nginx, hand the sending off to an "internal" location aliased to MEDIA_ROOT, e.g. "/internal-media/".
+ATTACHMENT_ACCEL_REDIRECT = None
+
+# Default primary key field type
+# https://docs.djangoproject.com/en/4.0/ref/settings/#default-auto-field
+
+DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+AUTH_USER_MODEL = "accounts.User"
+
+# request.user is loaded from the cache and dropped when the user is saved; see accounts.backends.
+AUTHENTICATION_BACKENDS = ["accounts.backends.CachedModelBackend"]
+USER_CACHE = "default"
+USER_CACHE_TIMEOUT = 60 * 60
+
+# "Who to follow" suggestions come from a per-process in-memory follow graph that is reloaded
+# after FOLLOW_GRAPH_MAX_AGE seconds; see accounts.graph.
+FOLLOW_GRAPH_MAX_AGE = 5 * 60
+# Followees expanded per suggestion lookup (2-hop), to bound the work for users following many.
+FOLLOW_GRAPH_SUGGESTION_SAMPLE = 200
+WHO_TO_FOLLOW_COUNT = 3
+WHO_TO_FOLLOW_CACHE = "default"
+WHO_TO_FOLLOW_CACHE_TIMEOUT = 5 * 60
+
+# Trending sidebar: hashtags and liked tweets counted over the last TRENDING_WINDOW_HOURS in minute and
+# hour summaries (at most TRENDING_CAPACITY items each), republished every TRENDING_REFRESH_INTERVAL
+# seconds; see tweets.trending.
+TRENDING_CACHE = "default"
+TRENDING_WINDOW_HOURS = 6
+TRENDING_REFRESH_INTERVAL = 60
+TRENDING_COUNT = 5
+TRENDING_CAPACITY = 1000
+TRENDING_BATCH_SIZE = 5000
+# (user, tweet) pairs remembered so that liking a tweet again within the hour is not counted twice.
+TRENDING_LIKED_PAIRS = 100000
+# Rows committed late with a pk this far below the newest counted row are still counted.
+TRENDING_RESCAN_PKS = 1000
+
+# Live feed updates (tweets:stream, Server-Sent Events on the ASGI app); see tweets.stream. LocalBroker
+# only works with TASKS_EAGER; with task workers use "mysite.pubsub.RedisBroker" (as production does).
+PUBSUB_BACKEND = "mysite.pubsub.LocalBroker"
+PUBSUB_OPTIONS = {}
+STREAM_QUEUE_SIZE = 100
+STREAM_HEARTBEAT = 15
+STREAM_COALESCE_DELAY = 0.5
+STREAM_MAX_AGE = 5 * 60
+STREAM_RETRY = 5
+
+# Rows read per keyset chunk by the streaming data export; see accounts.export.
+EXPORT_CHUNK_SIZE = 1000
+
+# Sessions are read from the cache and written through to the database.
+SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
+SESSION_CACHE_ALIAS = "default"
+
+LOGIN_URL = "accounts:login"
+LOGIN_REDIRECT_URL = "tweets:home"
+LOGOUT_REDIRECT_URL = "accounts:login"
+
+# Home timeline
+# Authors with more followers than this are merged in at read time instead of fanned out on write.
+TIMELINE_FANOUT_FOLLOWER_LIMIT = 10000
+TIMELINE_FANOUT_BATCH_SIZE = 1000
+TIMELINE_MAX_ENTRIES = 800
+# Timelines are trimmed back to TIMELINE_MAX_ENTRIES by a task queued at most once per TIMELINE_TRIM_INTERVAL
+# seconds, and only once they are more than TIMELINE_TRIM_SLACK entries over.
+TIMELINE_TRIM_SLACK = 200
+TIMELINE_TRIM_INTERVAL = 60 * 10
+
+# Newest-first tweet lists are keyset paginated; see tweets.pagination.
+TWEET_PAGE_SIZE = 20
+
+# Rendered tweet cards are cached per tweet/author version; see tweets.cards.
+TWEET_CARD_CACHE = "default"
+TWEET_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Per-viewer followee id sets used to resolve "I follow this author"; see tweets.viewer_state.
+VIEWER_STATE_CACHE = "default"
+VIEWER_STATE_CACHE_TIMEOUT = 60 * 60
+
+# Token-bucket limits of write requests per URL name; see mysite.ratelimit. "key" is "user" (the
+# IP address for anonymous requests) or "ip".
+RATE_LIMIT_ENABLED = True
+RATE_LIMIT_CACHE = "ratelimit"
+# Reverse proxies (addresses or networks) whose X-Forwarded-For names the client.
+RATE_LIMIT_TRUSTED_PROXIES = []
+RATE_LIMITS = {
+    "accounts:signup": {"rate": "10/h", "burst": 20, "key": "ip"},
+    "accounts:login": {"rate": "5/m", "burst": 20, "key": "ip"},
+    "accounts:follow": {"rate": "10/m", "burst": 30},
+    "accounts:unfollow": {"rate": "10/m", "burst": 30},
+    "tweets:create": {"rate": "1/m", "burst": 30},
+    "tweets:like": {"rate": "30/m", "burst": 60},
+    "tweets:unlike": {"rate": "30/m", "burst": 60},
+}
+
+# ETag stamps and per-page records for conditional GETs; see tweets.conditional.
+CONDITIONAL_GET_CACHE = "default"
+CONDITIONAL_GET_CACHE_TIMEOUT = 60 * 60
+
+# Per-request instrumentation; see mysite.instrumentation. Budgets are per URL name over
+# "default"; keys are wall_ms, db_ms, template_ms and queries.
+REQUEST_BUDGETS = {
+    "default": {"wall_ms": 500, "queries": 20},
+    "tweets:home": {"wall_ms": 200, "queries": 10},
+    "accounts:user_profile": {"wall_ms": 200, "queries": 10},
+}
+REQUEST_PROFILE_SAMPLE_RATE = 0.0
+REQUEST_PROFILE_DIR = BASE_DIR / "profiles"
+# Add X-Query-Count and Server-Timing headers to every response.
+REQUEST_METRICS_HEADERS = DEBUG
+
+# Background tasks (timeline fan-out and follow backfill/cleanup); see tasks.queue.
+# Run the workers with ``manage.py run_workers``; the development profile runs tasks inline.
+TASKS_EAGER = False
+TASKS_MAX_ATTEMPTS = 5
+TASKS_RETRY_BACKOFF = 2
+TASKS_RETRY_BACKOFF_MAX = 10 * 60
+# A task still running after this many seconds is assumed to have lost its worker and is claimed again.
+TASKS_LOCK_TIMEOUT = 10 * 60
@@ -0,0 +1,4 @@
+from .base import *  # noqa: F401,F403
+
+# Run background tasks inline so that runserver works without a worker process.
+TASKS_EAGER = True
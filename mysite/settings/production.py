@@ -0,0 +1,102 @@
+import os
+
+from .base import *  # noqa: F401,F403
+from .base import BASE_DIR, TEMPLATES
+
+DEBUG = False
+
+SECRET_KEY = os.environ["DJANGO_SECRET_KEY"]
+
+ALLOWED_HOSTS = [host for host in os.environ.get("DJANGO_ALLOWED_HOSTS", "").split(",") if host]
+
+
+# Templates are read, minified and compiled once per process, all of them at startup; see
+# mysite.templating.
+TEMPLATES = [
+    {
+        **TEMPLATES[0],
+        "APP_DIRS": False,
+        "OPTIONS": {
+            **TEMPLATES[0]["OPTIONS"],
+            "loaders": [
+                (
+                    "django.template.loaders.cached.Loader",
+                    ["mysite.templating.FilesystemLoader", "mysite.templating.AppDirectoriesLoader"],
+                ),
+            ],
+        },
+    }
+]
+TEMPLATE_WARM_UP = True
+
+
+# Database
+# DJANGO_DB_ENGINE=postgresql (default, psycopg from requirements-production.txt) or sqlite for
+# single-node deployments.
+
+DB_ENGINE = os.environ.get("DJANGO_DB_ENGINE", "postgresql")
+
+if DB_ENGINE == "postgresql":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.environ.get("DJANGO_DB_NAME", "mysite"),
+            "USER": os.environ.get("DJANGO_DB_USER", "mysite"),
+            "PASSWORD": os.environ.get("DJANGO_DB_PASSWORD", ""),
+            "HOST": os.environ.get("DJANGO_DB_HOST", "localhost"),
+            "PORT": os.environ.get("DJANGO_DB_PORT", "5432"),
+            "CONN_MAX_AGE": int(os.environ.get("DJANGO_DB_CONN_MAX_AGE", "60")),
+            "CONN_HEALTH_CHECKS": True,
+            # pgbouncer in transaction pooling mode cannot keep a server-side cursor open across transactions.
+            "DISABLE_SERVER_SIDE_CURSORS": os.environ.get("DJANGO_DB_PGBOUNCER") == "1",
+            "OPTIONS": {"connect_timeout": 5},
+        }
+    }
+    # Streaming replicas of the primary, e.g. DJANGO_DB_REPLICA_HOSTS=replica1.internal,replica2.internal.
+    for number, host in enumerate(filter(None, os.environ.get("DJANGO_DB_REPLICA_HOSTS", "").split(",")), 1):
+        DATABASES[f"replica{number}"] = {**DATABASES["default"], "HOST": host, "TEST": {"MIRROR": "default"}}
+elif DB_ENGINE == "sqlite":
+    DATABASES = {
+        "default": {
+            "ENGINE": "mysite.backends.sqlite3",
+            "NAME": os.environ.get("DJANGO_DB_NAME", BASE_DIR / "db.sqlite3"),
+            "CONN_MAX_AGE": None,
+            "CONN_HEALTH_CHECKS": True,
+        }
+    }
+else:
+    from django.core.exceptions import ImproperlyConfigured
+
+    raise ImproperlyConfigured(f"Unknown DJANGO_DB_ENGINE {DB_ENGINE!r}.")
+
+REPLICA_DATABASES = [alias for alias in DATABASES if alias != "default"]
+
+
+# Static files
+# Run "manage.py collectstatic" on deploy: it writes content-hashed, precompressed assets to
+# STATIC_ROOT, which StaticFilesMiddleware serves unless a web server or CDN does (DJANGO_SERVE_STATIC=0).
+
+STATIC_ROOT = os.environ.get("DJANGO_STATIC_ROOT", BASE_DIR / "staticfiles")
+STATIC_SERVE = os.environ.get("DJANGO_SERVE_STATIC", "1") == "1"
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "mysite.staticfiles.CompressedManifestStaticFilesStorage"},
+}
+
+
+# Live feed updates are published by the task workers, so they reach the ASGI workers through Redis
+# (redis from requirements-production.txt; mysite.asgi connects at startup).
+PUBSUB_BACKEND = "mysite.pubsub.RedisBroker"
+PUBSUB_OPTIONS = {"url": os.environ.get("DJANGO_REDIS_URL", "redis://localhost:6379/0")}
+
+
+# nginx in front of the app: the client address is taken from its X-Forwarded-For, e.g.
+# DJANGO_TRUSTED_PROXIES=127.0.0.1,10.0.0.0/8.
+RATE_LIMIT_TRUSTED_PROXIES = [
+    proxy for proxy in os.environ.get("DJANGO_TRUSTED_PROXIES", "127.0.0.1,::1").split(",") if proxy
+]
+
+
+# Query counts and timings stay out of public responses; use the staff-only /metrics/requests/ instead.
+REQUEST_METRICS_HEADERS = False
+REQUEST_PROFILE_DIR = os.environ.get("DJANGO_PROFILE_DIR", BASE_DIR / "profiles")
@@ -0,0 +1,26 @@
+from .development import *  # noqa: F401,F403
+from .development import BASE_DIR, DATABASES
+
+# The suite creates and logs in hundreds of users; at production cost hashing would dominate it.
+PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+
+# A replica alias for the routing tests (TestReplicaRouting enables it with REPLICA_DATABASES); as a
+# test mirror it shares the default test database.
+DATABASES = {
+    **DATABASES,
+    "replica": {
+        "ENGINE": "mysite.backends.sqlite3",
+        "NAME": BASE_DIR / "db-replica.sqlite3",
+        "TEST": {"MIRROR": "default"},
+    },
+}
+REPLICA_DATABASES = []
+
+# Admin pages and bulk fixtures go over their request budgets; the tests of the warning capture it
+# with assertLogs, everywhere else it would only flood the output.
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"null": {"class": "logging.NullHandler"}},
+    "loggers": {"mysite.instrumentation": {"handlers": ["null"], "propagate": False}},
+}
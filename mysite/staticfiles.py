@@ -0,0 +1,194 @@
+"""Static asset pipeline: hashed, precompressed files served in-process with far-future caching.
+
+``collectstatic`` with :class:`CompressedManifestStaticFilesStorage` writes every asset under a
+content-hashed name (``site.3f2a….css``) and, for text assets, ``.gz`` and (when the optional
+``brotli`` package is installed) ``.br`` siblings next to it. :class:`StaticFilesMiddleware` then
+serves ``STATIC_ROOT`` for single-node deploys: the files are indexed once at startup, so a request
+is a dict lookup plus a ``sendfile``; the best encoding the client accepts is picked from the
+precompressed siblings, and hashed files are marked ``immutable`` for a year.
+"""
+
+import gzip
+import json
+import mimetypes
+import os
+from urllib.parse import urlsplit
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = {".css", ".js", ".mjs", ".json", ".map", ".svg", ".txt", ".xml", ".html"}
+# Siblings that save less than this fraction of the original are not worth a separate file.
+MIN_SAVING = 0.05
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+MUTABLE_CACHE_CONTROL = "public, max-age=60"
+
+
+def _encoders():
+    encoders = [("gzip", ".gz", lambda data: gzip.compress(data, 9, mtime=0))]
+    if brotli is not None:
+        encoders.insert(0, ("br", ".br", lambda data: brotli.compress(data, quality=11)))
+    return encoders
+
+
+def compress(path):
+    """Write the precompressed siblings of ``path`` and return their paths."""
+    if os.path.splitext(path)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+        return []
+    with open(path, "rb") as f:
+        data = f.read()
+    written = []
+    for _, suffix, encode in _encoders():
+        compressed = encode(data)
+        if len(compressed) <= len(data) * (1 - MIN_SAVING):
+            with open(path + suffix, "wb") as f:
+                f.write(compressed)
+            written.append(path + suffix)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Manifest storage that also writes ``.gz``/``.br`` siblings of the collected text assets."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in sorted({*paths, *self.hashed_files.values()}):
+            for path in compress(self.path(name)):
+                yield name, os.path.relpath(path, self.location), True
+
+
+class StaticFile:
+    __slots__ = ("path", "content_type", "size", "etag", "cache_control", "encodings")
+
+    def __init__(self, path, cache_control, encodings):
+        stat = os.stat(path)
+        self.path = path
+        self.content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        self.size = stat.st_size
+        self.etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+        self.cache_control = cache_control
+        # Best first: (encoding, sibling path, size).
+        self.encodings = encodings
+
+
+def index(root, url_prefix):
+    """Map every URL path under ``url_prefix`` to its :class:`StaticFile`."""
+    try:
+        with open(os.path.join(root, ManifestStaticFilesStorage.manifest_name)) as f:
+            hashed = set(json.load(f)["paths"].values())
+    except (OSError, ValueError, KeyError):
+        hashed = set()
+    files = {}
+    for directory, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(directory, name)
+            relative = os.path.relpath(path, root).replace(os.sep, "/")
+            if name.endswith((".gz", ".br")) and os.path.exists(path[:-3]):
+                continue
+            encodings = [
+                (encoding, path + suffix, os.path.getsize(path + suffix))
+                for encoding, suffix in (("br", ".br"), ("gzip", ".gz"))
+                if os.path.exists(path + suffix)
+            ]
+            cache_control = IMMUTABLE_CACHE_CONTROL if relative in hashed else MUTABLE_CACHE_CONTROL
+            files[url_prefix + relative] = StaticFile(path, cache_control, encodings)
+    return files
+
+
+def accepted_encodings(header):
+    accepted = set()
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        if params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+async def _aread(file, chunk_size=FileResponse.block_size):
+    read = sync_to_async(file.read, thread_sensitive=False)
+    try:
+        while chunk := await read(chunk_size):
+            yield chunk
+    finally:
+        file.close()
+
+
+class StaticFilesMiddleware:
+    """Serve ``STATIC_ROOT`` in-process when ``STATIC_SERVE`` is on; list it right after
+    ``SecurityMiddleware`` in ``MIDDLEWARE``, so that static responses get the security headers too.
+
+    The index is built when the middleware is loaded, so restart after ``collectstatic``.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        static_url = urlsplit(settings.STATIC_URL or "")
+        if not settings.STATIC_SERVE or not settings.STATIC_ROOT or static_url.netloc:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        self.prefix = "/" + static_url.path.strip("/") + "/"
+        self.files = index(settings.STATIC_ROOT, self.prefix)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        static_file = self.match(request)
+        if static_file is None:
+            return self.get_response(request)
+        return self.serve(request, static_file)
+
+    async def __acall__(self, request):
+        static_file = self.match(request)
+        if static_file is None:
+            return await self.get_response(request)
+        response = self.serve(request, static_file)
+        if isinstance(response, FileResponse):
+            # Read off the event loop; the ASGI handler would read a sync file iterator whole first.
+            response.streaming_content = _aread(response.file_to_stream)
+        return response
+
+    def match(self, request):
+        if not request.path_info.startswith(self.prefix) or request.method not in ("GET", "HEAD"):
+            return None
+        return self.files.get(request.path_info)
+
+    def serve(self, request, static_file):
+        accepted = accepted_encodings(request.headers.get("Accept-Encoding", ""))
+        encoding, path, size = next(
+            (candidate for candidate in static_file.encodings if candidate[0] in accepted),
+            (None, static_file.path, static_file.size),
+        )
+        # Every encoding is a representation of its own.
+        etag = f'{static_file.etag[:-1]}-{encoding}"' if encoding else static_file.etag
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            response = HttpResponseNotModified()
+        elif request.method == "HEAD":
+            response = HttpResponse(content_type=static_file.content_type)
+            response["Content-Length"] = size
+        else:
+            response = FileResponse(open(path, "rb"), content_type=static_file.content_type)
+            del response["Content-Disposition"]
+        if encoding is not None:
+            response["Content-Encoding"] = encoding
+        if static_file.encodings:
+            response["Vary"] = "Accept-Encoding"
+        response["ETag"] = etag
+        response["Cache-Control"] = static_file.cache_control
+        response["X-Content-Type-Options"] = "nosniff"
+        return response
@@ -0,0 +1,471 @@
+import gzip
+import json
+import os
+import tempfile
+from unittest import skipIf
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.cached_db import SessionStore
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.template import engines
+from django.template.loader import render_to_string
+from django.test import (
+    AsyncRequestFactory,
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+
+from accounts.views import AsyncLoginView, AsyncSignupView
+from mysite import instrumentation, pubsub, ratelimit, replicas, staticfiles, templating
+from mysite.backends.sqlite3.base import DatabaseWrapper
+from tweets.models import Tweet
+
+User = get_user_model()
+
+
+class TestSQLiteBackend(TransactionTestCase):
+    def test_pragmas_are_applied_to_connection(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_transactions_begin_immediate(self):
+        with CaptureQueriesContext(connection) as queries, transaction.atomic():
+            pass
+        self.assertEqual(queries[0]["sql"], "BEGIN IMMEDIATE")
+
+
+class TestSQLitePragmaOptions(SimpleTestCase):
+    def test_options_override_default_pragmas(self):
+        wrapper = DatabaseWrapper(
+            {**connection.settings_dict, "NAME": ":memory:", "OPTIONS": {"pragmas": {"busy_timeout": 100}}}
+        )
+        conn = wrapper.get_new_connection(wrapper.get_connection_params())
+        try:
+            self.assertEqual(conn.execute("PRAGMA busy_timeout").fetchone()[0], 100)
+            self.assertEqual(conn.execute("PRAGMA synchronous").fetchone()[0], 1)
+        finally:
+            conn.close()
+
+
+@override_settings(REQUEST_METRICS_HEADERS=True, REQUEST_BUDGETS={"default": {"queries": 100}})
+class TestRequestMetricsMiddleware(TestCase):
+    def setUp(self):
+        instrumentation.reset()
+        self.user = User.objects.create_user(username="tester", password="testpassword")
+        Tweet.objects.create(user=self.user, content="hello")
+        self.client.force_login(self.user)
+
+    def test_request_is_measured(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("tweets:home"))
+        self.assertEqual(response["X-Query-Count"], str(len(queries)))
+        self.assertIn("tpl;dur=", response["Server-Timing"])
+
+        stats = instrumentation.snapshot()["routes"]["tweets:home"]
+        self.assertEqual(stats["requests"], 1)
+        self.assertEqual(stats["over_budget"], 0)
+        self.assertEqual(sum(stats["queries"]["buckets"].values()), 1)
+        self.assertGreater(stats["template_ms"]["mean"], 0)
+
+    def test_over_budget_request_is_reported(self):
+        with override_settings(REQUEST_BUDGETS={"default": {"queries": 100}, "tweets:home": {"queries": 1}}):
+            with self.assertLogs("mysite.instrumentation", "WARNING") as logs:
+                self.client.get(reverse("tweets:home"))
+        self.assertIn("tweets:home over budget (queries", logs.output[0])
+        self.assertEqual(instrumentation.snapshot()["slow_requests"][0]["route"], "tweets:home")
+
+    def test_sampled_slow_request_is_profiled(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(
+                REQUEST_PROFILE_SAMPLE_RATE=1.0,
+                REQUEST_PROFILE_DIR=directory,
+                REQUEST_BUDGETS={"default": {"wall_ms": 0}},
+            ):
+                with self.assertLogs("mysite.instrumentation", "WARNING"):
+                    self.client.get(reverse("tweets:home"))
+            self.assertEqual(len(os.listdir(directory)), 1)
+        self.assertFalse(instrumentation._profiling.locked())
+
+    def test_only_one_request_is_profiled_at_a_time(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(
+                REQUEST_PROFILE_SAMPLE_RATE=1.0,
+                REQUEST_PROFILE_DIR=directory,
+                REQUEST_BUDGETS={"default": {"wall_ms": 0}},
+            ):
+                with instrumentation._profiling:
+                    with self.assertLogs("mysite.instrumentation", "WARNING"):
+                        self.client.get(reverse("tweets:home"))
+            self.assertEqual(os.listdir(directory), [])
+
+    async def test_requests_are_not_profiled_in_async_mode(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(
+                REQUEST_PROFILE_SAMPLE_RATE=1.0,
+                REQUEST_PROFILE_DIR=directory,
+                REQUEST_BUDGETS={"default": {"wall_ms": 0}},
+            ):
+                with self.assertLogs("mysite.instrumentation", "WARNING"):
+                    await self.async_client.get(reverse("accounts:login"))
+            self.assertEqual(os.listdir(directory), [])
+
+    def test_duplicate_queries_are_reported(self):
+        metrics = instrumentation.RequestMetrics()
+        token = instrumentation._current.set(metrics)
+        try:
+            for tweet in Tweet.objects.all():
+                tweet.user
+            User.objects.get(pk=self.user.pk)
+        finally:
+            instrumentation._current.reset(token)
+        self.assertEqual(metrics.queries, 3)
+        self.assertEqual([count for _, count in metrics.duplicates()], [2])
+
+
+class TestRequestMetricsView(TestCase):
+    def test_staff_only(self):
+        user = User.objects.create_user(username="tester", password="testpassword")
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(reverse("request_metrics")).status_code, 403)
+
+        user.is_staff = True
+        user.save()
+        response = self.client.get(reverse("request_metrics"))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("routes", response.json())
+
+
+@override_settings(
+    RATE_LIMITS={
+        "tweets:like": {"rate": "1/m", "burst": 2},
+        "accounts:login": {"rate": "1/m", "burst": 1, "key": "ip"},
+        "accounts:signup": {"rate": "1/m", "burst": 1, "key": "ip"},
+    }
+)
+class TestRateLimit(TestCase):
+    def setUp(self):
+        caches["ratelimit"].clear()
+        ratelimit.reset_stats()
+        self.user = User.objects.create_user(username="tester", password="testpassword")
+        self.tweet = Tweet.objects.create(user=self.user, content="hello")
+
+    def test_bucket_refills_at_rate_up_to_burst(self):
+        rate = ratelimit.parse_rate("6/m")
+        self.assertEqual(rate, 0.1)
+        self.assertEqual([ratelimit.take("scope", "me", rate, 3, now=0) for _ in range(3)], [0, 0, 0])
+        self.assertAlmostEqual(ratelimit.take("scope", "me", rate, 3, now=0), 10)
+        self.assertAlmostEqual(ratelimit.take("scope", "me", rate, 3, now=5), 5)
+        self.assertEqual(ratelimit.take("scope", "me", rate, 3, now=10), 0)
+        # A long idle period refills the bucket to ``burst`` tokens, not more.
+        self.assertEqual([ratelimit.take("scope", "me", rate, 3, now=1000) for _ in range(3)], [0, 0, 0])
+        self.assertGreater(ratelimit.take("scope", "me", rate, 3, now=1000), 0)
+
+    def test_buckets_are_per_client(self):
+        self.assertEqual(ratelimit.take("scope", "me", 1, 1, now=0), 0)
+        self.assertGreater(ratelimit.take("scope", "me", 1, 1, now=0), 0)
+        self.assertEqual(ratelimit.take("scope", "you", 1, 1, now=0), 0)
+
+    def test_limited_view_returns_429_without_queries(self):
+        self.client.force_login(self.user)
+        url = reverse("tweets:like", kwargs={"pk": self.tweet.pk})
+        for _ in range(2):
+            self.assertEqual(self.client.post(url).status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.client.post(url)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "60")
+        # Reads are never limited.
+        self.assertEqual(self.client.get(reverse("tweets:detail", kwargs={"pk": self.tweet.pk})).status_code, 200)
+        self.assertEqual(ratelimit.stats(), {"tweets:like": {"allowed": 2, "limited": 1}})
+
+    def test_login_is_limited_per_ip(self):
+        url = reverse("accounts:login")
+        data = {"username": "tester", "password": "wrong"}
+        self.assertEqual(self.client.post(url, data).status_code, 200)
+        self.assertEqual(self.client.post(url, data).status_code, 429)
+        self.assertEqual(self.client.post(url, data, REMOTE_ADDR="10.0.0.1").status_code, 200)
+
+    @override_settings(RATE_LIMIT_TRUSTED_PROXIES=["10.0.0.0/8"])
+    def test_forwarded_clients_behind_a_trusted_proxy_are_limited_separately(self):
+        url = reverse("accounts:login")
+        data = {"username": "tester", "password": "wrong"}
+
+        def post(forwarded_for, remote_addr="10.0.0.2"):
+            return self.client.post(url, data, REMOTE_ADDR=remote_addr, HTTP_X_FORWARDED_FOR=forwarded_for).status_code
+
+        self.assertEqual(post("203.0.113.1"), 200)
+        self.assertEqual(post("203.0.113.1"), 429)
+        self.assertEqual(post("203.0.113.2, 10.0.0.3"), 200)
+        # A spoofed leftmost address does not help; the proxy appended the real one.
+        self.assertEqual(post("198.51.100.9, 203.0.113.1"), 429)
+        # Clients that are not trusted proxies cannot choose their address.
+        self.assertEqual(post("203.0.113.3", remote_addr="192.0.2.1"), 200)
+        self.assertEqual(post("203.0.113.4", remote_addr="192.0.2.1"), 429)
+
+    async def test_async_views_are_limited(self):
+        for view, url in [
+            (ratelimit.rate_limit(AsyncLoginView.as_view()), reverse("accounts:login")),
+            (AsyncSignupView.as_view(), reverse("accounts:signup")),
+        ]:
+            statuses = []
+            for _ in range(2):
+                request = AsyncRequestFactory().post(url, {})
+                request.resolver_match = resolve(url)
+                request.session = SessionStore()
+                request.user = AnonymousUser()
+                statuses.append((await view(request)).status_code)
+            self.assertEqual(statuses, [200, 429], url)
+
+    @override_settings(RATE_LIMIT_ENABLED=False)
+    def test_disabled(self):
+        url = reverse("accounts:login")
+        for _ in range(3):
+            self.assertEqual(self.client.post(url, {"username": "tester", "password": "wrong"}).status_code, 200)
+
+    def test_metrics_view_is_staff_only(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse("rate_limit_metrics")).status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(self.client.get(reverse("rate_limit_metrics")).json(), {})
+
+
+@override_settings(REPLICA_DATABASES=["replica"], RATE_LIMIT_ENABLED=False)
+class TestReplicaRouting(TransactionTestCase):
+    # The replica is a second connection to the test database: it only sees committed rows.
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="tester", password="testpassword")
+        self.tweet = Tweet.objects.create(user=self.user, content="hello")
+        self.client.force_login(self.user)
+
+    def get(self, url):
+        with CaptureQueriesContext(connections["replica"]) as replica_queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(replica_queries)
+
+    def test_read_views_use_replica(self):
+        for url in [
+            reverse("tweets:home"),
+            reverse("accounts:user_profile", kwargs={"username": "tester"}),
+            reverse("tweets:detail", kwargs={"pk": self.tweet.pk}),
+            reverse("tweets:search") + "?q=hello",
+        ]:
+            self.assertGreater(self.get(url), 0, url)
+        self.assertEqual(self.get(reverse("tweets:create")), 0)
+
+    def test_read_views_use_replica_under_asgi(self):
+        async def get_response(request):
+            pass
+
+        # No thread hop in front of the async views.
+        self.assertTrue(iscoroutinefunction(replicas.ReplicaMiddleware(get_response)))
+
+        # Run from this thread, so that the queries go through the connections captured here.
+        @async_to_sync
+        async def request(method, url):
+            return await getattr(self.async_client, method)(url)
+
+        url = reverse("tweets:detail", kwargs={"pk": self.tweet.pk})
+        self.async_client.force_login(self.user)
+        with CaptureQueriesContext(connections["replica"]) as replica_queries:
+            response = request("get", url)
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(len(replica_queries), 0)
+
+        response = request("post", reverse("tweets:like", kwargs={"pk": self.tweet.pk}))
+        self.assertIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+        with CaptureQueriesContext(connections["replica"]) as replica_queries:
+            request("get", url)
+        self.assertEqual(len(replica_queries), 0)
+
+    def test_writer_is_pinned_to_primary(self):
+        response = self.client.post(reverse("tweets:like", kwargs={"pk": self.tweet.pk}))
+        self.assertEqual(response.status_code, 200)
+        cookie = response.cookies[settings.REPLICA_PIN_COOKIE]
+        self.assertEqual(cookie["max-age"], settings.REPLICA_PIN_SECONDS)
+        self.assertEqual(self.get(reverse("tweets:detail", kwargs={"pk": self.tweet.pk})), 0)
+
+        del self.client.cookies[settings.REPLICA_PIN_COOKIE]
+        self.assertGreater(self.get(reverse("tweets:detail", kwargs={"pk": self.tweet.pk})), 0)
+
+    def test_rejected_write_does_not_pin(self):
+        response = self.client.post(reverse("tweets:like", kwargs={"pk": 0}))
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+
+    def test_router(self):
+        router = replicas.ReplicaRouter()
+        self.assertEqual(router.db_for_read(Tweet), "default")
+        reads = replicas._Reads("replica")
+        token = replicas._reads.set(reads)
+        try:
+            self.assertEqual(router.db_for_read(Tweet), "replica")
+            # Once the request writes, it reads its own writes from the primary.
+            self.assertEqual(router.db_for_write(Tweet), "default")
+            self.assertEqual(router.db_for_read(Tweet), "default")
+        finally:
+            replicas._reads.reset(token)
+        self.assertTrue(router.allow_migrate("default", "tweets"))
+        self.assertFalse(router.allow_migrate("replica", "tweets"))
+
+
+class TestTemplating(TestCase):
+    def test_minify(self):
+        source = "<ul>\n  <!-- nav -->\n  <li>{{ a }}</li>\n\n    <li>b</li>\n</ul>\n"
+        self.assertEqual(templating.minify(source), "<ul>\n<li>{{ a }}</li>\n<li>b</li>\n</ul>")
+        self.assertEqual(templating.minify("<pre>\n  x\n</pre>"), "<pre>\n  x\n</pre>")
+
+    def test_minify_keeps_comments_with_template_syntax(self):
+        source = "<!-- {% if a %} -->a<!-- {% endif %} --><!-- {{ b }} --><!-- {# c #} --><!-- d -->e"
+        minified = templating.minify(source)
+        self.assertEqual(minified, "<!-- {% if a %} -->a<!-- {% endif %} --><!-- {{ b }} --><!-- {# c #} -->e")
+        # The tags in the comments still apply: "a" is not rendered.
+        self.assertEqual(
+            engines["django"].from_string(minified).render({"a": False, "b": 1}), "<!--  --><!-- 1 --><!--  -->e"
+        )
+
+    @override_settings(
+        TEMPLATES=[
+            {
+                "BACKEND": "django.template.backends.django.DjangoTemplates",
+                "DIRS": [settings.BASE_DIR / "templates"],
+                "OPTIONS": {
+                    "context_processors": ["mysite.templating.nav"],
+                    "loaders": [
+                        (
+                            "django.template.loaders.cached.Loader",
+                            ["mysite.templating.FilesystemLoader", "mysite.templating.AppDirectoriesLoader"],
+                        )
+                    ],
+                },
+            }
+        ]
+    )
+    def test_production_loaders_minify_and_warm_up(self):
+        self.assertGreater(templating.warm_up(), 0)
+        (loader,) = engines["django"].engine.template_loaders
+        self.assertIn("base.html", loader.get_template_cache)
+
+        request = RequestFactory().get("/")
+        request.user = AnonymousUser()
+        html = render_to_string("base.html", request=request)
+        self.assertNotIn("<!--", html)
+        self.assertNotIn("\n ", html)
+        self.assertIn('<a href="/accounts/login/">Login</a>', html)
+
+    def test_nav_links(self):
+        user = User.objects.create_user(username="tester", password="testpassword")
+        self.assertEqual(
+            [label for label, _ in self.client.get(reverse("accounts:login")).context["nav_links"]],
+            ["Sign up", "Login"],
+        )
+        self.client.force_login(user)
+        response = self.client.get(reverse("tweets:home"))
+        self.assertEqual(
+            list(response.context["nav_links"]),
+            [
+                ("Home", reverse("tweets:home")),
+                ("Search", reverse("tweets:search")),
+                ("Profile", reverse("accounts:user_profile", kwargs={"username": "tester"})),
+                ("Logout", reverse("accounts:logout")),
+            ],
+        )
+        self.assertContains(response, f'<a href="{reverse("tweets:search")}">Search</a>')
+
+
+class TestStaticFiles(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.root = cls.enterClassContext(tempfile.TemporaryDirectory())
+        cls.enterClassContext(
+            override_settings(
+                STATIC_ROOT=cls.root,
+                STATIC_SERVE=True,
+                STORAGES={
+                    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+                    "staticfiles": {"BACKEND": "mysite.staticfiles.CompressedManifestStaticFilesStorage"},
+                },
+            )
+        )
+        call_command("collectstatic", interactive=False, verbosity=0)
+        with open(os.path.join(cls.root, "staticfiles.json")) as f:
+            cls.hashed_name = json.load(f)["paths"]["css/site.css"]
+        with open(settings.BASE_DIR / "static" / "css" / "site.css", "rb") as f:
+            cls.original = f.read()
+
+    def test_collectstatic_writes_hashed_and_compressed_files(self):
+        self.assertRegex(self.hashed_name, r"^css/site\.[0-9a-f]{12}\.css$")
+        with open(os.path.join(self.root, self.hashed_name + ".gz"), "rb") as f:
+            self.assertEqual(gzip.decompress(f.read()), self.original)
+        self.assertContains(self.client.get(reverse("accounts:login")), f'href="/static/{self.hashed_name}"')
+
+    def test_serves_precompressed_hashed_file_as_immutable(self):
+        response = self.client.get(f"/static/{self.hashed_name}", HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Content-Type"], "text/css")
+        self.assertEqual(response["Cache-Control"], staticfiles.IMMUTABLE_CACHE_CONTROL)
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        body = b"".join(response.streaming_content)
+        self.assertLess(len(body), len(self.original))
+        self.assertEqual(gzip.decompress(body), self.original)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                f"/static/{self.hashed_name}", HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=response["ETag"]
+            )
+        self.assertEqual(response.status_code, 304)
+
+    def test_serves_identity_and_unhashed_files(self):
+        response = self.client.get(f"/static/{self.hashed_name}", HTTP_ACCEPT_ENCODING="gzip;q=0")
+        self.assertNotIn("Content-Encoding", response)
+        self.assertEqual(b"".join(response.streaming_content), self.original)
+
+        response = self.client.get("/static/css/site.css")
+        self.assertEqual(response["Cache-Control"], staticfiles.MUTABLE_CACHE_CONTROL)
+        self.assertEqual(self.client.head("/static/css/site.css")["Content-Length"], str(len(self.original)))
+        self.assertEqual(self.client.get("/static/css/missing.css").status_code, 404)
+
+    async def test_serves_files_and_passes_through_in_async_mode(self):
+        response = await self.async_client.get(f"/static/{self.hashed_name}", HTTP_ACCEPT_ENCODING="identity")
+        self.assertTrue(response.is_async)
+        self.assertEqual(b"".join([chunk async for chunk in response.streaming_content]), self.original)
+        # Listed after SecurityMiddleware, static responses carry its headers.
+        self.assertEqual(response["Referrer-Policy"], "same-origin")
+        self.assertEqual((await self.async_client.get(reverse("accounts:login"))).status_code, 200)
+
+    def test_accepted_encodings(self):
+        self.assertEqual(staticfiles.accepted_encodings("gzip, br;q=0, deflate;q=0.5"), {"gzip", "deflate"})
+
+
+class TestPubSub(SimpleTestCase):
+    def test_local_broker_requires_eager_tasks(self):
+        # Task workers would publish in their own processes, out of reach of the streams.
+        with override_settings(TASKS_EAGER=False):
+            with self.assertRaises(ImproperlyConfigured):
+                pubsub.get_broker()
+        self.assertIsInstance(pubsub.get_broker(), pubsub.LocalBroker)
+
+    @skipIf(pubsub.redis is not None, "redis is installed")
+    @override_settings(PUBSUB_BACKEND="mysite.pubsub.RedisBroker")
+    def test_redis_broker_requires_redis(self):
+        with self.assertRaises(ImproperlyConfigured):
+            pubsub.get_broker()
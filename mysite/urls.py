@@ -13,11 +13,16 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+
 from django.contrib import admin
 from django.urls import include, path
 
+from .views import RateLimitMetricsView, RequestMetricsView
+
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path("metrics/requests/", RequestMetricsView.as_view(), name="request_metrics"),
+    path("metrics/ratelimit/", RateLimitMetricsView.as_view(), name="rate_limit_metrics"),
     path("accounts/", include("accounts.urls")),
     path("tweets/", include("tweets.urls")),
     path("", include("welcome.urls")),
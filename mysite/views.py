@@ -0,0 +1,25 @@
+from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
+from django.http import JsonResponse
+from django.views import View
+
+from . import instrumentation, ratelimit
+
+
+class RequestMetricsView(LoginRequiredMixin, UserPassesTestMixin, View):
+    """Per-URL-name query/latency histograms of this process and its recent over-budget requests."""
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get(self, request, *args, **kwargs):
+        return JsonResponse(instrumentation.snapshot())
+
+
+class RateLimitMetricsView(LoginRequiredMixin, UserPassesTestMixin, View):
+    """Allowed and rate-limited request counts per URL name of this process."""
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get(self, request, *args, **kwargs):
+        return JsonResponse(ratelimit.stats())
@@ -0,0 +1,25 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from tasks.models import Task
+
+
+class Command(BaseCommand):
+    help = "Delete finished tasks older than --days in small batches (their idempotency keys become reusable)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=7)
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--include-failed", action="store_true")
+
+    def handle(self, *args, **options):
+        statuses = [Task.Status.DONE] + ([Task.Status.FAILED] if options["include_failed"] else [])
+        finished = Task.objects.filter(
+            status__in=statuses, finished_at__lt=timezone.now() - timedelta(days=options["days"])
+        )
+        total = 0
+        while pks := list(finished.values_list("pk", flat=True)[: options["batch_size"]]):
+            total += Task.objects.filter(pk__in=pks).delete()[0]
+        self.stdout.write(f"{total} tasks deleted")
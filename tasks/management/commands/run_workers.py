@@ -0,0 +1,40 @@
+import multiprocessing
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from tasks.worker import Worker, run_process
+
+
+class Command(BaseCommand):
+    help = "Run background task workers, one per process."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=2)
+        parser.add_argument("--batch-size", type=int, default=10, help="Tasks claimed per query.")
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds to sleep when idle.")
+        parser.add_argument("--metrics-interval", type=float, default=60.0, help="Seconds between throughput logs.")
+        parser.add_argument("--once", action="store_true", help="Exit once no task is due.")
+
+    def handle(self, *args, **options):
+        if options["processes"] == 1:
+            worker = Worker(options["batch_size"], options["poll_interval"], options["metrics_interval"])
+            count = worker.run(once=options["once"])
+            self.stdout.write(f"{count} tasks run")
+            return
+
+        connections.close_all()
+        processes = [
+            multiprocessing.Process(target=run_process, args=(options,), daemon=False)
+            for _ in range(options["processes"])
+        ]
+        for process in processes:
+            process.start()
+        self.stdout.write(f"started {len(processes)} workers: {', '.join(str(p.pid) for p in processes)}")
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            # The children got the same SIGINT; let them finish their current task.
+            for process in processes:
+                process.join()
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from tasks.models import Task
+
+
+class Command(BaseCommand):
+    help = "Show the queue depth per task and status and the age of the oldest due task."
+
+    def handle(self, *args, **options):
+        rows = Task.objects.values("name", "status").annotate(count=Count("pk")).order_by("name", "status")
+        for row in rows:
+            self.stdout.write(f"{row['name']:<50} {row['status']:<8} {row['count']:>8}")
+        oldest = Task.objects.filter(status=Task.Status.QUEUED, run_at__lte=timezone.now()).aggregate(Min("run_at"))
+        if oldest["run_at__min"]:
+            lag = (timezone.now() - oldest["run_at__min"]).total_seconds()
+            self.stdout.write(f"oldest due task waiting {lag:.1f}s")
+        else:
+            self.stdout.write("no due tasks")
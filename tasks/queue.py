@@ -0,0 +1,136 @@
+"""Database-backed task queue.
+
+Functions decorated with :func:`task` (conventionally in an app's ``tasks`` module) are queued with
+``func.enqueue(**kwargs)``, which inserts a :class:`~tasks.models.Task` row in the caller's
+transaction, so a task only becomes visible once the data it refers to is committed. Workers
+(``manage.py run_workers``) claim batches with ``SELECT ... FOR UPDATE SKIP LOCKED`` where the
+database supports it; on SQLite the claiming transaction's ``BEGIN IMMEDIATE`` serializes workers.
+
+A failing task is retried with exponential backoff until it has run ``max_attempts`` times. Tasks
+left ``running`` for longer than ``TASKS_LOCK_TIMEOUT`` (a crashed worker) are claimed again, so
+task functions must be idempotent; an ``idempotency_key`` additionally makes enqueueing the same
+work twice a no-op. With ``TASKS_EAGER`` tasks run inline at enqueue time instead.
+"""
+
+import logging
+import random
+import threading
+import time
+import traceback
+from collections import Counter
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def task(max_attempts=None):
+    """Register a task function; it gains ``.enqueue(idempotency_key=None, delay=None, **kwargs)``."""
+
+    def decorator(func):
+        func.task_name = f"{func.__module__}.{func.__name__}"
+        func.max_attempts = max_attempts
+        func.enqueue = partial(enqueue, func)
+        _registry[func.task_name] = func
+        return func
+
+    return decorator
+
+
+def enqueue(func, *, idempotency_key=None, delay=None, **kwargs):
+    """Queue ``func(**kwargs)``; ``kwargs`` must be JSON serializable.
+
+    A task whose ``idempotency_key`` is already taken by a queued or running task is silently
+    dropped (one ``INSERT ... ON CONFLICT DO NOTHING``, no read first). A finished task, done or
+    failed, releases its key, so that the same work can be queued again.
+    """
+    if settings.TASKS_EAGER:
+        func(**kwargs)
+        return
+    fields = {
+        "name": func.task_name,
+        "kwargs": kwargs,
+        "max_attempts": func.max_attempts or settings.TASKS_MAX_ATTEMPTS,
+        "run_at": timezone.now() + (delay or timedelta()),
+    }
+    Task.objects.bulk_create([Task(idempotency_key=idempotency_key, **fields)], ignore_conflicts=True)
+
+
+def backoff(attempts):
+    """Seconds to wait before retrying a task that has failed ``attempts`` times (with jitter)."""
+    delay = min(settings.TASKS_RETRY_BACKOFF_MAX, settings.TASKS_RETRY_BACKOFF * 2 ** (attempts - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def claim(worker, batch_size):
+    """Lock up to ``batch_size`` due tasks for ``worker`` and return them."""
+    now = timezone.now()
+    ready = Q(status=Task.Status.QUEUED, run_at__lte=now) | Q(
+        status=Task.Status.RUNNING, locked_at__lt=now - timedelta(seconds=settings.TASKS_LOCK_TIMEOUT)
+    )
+    with transaction.atomic():
+        tasks = Task.objects.filter(ready).order_by("run_at", "pk")
+        if connection.features.has_select_for_update_skip_locked:
+            tasks = tasks.select_for_update(skip_locked=True)
+        tasks = list(tasks[:batch_size])
+        Task.objects.filter(pk__in=[t.pk for t in tasks]).update(
+            status=Task.Status.RUNNING, locked_at=now, locked_by=worker, attempts=F("attempts") + 1
+        )
+    for t in tasks:
+        t.status, t.locked_at, t.locked_by, t.attempts = Task.Status.RUNNING, now, worker, t.attempts + 1
+    return tasks
+
+
+def run(t):
+    """Run a claimed task and record its outcome; returns the new status."""
+    func = _registry.get(t.name)
+    start = time.perf_counter()
+    try:
+        if func is None:
+            raise LookupError(f"Unknown task {t.name!r}.")
+        func(**t.kwargs)
+    except Exception:
+        t.last_error = traceback.format_exc()
+        if func is not None and t.attempts < t.max_attempts:
+            t.status = Task.Status.QUEUED
+            t.run_at = timezone.now() + timedelta(seconds=backoff(t.attempts))
+            logger.warning("%s failed (attempt %d/%d), retrying", t.name, t.attempts, t.max_attempts)
+        else:
+            t.status = Task.Status.FAILED
+            t.finished_at = timezone.now()
+            logger.error("%s failed permanently after %d attempts", t.name, t.attempts, exc_info=True)
+    else:
+        t.status = Task.Status.DONE
+        t.finished_at = timezone.now()
+    if t.status != Task.Status.QUEUED:
+        t.idempotency_key = None
+    t.locked_at = None
+    t.save(update_fields=["status", "run_at", "locked_at", "last_error", "finished_at", "idempotency_key"])
+
+    outcome = {Task.Status.DONE: "succeeded", Task.Status.QUEUED: "retried", Task.Status.FAILED: "failed"}[t.status]
+    with _stats_lock:
+        _stats[outcome] += 1
+        _stats["seconds"] += time.perf_counter() - start
+    return t.status
+
+
+def stats():
+    """Outcome counts and run time of the tasks run by this process."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
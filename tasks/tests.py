@@ -0,0 +1,146 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from accounts.models import FriendShip
+from tweets.models import TimelineEntry, Tweet
+
+from . import queue
+from .models import Task
+from .queue import task
+from .worker import Worker
+
+User = get_user_model()
+
+calls = []
+
+
+@task()
+def record(value):
+    calls.append(value)
+
+
+@task(max_attempts=2)
+def broken():
+    raise RuntimeError("boom")
+
+
+def run_worker():
+    return Worker(batch_size=2).run(once=True)
+
+
+@override_settings(TASKS_EAGER=False)
+class TestQueue(TestCase):
+    def setUp(self):
+        calls.clear()
+        queue.reset_stats()
+
+    def test_enqueued_task_runs_in_worker(self):
+        record.enqueue(value=1)
+        record.enqueue(value=2)
+        record.enqueue(value=3)
+        self.assertEqual(calls, [])
+        self.assertEqual(run_worker(), 3)
+        self.assertEqual(calls, [1, 2, 3])
+        self.assertEqual(Task.objects.filter(status=Task.Status.DONE).count(), 3)
+        self.assertEqual(queue.stats()["succeeded"], 3)
+
+    def test_idempotency_key_deduplicates(self):
+        with self.assertNumQueries(1):
+            record.enqueue(value=1, idempotency_key="once")
+        record.enqueue(value=2, idempotency_key="once")
+        self.assertEqual(Task.objects.count(), 1)
+        run_worker()
+        self.assertEqual(calls, [1])
+        # The finished task released the key.
+        record.enqueue(value=3, idempotency_key="once")
+        run_worker()
+        self.assertEqual(calls, [1, 3])
+
+    def test_delayed_task_waits(self):
+        record.enqueue(value=1, delay=timedelta(hours=1))
+        self.assertEqual(run_worker(), 0)
+
+    def test_failing_task_is_retried_with_backoff_then_failed(self):
+        broken.enqueue(idempotency_key="broken")
+        with self.assertLogs("tasks.queue", "WARNING") as logs:
+            run_worker()
+        self.assertEqual(logs.output, ["WARNING:tasks.queue:tasks.tests.broken failed (attempt 1/2), retrying"])
+        t = Task.objects.get()
+        self.assertEqual((t.status, t.attempts), (Task.Status.QUEUED, 1))
+        self.assertGreater(t.run_at, timezone.now())
+        self.assertIn("RuntimeError: boom", t.last_error)
+
+        Task.objects.update(run_at=timezone.now())
+        with self.assertLogs("tasks.queue", "ERROR"):
+            run_worker()
+        t.refresh_from_db()
+        self.assertEqual((t.status, t.attempts), (Task.Status.FAILED, 2))
+        self.assertEqual(queue.stats(), {"retried": 1, "failed": 1, "seconds": queue.stats()["seconds"]})
+        # The failed task released its key, so the work can be queued again.
+        self.assertIsNone(t.idempotency_key)
+        broken.enqueue(idempotency_key="broken")
+        self.assertEqual(Task.objects.filter(status=Task.Status.QUEUED).count(), 1)
+
+    @override_settings(TASKS_LOCK_TIMEOUT=60)
+    def test_stale_running_task_is_reclaimed(self):
+        record.enqueue(value=1)
+        Task.objects.update(status=Task.Status.RUNNING, locked_at=timezone.now() - timedelta(minutes=5))
+        run_worker()
+        self.assertEqual(calls, [1])
+
+    @override_settings(TASKS_EAGER=True)
+    def test_eager_mode_runs_inline(self):
+        record.enqueue(value=1)
+        self.assertEqual(calls, [1])
+        self.assertFalse(Task.objects.exists())
+
+    def test_commands(self):
+        record.enqueue(value=1)
+        out = StringIO()
+        call_command("task_stats", stdout=out)
+        self.assertIn("tasks.tests.record", out.getvalue())
+        call_command("run_workers", processes=1, once=True, stdout=out)
+        self.assertIn("1 tasks run", out.getvalue())
+        Task.objects.update(finished_at=timezone.now() - timedelta(days=30))
+        call_command("purge_tasks", stdout=out)
+        self.assertIn("1 tasks deleted", out.getvalue())
+
+
+@override_settings(TASKS_EAGER=False)
+class TestTimelineTasks(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username="author", password="testpassword")
+        self.follower = User.objects.create_user(username="follower", password="testpassword")
+        FriendShip.objects.create(follower=self.follower, following=self.author)
+        run_worker()
+
+    def test_fan_out_is_deferred_to_the_worker(self):
+        with CaptureQueriesContext(connection) as one_follower:
+            Tweet.objects.create(user=self.author, content="first")
+        for i in range(20):
+            FriendShip.objects.create(
+                follower=User.objects.create_user(username=f"follower{i}", password="testpassword"),
+                following=self.author,
+            )
+        with CaptureQueriesContext(connection) as many_followers:
+            tweet = Tweet.objects.create(user=self.author, content="hello")
+        self.assertEqual(len(many_followers), len(one_follower))
+        self.assertTrue(TimelineEntry.objects.filter(owner=self.author, tweet=tweet).exists())
+        self.assertFalse(TimelineEntry.objects.filter(owner=self.follower, tweet=tweet).exists())
+        run_worker()
+        self.assertTrue(TimelineEntry.objects.filter(owner=self.follower, tweet=tweet).exists())
+
+    def test_late_backfill_after_unfollow_is_skipped(self):
+        tweet = Tweet.objects.create(user=self.author, content="hello")
+        stranger = User.objects.create_user(username="stranger", password="testpassword")
+        Tweet.objects.create(user=stranger, content="not followed")
+        FriendShip.objects.create(follower=self.follower, following=stranger).delete()
+        run_worker()
+        self.assertEqual([e.tweet for e in TimelineEntry.objects.filter(owner=self.follower)], [tweet])
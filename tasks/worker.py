@@ -0,0 +1,55 @@
+import logging
+import os
+import signal
+import socket
+import time
+
+from django.db import connections
+
+from . import queue
+
+logger = logging.getLogger(__name__)
+
+
+class Worker:
+    """Claims and runs tasks until stopped; ``manage.py run_workers`` starts one per process."""
+
+    def __init__(self, batch_size=10, poll_interval=1.0, metrics_interval=60.0, name=None):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.metrics_interval = metrics_interval
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.stopping = False
+
+    def stop(self, *args):
+        self.stopping = True
+
+    def run(self, once=False):
+        """Run tasks until stopped or, with ``once``, until no task is due. Returns the number run."""
+        total = 0
+        window_start, window_count = time.monotonic(), 0
+        while not self.stopping:
+            tasks = queue.claim(self.name, self.batch_size)
+            for task in tasks:
+                queue.run(task)
+            total += len(tasks)
+            window_count += len(tasks)
+
+            elapsed = time.monotonic() - window_start
+            if elapsed >= self.metrics_interval:
+                logger.info("%s: %.1f tasks/s %s", self.name, window_count / elapsed, queue.stats())
+                window_start, window_count = time.monotonic(), 0
+            if not tasks:
+                if once:
+                    break
+                time.sleep(self.poll_interval)
+        return total
+
+
+def run_process(options):
+    """Entry point of a forked worker process; the parent closes its connections before forking."""
+    worker = Worker(options["batch_size"], options["poll_interval"], options["metrics_interval"])
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    worker.run(once=options["once"])
+    connections.close_all()
@@ -1 +1,31 @@
-# from django.contrib import admin
+from django.contrib import admin
+
+from accounts import bulk, tasks
+
+from .models import Attachment, Like, TimelineEntry, Tweet
+
+
+@admin.register(Tweet)
+class TweetAdmin(admin.ModelAdmin):
+    list_display = ["content", "user", "like_count", "created_at"]
+    list_select_related = ["user"]
+    search_fields = ["user__username"]
+    actions = ["delete"]
+
+    def get_actions(self, request):
+        # The stock action deletes row by row with per-row signals; "delete" below replaces it.
+        actions = super().get_actions(request)
+        actions.pop("delete_selected", None)
+        return actions
+
+    @admin.action(description="選択されたツイートを削除", permissions=["delete"])
+    def delete(self, request, queryset):
+        tweet_ids = list(queryset.values_list("pk", flat=True))
+        for start in range(0, len(tweet_ids), bulk.DEFAULT_BATCH_SIZE):
+            tasks.delete_tweets.enqueue(tweet_ids=tweet_ids[start : start + bulk.DEFAULT_BATCH_SIZE])
+        self.message_user(request, f"{len(tweet_ids)} 件のツイートの削除を開始しました。")
+
+
+admin.site.register(Attachment)
+admin.site.register(Like)
+admin.site.register(TimelineEntry)
@@ -0,0 +1,374 @@
+"""Image attachments: streamed uploads, content-addressed storage and variants made off the request path.
+
+:class:`AttachmentUploadHandler` replaces Django's upload handlers on the tweet form. Each file is
+streamed in ``ATTACHMENT_CHUNK_SIZE`` chunks into a temporary file under ``MEDIA_ROOT`` while it
+is hashed (SHA-256), size-checked and identified from its first bytes, so an upload never sits in
+memory and an oversized or non-image file stops being written as soon as it is recognised.
+:func:`store` then renames the file to ``blobs/<digest[:2]>/<digest>``: an image uploaded twice is
+stored once.
+
+The ``ATTACHMENT_VARIANTS`` (downscaled copies) are rendered by the ``make_variants`` task with
+Pillow, which is optional; until a variant exists, and without Pillow, the original is served in
+its place. :func:`serve` answers conditional and single-range requests, and marks responses
+immutable since a digest never changes content. Blobs that no attachment refers to any more are
+removed by ``manage.py purge_attachments``.
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopFutureHandlers
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.template.defaultfilters import filesizeformat
+from django.utils.http import parse_etags
+
+from .models import Attachment
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+SIGNATURES = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+]
+SNIFF_BYTES = 12
+# A single range; several ranges are answered with the whole file.
+BYTE_RANGE = re.compile(r"(\d*)-(\d*)")
+ORIGINAL = "original"
+IMMUTABLE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+# A variant that is not rendered yet is answered with the original, which must not stick.
+PENDING_CACHE_CONTROL = "private, max-age=60"
+# Blobs and temporary uploads younger than this may belong to a request still in flight.
+PURGE_GRACE_SECONDS = 60 * 60
+
+
+def sniff(head):
+    """The image type of a file starting with ``head``, or ``None`` when it is not a supported image."""
+    for signature, content_type in SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def blob_path(digest):
+    return os.path.join(settings.MEDIA_ROOT, "blobs", digest[:2], digest)
+
+
+def variant_path(digest, variant):
+    if variant == ORIGINAL:
+        return blob_path(digest)
+    return os.path.join(settings.MEDIA_ROOT, "variants", digest[:2], f"{digest}-{variant}")
+
+
+def _tmp_dir():
+    path = os.path.join(settings.MEDIA_ROOT, "tmp")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def max_request_size():
+    """The largest tweet form body worth reading: every attachment at its limit plus the other fields."""
+    return settings.ATTACHMENT_MAX_COUNT * settings.ATTACHMENT_MAX_SIZE + settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+
+
+class UploadedBlob(UploadedFile):
+    """A file streamed to a temporary file by :class:`AttachmentUploadHandler`.
+
+    ``error`` is set, and nothing is kept, when the file was rejected. The temporary file is removed
+    when the request is closed unless :func:`store` moved it into the store.
+    """
+
+    def __init__(self, name, content_type=None, size=0, path=None, digest=None, error=None):
+        super().__init__(open(path, "rb") if path else None, name, content_type, size)
+        self.path = path
+        self.digest = digest
+        self.error = error
+
+    def temporary_path(self):
+        return self.path
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+
+class AttachmentUploadHandler(FileUploadHandler):
+    """Stream uploads to ``MEDIA_ROOT``, hashing them and enforcing ``ATTACHMENT_MAX_SIZE`` on the way."""
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.chunk_size = settings.ATTACHMENT_CHUNK_SIZE
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        fd, self.path = tempfile.mkstemp(dir=_tmp_dir())
+        self.file = os.fdopen(fd, "wb")
+        self.hasher = hashlib.sha256()
+        self.head = b""
+        self.image_type = None
+        self.size = 0
+        self.error = None
+        raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.error is not None:
+            return None
+        self.size += len(raw_data)
+        if self.size > settings.ATTACHMENT_MAX_SIZE:
+            self._reject(f"画像のサイズは {filesizeformat(settings.ATTACHMENT_MAX_SIZE)} までです。")
+            return None
+        if self.image_type is None and len(self.head) < SNIFF_BYTES:
+            self.head += raw_data[: SNIFF_BYTES - len(self.head)]
+            if len(self.head) == SNIFF_BYTES:
+                self._identify()
+                if self.error is not None:
+                    return None
+        self.hasher.update(raw_data)
+        self.file.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if self.error is None and self.image_type is None:
+            # Files shorter than SNIFF_BYTES.
+            self._identify()
+        if self.error is not None:
+            return UploadedBlob(self.file_name, error=self.error)
+        self.file.close()
+        return UploadedBlob(self.file_name, self.image_type, self.size, self.path, self.hasher.hexdigest())
+
+    def upload_interrupted(self):
+        if not self.file.closed:
+            self._discard()
+
+    def _identify(self):
+        self.image_type = sniff(self.head)
+        if self.image_type is None:
+            self._reject("JPEG・PNG・GIF・WebP の画像を選択してください。")
+
+    def _reject(self, message):
+        self.error = f"{self.file_name}: {message}"
+        self._discard()
+
+    def _discard(self):
+        self.file.close()
+        os.remove(self.path)
+
+
+def store(upload):
+    """Move an :class:`UploadedBlob` to its content address (unless that image is stored already)."""
+    path = blob_path(upload.digest)
+    if os.path.exists(path):
+        # Keeps purge_attachments off a blob that is about to be referenced again.
+        os.utime(path)
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.chmod(upload.temporary_path(), 0o644)
+        os.replace(upload.temporary_path(), path)
+    return upload.digest
+
+
+def attach(tweet, uploads):
+    """Store ``uploads``, attach them to ``tweet`` in order and queue their missing variants."""
+    from .tasks import make_variants
+
+    rows = [
+        Attachment(
+            tweet=tweet, digest=store(upload), content_type=upload.content_type, size=upload.size, position=position
+        )
+        for position, upload in enumerate(uploads)
+    ]
+    Attachment.objects.bulk_create(rows)
+    for digest in dict.fromkeys(row.digest for row in rows):
+        if any(not os.path.exists(variant_path(digest, variant)) for variant in settings.ATTACHMENT_VARIANTS):
+            make_variants.enqueue(digest=digest)
+    return rows
+
+
+def _write_atomically(image, path, **params):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=_tmp_dir())
+    try:
+        with os.fdopen(fd, "wb") as f:
+            image.save(f, **params)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def make_variants(digest):
+    """Render the missing ``ATTACHMENT_VARIANTS`` of blob ``digest``; return the names written.
+
+    Images with transparency become PNG, everything else JPEG. Largest first, each variant is
+    downscaled from the previous one, and JPEGs are decoded at a reduced scale to begin with.
+    """
+    if Image is None:
+        return []
+    pending = sorted(
+        (
+            (size, variant)
+            for variant, size in settings.ATTACHMENT_VARIANTS.items()
+            if not os.path.exists(variant_path(digest, variant))
+        ),
+        reverse=True,
+    )
+    if not pending or not os.path.exists(blob_path(digest)):
+        return []
+    written = []
+    try:
+        with Image.open(blob_path(digest)) as source:
+            if source.width * source.height > settings.ATTACHMENT_MAX_PIXELS:
+                return []
+            source.draft("RGB", (pending[0][0], pending[0][0]))
+            image = ImageOps.exif_transpose(source)
+            transparent = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+            image = image.convert("RGBA" if transparent else "RGB")
+            for size, variant in pending:
+                image.thumbnail((size, size), Image.LANCZOS)
+                if transparent:
+                    _write_atomically(image, variant_path(digest, variant), format="PNG", optimize=True)
+                else:
+                    _write_atomically(
+                        image, variant_path(digest, variant), format="JPEG", quality=85, progressive=True
+                    )
+                written.append(variant)
+    except (OSError, Image.DecompressionBombError):
+        # Not decodable after all: the original keeps being served.
+        pass
+    return written
+
+
+def parse_range(header, size):
+    """The inclusive ``(start, end)`` of a single ``bytes`` range of a ``size`` byte file.
+
+    ``None`` means the whole file (several ranges or a malformed one, which may be answered with a
+    ``200``); a ``start`` past the end means the range is unsatisfiable.
+    """
+    unit, _, spec = header.partition("=")
+    match = BYTE_RANGE.fullmatch(spec.strip())
+    if unit.strip().lower() != "bytes" or not match or match.group() == "-":
+        return None
+    first, last = match.groups()
+    if not first:
+        start, end = size - int(last), size - 1
+    elif not last:
+        start, end = int(first), size - 1
+    else:
+        start, end = int(first), int(last)
+        if end < start:
+            return None
+    return max(start, 0), min(end, size - 1)
+
+
+def _read_range(file, start, length):
+    with file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(settings.ATTACHMENT_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def serve(request, digest, variant, content_type):
+    """Respond with ``variant`` of blob ``digest`` (``content_type`` is the original's)."""
+    path, cache_control = variant_path(digest, variant), IMMUTABLE_CACHE_CONTROL
+    if variant != ORIGINAL and not os.path.exists(path):
+        path, variant, cache_control = blob_path(digest), ORIGINAL, PENDING_CACHE_CONTROL
+    try:
+        file = open(path, "rb")
+    except FileNotFoundError:
+        raise Http404
+    if variant != ORIGINAL:
+        content_type = sniff(file.read(SNIFF_BYTES))
+        file.seek(0)
+    size = os.fstat(file.fileno()).st_size
+    etag = f'"{digest}-{variant}"'
+    byte_range = None
+    if request.method == "GET" and "Range" in request.headers:
+        if_range = request.headers.get("If-Range")
+        if if_range is None or if_range == etag:
+            byte_range = parse_range(request.headers["Range"], size)
+
+    if etag in parse_etags(request.headers.get("If-None-Match", "")):
+        file.close()
+        response = HttpResponseNotModified()
+    elif settings.ATTACHMENT_ACCEL_REDIRECT:
+        # The front-end server sends the file and handles the ranges itself.
+        file.close()
+        response = HttpResponse(content_type=content_type)
+        response["X-Accel-Redirect"] = settings.ATTACHMENT_ACCEL_REDIRECT + os.path.relpath(
+            path, settings.MEDIA_ROOT
+        ).replace(os.sep, "/")
+    elif byte_range is not None and byte_range[0] >= size:
+        file.close()
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+    elif byte_range is not None:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            _read_range(file, start, end - start + 1), status=206, content_type=content_type
+        )
+        response["Content-Length"] = end - start + 1
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    elif request.method == "HEAD":
+        file.close()
+        response = HttpResponse(content_type=content_type)
+        response["Content-Length"] = size
+    else:
+        response = FileResponse(file, content_type=content_type)
+        del response["Content-Disposition"]
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    response["Cache-Control"] = cache_control
+    response["X-Content-Type-Options"] = "nosniff"
+    return response
+
+
+def purge(grace=PURGE_GRACE_SECONDS, batch_size=1000):
+    """Remove the blobs and variants no attachment refers to, and abandoned temporary uploads.
+
+    Files modified within ``grace`` seconds are kept. Returns the number of blobs removed.
+    """
+    cutoff = time.time() - grace
+    tmp_dir = _tmp_dir()
+    for entry in os.scandir(tmp_dir):
+        if entry.stat().st_mtime < cutoff:
+            os.remove(entry.path)
+    blobs = [
+        entry
+        for directory, _, names in os.walk(os.path.join(settings.MEDIA_ROOT, "blobs"))
+        for entry in (os.path.join(directory, name) for name in names)
+    ]
+    removed = 0
+    for i in range(0, len(blobs), batch_size):
+        batch = {os.path.basename(path): path for path in blobs[i : i + batch_size]}
+        referenced = set(Attachment.objects.filter(digest__in=batch).values_list("digest", flat=True))
+        for digest, path in batch.items():
+            if digest in referenced or os.stat(path).st_mtime >= cutoff:
+                continue
+            for variant in [*settings.ATTACHMENT_VARIANTS, ORIGINAL]:
+                try:
+                    os.remove(variant_path(digest, variant))
+                except FileNotFoundError:
+                    pass
+            removed += 1
+    return removed
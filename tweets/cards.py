@@ -0,0 +1,120 @@
+"""Shared render cache for tweet cards.
+
+A card fragment is cached under the tweet id plus two version stamps: one bumped when the tweet or
+its like count changes and one bumped when the author's display data changes. Fragments contain
+nothing viewer-specific, so they are shared between all users; per-viewer state such as "liked by
+me" is layered on by :class:`TweetCard` from a :class:`~tweets.viewer_state.ViewerState` after the
+fragment is fetched.
+"""
+
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import prefetch_related_objects
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+CARD_TEMPLATE = "tweets/_tweet_card.html"
+# The author fields a card shows; saving a user only invalidates their cards when one of these changed.
+AUTHOR_FIELDS = ("username",)
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _cache():
+    return caches[settings.TWEET_CARD_CACHE]
+
+
+def _version_key(kind, pk):
+    return f"tweet-card:version:{kind}:{pk}"
+
+
+def _bump(key):
+    cache = _cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        # A missing stamp restarts from the clock so fragments cached under an evicted stamp are never reused.
+        cache.set(key, time.time_ns(), None)
+
+
+def invalidate_tweet(tweet_id):
+    _bump(_version_key("tweet", tweet_id))
+
+
+def invalidate_author(user_id):
+    _bump(_version_key("user", user_id))
+
+
+def _tweet_version_keys(tweet):
+    return _version_key("tweet", tweet.pk), _version_key("user", tweet.user_id)
+
+
+def version_keys(tweets):
+    """The version stamp keys the cards of ``tweets`` are cached under."""
+    return list(dict.fromkeys(key for tweet in tweets for key in _tweet_version_keys(tweet)))
+
+
+def peek_versions(keys):
+    """The current version stamps of ``keys``; stamps missing from the cache are left out."""
+    return _cache().get_many(keys)
+
+
+def _get_versions(keys):
+    cache = _cache()
+    versions = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return versions
+
+
+class TweetCard:
+    def __init__(self, tweet, html, viewer_state=None):
+        self.tweet = tweet
+        self.html = mark_safe(html)
+        self.liked = viewer_state is not None and viewer_state.likes(tweet)
+        self.following_author = viewer_state is not None and viewer_state.follows(tweet.user_id)
+
+
+def render_cards(tweets, viewer_state=None):
+    """Return a :class:`TweetCard` per tweet, rendering only the fragments missing from the cache."""
+    cache = _cache()
+    keys = {tweet.pk: _tweet_version_keys(tweet) for tweet in tweets}
+    versions = _get_versions(version_keys(tweets))
+    fragment_keys = {
+        tweet.pk: f"tweet-card:{tweet.pk}:{versions[keys[tweet.pk][0]]}:{versions[keys[tweet.pk][1]]}"
+        for tweet in tweets
+    }
+    fragments = cache.get_many(list(fragment_keys.values()))
+    # Attachments never change, so they are only needed for the cards that are rendered.
+    prefetch_related_objects([tweet for tweet in tweets if fragment_keys[tweet.pk] not in fragments], "attachments")
+    rendered = {}
+    for tweet in tweets:
+        key = fragment_keys[tweet.pk]
+        if key not in fragments:
+            rendered[key] = fragments[key] = render_to_string(CARD_TEMPLATE, {"tweet": tweet})
+    if rendered:
+        cache.set_many(rendered, settings.TWEET_CARD_CACHE_TIMEOUT)
+    with _stats_lock:
+        _stats["hits"] += len(tweets) - len(rendered)
+        _stats["misses"] += len(rendered)
+    return [TweetCard(tweet, fragments[fragment_keys[tweet.pk]], viewer_state) for tweet in tweets]
+
+
+def stats():
+    """Hit/miss counters of this process."""
+    with _stats_lock:
+        hits, misses = _stats["hits"], _stats["misses"]
+    total = hits + misses
+    return {"hits": hits, "misses": misses, "hit_ratio": hits / total if total else None}
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
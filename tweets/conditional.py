@@ -0,0 +1,157 @@
+"""Conditional GET for the home feed, profile and tweet detail pages.
+
+A page's weak ETag hashes one cheap validator read before the view runs (the latest timeline entry,
+the profile row, the tweet id) together with the version stamps of everything else it shows: the
+card versions of the listed tweets (see :mod:`tweets.cards`), a per-viewer stamp bumped by the
+viewer's own likes and follows and per-author stamps bumped when an author tweets or deletes. The
+stamps a page depends on are recorded when it is rendered, so revalidating costs the validator plus
+two cache reads, and a match is answered with ``304 Not Modified`` before any heavy queryset runs.
+"""
+
+import hashlib
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+
+from . import cards
+
+
+def _cache():
+    return caches[settings.CONDITIONAL_GET_CACHE]
+
+
+def viewer_stamp(user_id):
+    return f"conditional:stamp:viewer:{user_id}"
+
+
+def author_stamp(user_id):
+    return f"conditional:stamp:author:{user_id}"
+
+
+TRENDING_STAMP = "conditional:stamp:trending"
+
+
+def _bump(key):
+    _cache().set(key, time.time_ns(), None)
+
+
+def invalidate_viewer(user_id):
+    """Mark every page seen by ``user_id`` as changed (their likes, follows or timeline changed)."""
+    _bump(viewer_stamp(user_id))
+
+
+def invalidate_author(user_id):
+    """Mark the pages listing ``user_id``'s tweets as changed (a tweet was posted or deleted)."""
+    _bump(author_stamp(user_id))
+
+
+def invalidate_trending():
+    """Mark the pages showing the trending sidebar as changed."""
+    _bump(TRENDING_STAMP)
+
+
+def _page_key(request):
+    path = hashlib.md5(request.get_full_path().encode(), usedforsecurity=False).hexdigest()
+    return f"conditional:page:{request.user.pk}:{path}"
+
+
+def _etag(request, validator, card_keys, stamp_keys, card_versions, stamps):
+    if len(card_versions) < len(card_keys) or len(stamps) < len(stamp_keys):
+        # An evicted stamp could come back with an old value, so the page cannot be validated.
+        return None
+    versions = [card_versions[key] for key in card_keys] + [stamps[key] for key in stamp_keys]
+    raw = repr((request.user.pk, request.get_full_path(), validator, versions))
+    return f'W/"{hashlib.md5(raw.encode(), usedforsecurity=False).hexdigest()}"'
+
+
+def current_etag(request, validator):
+    """The ETag of the page as last rendered for this viewer, or ``None`` if it cannot be validated."""
+    cache = _cache()
+    page = cache.get(_page_key(request))
+    if page is None:
+        return None
+    card_keys, stamp_keys = page
+    return _etag(request, validator, card_keys, stamp_keys, cards.peek_versions(card_keys), cache.get_many(stamp_keys))
+
+
+def record(request, validator, tweets, stamp_keys):
+    """Remember which stamps a freshly rendered page depends on and return its ETag."""
+    cache = _cache()
+    card_keys = cards.version_keys(tweets)
+    stamps = cache.get_many(stamp_keys)
+    missing = {key: time.time_ns() for key in stamp_keys if key not in stamps}
+    if missing:
+        cache.set_many(missing, None)
+        stamps.update(missing)
+    cache.set(_page_key(request), (card_keys, stamp_keys), settings.CONDITIONAL_GET_CACHE_TIMEOUT)
+    return _etag(request, validator, card_keys, stamp_keys, cards.peek_versions(card_keys), stamps)
+
+
+def _matches(request, etag):
+    tags = parse_etags(request.headers.get("If-None-Match", ""))
+    # If-None-Match uses the weak comparison.
+    return "*" in tags or etag.removeprefix("W/") in {tag.removeprefix("W/") for tag in tags}
+
+
+class ConditionalGetMixin:
+    """Answer a GET with ``304 Not Modified`` while nothing the page shows has changed.
+
+    Views override :meth:`get_validator`, which may run at most one lightweight query, and
+    :meth:`get_stamp_keys`. The listed tweets are read from the ``tweet_list`` context entry. Async
+    views override :meth:`aget_validator` and :meth:`aget_stamp_keys` instead; their ``get`` is
+    wrapped in ``dispatch``, with the cache calls run off the event loop.
+    """
+
+    def get_validator(self):
+        return None
+
+    def get_stamp_keys(self):
+        return [viewer_stamp(self.request.user.pk)]
+
+    async def aget_validator(self):
+        return await sync_to_async(self.get_validator)()
+
+    async def aget_stamp_keys(self):
+        return await sync_to_async(self.get_stamp_keys)()
+
+    def get_conditional_tweets(self, context):
+        return context["tweet_list"]
+
+    def get(self, request, *args, **kwargs):
+        validator = self.get_validator()
+        etag = current_etag(request, validator)
+        if etag is not None and _matches(request, etag):
+            response = HttpResponseNotModified()
+        else:
+            response = super().get(request, *args, **kwargs)
+            tweets = self.get_conditional_tweets(response.context_data)
+            etag = record(request, validator, tweets, self.get_stamp_keys())
+        return self._finalize(response, etag)
+
+    def dispatch(self, request, *args, **kwargs):
+        if self.view_is_async and request.method in ("GET", "HEAD"):
+            return self._aget(request, *args, **kwargs)
+        return super().dispatch(request, *args, **kwargs)
+
+    async def _aget(self, request, *args, **kwargs):
+        validator = await self.aget_validator()
+        etag = await sync_to_async(current_etag)(request, validator)
+        if etag is not None and _matches(request, etag):
+            response = HttpResponseNotModified()
+        else:
+            response = await super().dispatch(request, *args, **kwargs)
+            tweets = self.get_conditional_tweets(response.context_data)
+            etag = await sync_to_async(record)(request, validator, tweets, await self.aget_stamp_keys())
+        return self._finalize(response, etag)
+
+    def _finalize(self, response, etag):
+        if etag is not None:
+            response["ETag"] = etag
+        # Browsers may keep the page but must revalidate it on every visit.
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
@@ -0,0 +1,33 @@
+from django import forms
+from django.conf import settings
+from django.core.exceptions import ValidationError
+
+from .models import Tweet
+
+
+class MultipleFileInput(forms.ClearableFileInput):
+    allow_multiple_selected = True
+
+
+class AttachmentsField(forms.FileField):
+    """Images streamed by :class:`~tweets.attachments.AttachmentUploadHandler`; cleans to a list of them."""
+
+    widget = MultipleFileInput(attrs={"accept": "image/jpeg,image/png,image/gif,image/webp"})
+
+    def clean(self, data, initial=None):
+        uploads = [upload for upload in data or [] if upload]
+        if len(uploads) > settings.ATTACHMENT_MAX_COUNT:
+            raise ValidationError(f"添付できる画像は {settings.ATTACHMENT_MAX_COUNT} 枚までです。")
+        errors = [upload.error for upload in uploads if upload.error]
+        if errors:
+            raise ValidationError(errors)
+        return uploads
+
+
+class TweetForm(forms.ModelForm):
+    attachments = AttachmentsField(required=False)
+
+    class Meta:
+        model = Tweet
+        fields = ("content",)
+        widgets = {"content": forms.Textarea}
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from tweets import attachments
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete the stored images (and their variants) that no attachment refers to any more, and abandoned "
+        "temporary uploads. Files modified within --grace seconds are kept for the requests still storing them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--grace", type=int, default=attachments.PURGE_GRACE_SECONDS)
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        removed = attachments.purge(options["grace"], options["batch_size"])
+        self.stdout.write(f"{removed} blobs deleted")
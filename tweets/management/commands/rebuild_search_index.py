@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from tweets import search
+from tweets.models import Tweet
+
+
+class Command(BaseCommand):
+    help = "Re-index every tweet into the full-text search index, one chunk per transaction."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        search.clear_index()
+        last_pk = 0
+        total = 0
+        while True:
+            with transaction.atomic():
+                rows = list(
+                    Tweet.objects.filter(pk__gt=last_pk)
+                    .order_by("pk")
+                    .values_list("pk", "content")[: options["chunk_size"]]
+                )
+                if not rows:
+                    break
+                search.index_tweets(rows)
+            last_pk = rows[-1][0]
+            total += len(rows)
+            if options["verbosity"] >= 2:
+                self.stdout.write(f"indexed up to pk={last_pk}")
+        self.stdout.write(f"{total} tweets indexed")
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import User
+from tweets.timeline import rebuild_timeline
+
+
+class Command(BaseCommand):
+    help = "Rebuild the materialized home timeline of the given users from scratch."
+
+    def add_arguments(self, parser):
+        parser.add_argument("usernames", nargs="*")
+        parser.add_argument("--all", action="store_true", help="Rebuild the timeline of every user.")
+
+    def handle(self, *args, **options):
+        if options["all"]:
+            users = User.objects.order_by("pk").iterator()
+        elif options["usernames"]:
+            users = User.objects.filter(username__in=options["usernames"]).order_by("pk")
+            missing = set(options["usernames"]) - {user.username for user in users}
+            if missing:
+                raise CommandError(f"Unknown users: {', '.join(sorted(missing))}")
+        else:
+            raise CommandError("Specify usernames or --all.")
+
+        for user in users:
+            count = rebuild_timeline(user)
+            self.stdout.write(f"{user.username}: {count} entries")
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from accounts.models import FriendShip, User
+from mysite.counters import reconcile
+from tweets.models import Like, Tweet
+
+COUNTERS = [
+    (
+        User,
+        {
+            "follower_count": (FriendShip, "following"),
+            "following_count": (FriendShip, "follower"),
+            "tweet_count": (Tweet, "user"),
+        },
+    ),
+    (Tweet, {"like_count": (Like, "tweet")}),
+]
+
+
+class Command(BaseCommand):
+    help = "Recompute drifted follower/following/tweet/like counters in small batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--dry-run", action="store_true", help="Report drift without fixing it.")
+
+    def handle(self, *args, **options):
+        for model, counters in COUNTERS:
+            total = 0
+            for last_pk, drifted in reconcile(model, counters, options["batch_size"], options["dry_run"]):
+                total += drifted
+                if options["verbosity"] >= 2:
+                    self.stdout.write(f"{model._meta.label} up to pk={last_pk}: {drifted} drifted")
+            self.stdout.write(
+                f"{model._meta.label}: {total} drifted rows {'found' if options['dry_run'] else 'fixed'}"
+            )
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from tweets import trending
+
+
+class Command(BaseCommand):
+    help = (
+        "Publish a new trending snapshot. --rebuild first extracts the hashtags of bulk-inserted tweets and "
+        "recounts the window from scratch; --interval keeps refreshing."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rebuild", action="store_true")
+        parser.add_argument("--interval", type=float, help="Keep refreshing every this many seconds.")
+
+    def handle(self, *args, **options):
+        if options["rebuild"]:
+            trending.backfill()
+            trending.reset()
+        while True:
+            snapshot = trending.refresh()
+            if snapshot is None:
+                self.stdout.write("another refresh is running")
+            elif options["verbosity"] >= 1:
+                tags = ", ".join(f"#{hashtag['tag']} ({hashtag['count']})" for hashtag in snapshot["hashtags"])
+                self.stdout.write(f"trending: {tags or '-'}")
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,171 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from accounts.models import FriendShip, User
+from tweets.models import Like, Tweet
+from tweets.timeline import rebuild_timeline
+
+
+@contextmanager
+def explicit_created_at(*models):
+    """Let bulk_create keep the generated ``created_at`` values instead of stamping ``now()``."""
+    fields = [model._meta.get_field("created_at") for model in models]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def power_law_weights(count, alpha):
+    """Cumulative Zipf weights: the item at rank ``r`` is drawn with probability proportional to ``1 / r**alpha``."""
+    return list(accumulate(1 / rank**alpha for rank in range(1, count + 1)))
+
+
+class Command(BaseCommand):
+    help = "Generate synthetic users, a power-law follow graph, tweets and likes with bulk inserts."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--follows", type=int, default=20, help="Average number of users each user follows.")
+        parser.add_argument("--tweets", type=int, default=10000)
+        parser.add_argument("--likes", type=int, default=50000)
+        parser.add_argument("--alpha", type=float, default=1.1, help="Zipf exponent of followee/tweet popularity.")
+        parser.add_argument("--hashtags", type=int, default=200, help="Distinct hashtags; 0 for none.")
+        parser.add_argument("--hashtag-ratio", type=float, default=0.3, help="Share of tweets with a hashtag.")
+        parser.add_argument("--days", type=int, default=30, help="Spread tweets and likes over this many days.")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--prefix", default="seed", help="Username prefix of the generated users.")
+        parser.add_argument("--password", default="password")
+        parser.add_argument("--random-seed", type=int, default=None)
+        parser.add_argument(
+            "--skip-derived",
+            action="store_true",
+            help="Do not reconcile counters, rebuild the search index, trending and timelines afterwards.",
+        )
+        parser.add_argument("--skip-timelines", action="store_true", help="Do not rebuild the home timelines.")
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options["random_seed"])
+        self.batch_size = options["batch_size"]
+        self.now = timezone.now()
+        self.span = timedelta(days=options["days"]).total_seconds()
+
+        user_ids = self.timed("users", self.create_users, options)
+        self.timed("follows", self.create_follows, user_ids, options)
+        tweet_ids = self.timed("tweets", self.create_tweets, user_ids, options)
+        self.timed("likes", self.create_likes, user_ids, tweet_ids, options)
+
+        if not options["skip_derived"]:
+            verbosity = max(0, options["verbosity"] - 1)
+            self.timed("counters", call_command, "reconcile_counters", verbosity=verbosity, stdout=self.stdout)
+            self.timed("search index", call_command, "rebuild_search_index", verbosity=verbosity, stdout=self.stdout)
+            self.timed(
+                "trending", call_command, "refresh_trending", rebuild=True, verbosity=verbosity, stdout=self.stdout
+            )
+            if not options["skip_timelines"]:
+                self.timed("timelines", self.rebuild_timelines, options["prefix"])
+
+    def rebuild_timelines(self, prefix):
+        # The bulk inserts above bypass the fan-out signals, so every seeded user's timeline is rebuilt.
+        for user in User.objects.filter(username__startswith=prefix).order_by("pk").iterator():
+            rebuild_timeline(user)
+
+    def timed(self, label, func, *args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.stdout.write(f"{label}: {time.perf_counter() - start:.1f}s")
+        return result
+
+    def random_time(self):
+        return self.now - timedelta(seconds=self.random.random() * self.span)
+
+    def bulk_create(self, model, objects):
+        batch = []
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) == self.batch_size:
+                model.objects.bulk_create(batch, ignore_conflicts=True)
+                batch = []
+        if batch:
+            model.objects.bulk_create(batch, ignore_conflicts=True)
+
+    def create_users(self, options):
+        password = make_password(options["password"])
+        start = User.objects.filter(username__startswith=options["prefix"]).count()
+        self.bulk_create(
+            User,
+            (
+                User(
+                    username=f"{options['prefix']}{i}", email=f"{options['prefix']}{i}@example.com", password=password
+                )
+                for i in range(start, start + options["users"])
+            ),
+        )
+        return list(User.objects.filter(username__startswith=options["prefix"]).values_list("pk", flat=True))
+
+    def create_follows(self, user_ids, options):
+        popular = user_ids[:]
+        self.random.shuffle(popular)
+        weights = power_law_weights(len(popular), options["alpha"])
+
+        def friendships():
+            for follower_id in user_ids:
+                count = min(len(user_ids) - 1, int(self.random.expovariate(1 / options["follows"])))
+                followings = set(self.random.choices(popular, cum_weights=weights, k=count)) - {follower_id}
+                for following_id in followings:
+                    yield FriendShip(follower_id=follower_id, following_id=following_id)
+
+        self.bulk_create(FriendShip, friendships())
+
+    def create_tweets(self, user_ids, options):
+        active = user_ids[:]
+        self.random.shuffle(active)
+        weights = power_law_weights(len(active), options["alpha"])
+        last_pk = Tweet.objects.order_by("-pk").values_list("pk", flat=True).first() or 0
+        hashtags = self.hashtags(options)
+        with explicit_created_at(Tweet):
+            self.bulk_create(
+                Tweet,
+                (
+                    Tweet(user_id=user_id, content=f"seed tweet {n}{next(hashtags)}", created_at=self.random_time())
+                    for n, user_id in enumerate(self.random.choices(active, cum_weights=weights, k=options["tweets"]))
+                ),
+            )
+        return list(Tweet.objects.filter(pk__gt=last_pk).values_list("pk", flat=True))
+
+    def hashtags(self, options):
+        """Yield a Zipf-distributed " #topicN" suffix for ``--hashtag-ratio`` of the tweets, else ""."""
+        # A separate generator, so that the other draws of a --random-seed stay the same.
+        rng = random.Random(options["random_seed"])
+        weights = power_law_weights(options["hashtags"], options["alpha"])
+        while True:
+            if options["hashtags"] and rng.random() < options["hashtag_ratio"]:
+                yield f" #topic{rng.choices(range(options['hashtags']), cum_weights=weights)[0]}"
+            else:
+                yield ""
+
+    def create_likes(self, user_ids, tweet_ids, options):
+        if not tweet_ids:
+            return
+        popular = tweet_ids[:]
+        self.random.shuffle(popular)
+        weights = power_law_weights(len(popular), options["alpha"])
+        with explicit_created_at(Like):
+            self.bulk_create(
+                Like,
+                (
+                    Like(user_id=self.random.choice(user_ids), tweet_id=tweet_id, created_at=self.random_time())
+                    for tweet_id in self.random.choices(popular, cum_weights=weights, k=options["likes"])
+                ),
+            )
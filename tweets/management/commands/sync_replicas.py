@@ -0,0 +1,37 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database onto the SQLite replicas in REPLICA_DATABASES. Stands in for "
+        "replication when trying the replica routing locally; --interval keeps copying, with that much lag."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, help="Keep syncing every this many seconds.")
+
+    def handle(self, *args, **options):
+        primary = connections[DEFAULT_DB_ALIAS]
+        replicas = [connections[alias] for alias in settings.REPLICA_DATABASES]
+        if not replicas:
+            raise CommandError("No replicas configured; set DJANGO_DB_REPLICA=1.")
+        for connection in [primary, *replicas]:
+            if connection.vendor != "sqlite":
+                raise CommandError(f"{connection.alias} is not SQLite; replicate it with the database's own tools.")
+        while True:
+            primary.ensure_connection()
+            for replica in replicas:
+                target = sqlite3.connect(replica.settings_dict["NAME"])
+                try:
+                    primary.connection.backup(target)
+                finally:
+                    target.close()
+                self.stdout.write(f"{replica.alias} synced")
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from tweets.timeline import trim_timelines
+
+
+class Command(BaseCommand):
+    help = (
+        "Trim the home timelines that grew more than TIMELINE_TRIM_SLACK entries past TIMELINE_MAX_ENTRIES. "
+        "Fan-out queues this as a task on its own; run it by hand after bulk changes."
+    )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{trim_timelines()} timeline entries deleted")
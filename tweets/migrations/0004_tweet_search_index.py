@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-17 18:12
+
+from django.db import migrations
+
+
+def create_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE tweets_tweet_fts USING fts5(document, tokenize = 'unicode61 remove_diacritics 0')"
+        )
+    elif vendor == "postgresql":
+        schema_editor.execute(
+            "CREATE TABLE tweets_tweet_search ("
+            "tweet_id bigint PRIMARY KEY REFERENCES tweets_tweet (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+            "document tsvector NOT NULL)"
+        )
+        schema_editor.execute("CREATE INDEX tweets_tweet_search_document ON tweets_tweet_search USING GIN (document)")
+
+
+def drop_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS tweets_tweet_fts")
+    elif vendor == "postgresql":
+        schema_editor.execute("DROP TABLE IF EXISTS tweets_tweet_search")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tweets", "0003_tweet_like_count_like_like_unique_like"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -1,4 +1,91 @@
-# from django.db import models
+from django.conf import settings
+from django.db import models
 
 
-# class Tweet(models.Model):
+class Tweet(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="tweets")
+    content = models.CharField(max_length=140)
+    like_count = models.PositiveIntegerField(default=0, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-created_at", "-id"]
+        indexes = [
+            models.Index(fields=["-created_at", "-id"], name="tweet_created_idx"),
+            models.Index(fields=["user", "-created_at", "-id"], name="tweet_user_created_idx"),
+        ]
+
+    def __str__(self):
+        return self.content
+
+
+class Like(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="likes")
+    tweet = models.ForeignKey(Tweet, on_delete=models.CASCADE, related_name="likes")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "tweet"], name="unique_like"),
+        ]
+
+    def __str__(self):
+        return f"{self.user} likes {self.tweet_id}"
+
+
+class TweetHashtag(models.Model):
+    """A hashtag of a tweet, extracted when the tweet is created (see ``tweets.trending``)."""
+
+    tweet = models.ForeignKey(Tweet, on_delete=models.CASCADE, related_name="hashtags")
+    tag = models.CharField(max_length=64)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["tweet", "tag"], name="unique_tweet_hashtag"),
+        ]
+
+    def __str__(self):
+        return f"#{self.tag}"
+
+
+class Attachment(models.Model):
+    """An image of a tweet, stored by content under ``MEDIA_ROOT`` (see ``tweets.attachments``)."""
+
+    tweet = models.ForeignKey(Tweet, on_delete=models.CASCADE, related_name="attachments")
+    # SHA-256 of the file: its address in the store, shared by every attachment of the same image.
+    digest = models.CharField(max_length=64, db_index=True)
+    content_type = models.CharField(max_length=32)
+    size = models.PositiveIntegerField()
+    position = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        ordering = ["position", "pk"]
+
+    def __str__(self):
+        return f"{self.tweet_id}: {self.digest}"
+
+
+class TimelineEntry(models.Model):
+    """A tweet materialized into one user's home timeline.
+
+    ``created_at`` is copied from the tweet so that a timeline page is a single index range scan
+    on ``(owner, created_at, tweet)`` without joining the tweets table.
+    """
+
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="timeline_entries")
+    tweet = models.ForeignKey(Tweet, on_delete=models.CASCADE, related_name="timeline_entries")
+    created_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ["-created_at", "-tweet_id"]
+        constraints = [
+            models.UniqueConstraint(fields=["owner", "tweet"], name="unique_timeline_entry"),
+        ]
+        indexes = [
+            models.Index(fields=["owner", "-created_at", "-tweet"], name="timeline_owner_created_idx"),
+        ]
+        verbose_name_plural = "timeline entries"
+
+    def __str__(self):
+        return f"{self.owner}: {self.tweet_id}"
@@ -0,0 +1,83 @@
+"""Keyset (cursor) pagination for newest-first tweet lists.
+
+Pages are addressed by an opaque cursor built from the ``(created_at, id)`` of the last item, so
+every page is an index range scan of the same cost and no ``COUNT(*)`` is ever issued.
+"""
+
+import base64
+import binascii
+from datetime import datetime
+
+from django.core.exceptions import BadRequest
+from django.db.models import Q
+
+
+def encode_token(*parts):
+    raw = "|".join(str(part) for part in parts).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_token(token):
+    """Split an opaque token back into its string parts; invalid tokens are a ``BadRequest``."""
+    try:
+        return base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode().split("|")
+    except (binascii.Error, UnicodeDecodeError) as e:
+        raise BadRequest("Invalid cursor.") from e
+
+
+def encode_cursor(created_at, pk):
+    return encode_token(created_at.isoformat(), pk)
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, pk = decode_token(cursor)
+        return datetime.fromisoformat(created_at), int(pk)
+    except ValueError as e:
+        raise BadRequest("Invalid cursor.") from e
+
+
+def keyset_filter(queryset, cursor, created_field="created_at", id_field="id"):
+    """Restrict a newest-first queryset to the rows strictly older than ``cursor``."""
+    if cursor is None:
+        return queryset
+    created_at, pk = cursor
+    # The redundant ``created_at <= cursor`` bound keeps the predicate sargable on composite indexes.
+    return queryset.filter(
+        Q(**{f"{created_field}__lt": created_at}) | Q(**{created_field: created_at, f"{id_field}__lt": pk}),
+        **{f"{created_field}__lte": created_at},
+    )
+
+
+class KeysetPage:
+    """A page built from ``per_page + 1`` fetched items; the extra item only signals that more exist."""
+
+    def __init__(self, items, per_page):
+        self.object_list = list(items[:per_page])
+        self.has_next = len(items) > per_page
+
+    @property
+    def next_cursor(self):
+        if not self.has_next:
+            return None
+        last = self.object_list[-1]
+        return encode_cursor(last.created_at, last.pk)
+
+
+class KeysetPaginationMixin:
+    """Replace ``MultipleObjectMixin``'s OFFSET/COUNT paginator with keyset pagination."""
+
+    cursor_kwarg = "cursor"
+
+    def get_cursor(self):
+        cursor = self.request.GET.get(self.cursor_kwarg)
+        return decode_cursor(cursor) if cursor else None
+
+    def paginate_queryset(self, queryset, page_size):
+        items = list(keyset_filter(queryset, self.get_cursor())[: page_size + 1])
+        page = KeysetPage(items, page_size)
+        return None, page, page.object_list, page.has_next
+
+    async def apaginate_queryset(self, queryset, page_size):
+        items = [item async for item in keyset_filter(queryset, self.get_cursor())[: page_size + 1]]
+        return KeysetPage(items, page_size)
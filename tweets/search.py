@@ -0,0 +1,161 @@
+"""Full-text tweet search backed by an inverted index.
+
+Tweets are analyzed in Python before they reach the database: latin words are lowercased and runs
+of Japanese (kana/kanji) are split into overlapping bigrams, since neither SQLite's nor Postgres'
+stock tokenizers segment Japanese. The resulting terms are stored in an FTS5 virtual table on
+SQLite and in a GIN-indexed ``tsvector`` table on PostgreSQL (both created by migration 0004).
+"""
+
+import re
+import unicodedata
+
+from django.core.exceptions import BadRequest
+from django.db import connection, connections, router
+
+from .models import Tweet
+from .pagination import decode_token, encode_token
+
+SQLITE_TABLE = "tweets_tweet_fts"
+POSTGRES_TABLE = "tweets_tweet_search"
+
+_CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+_TERM = re.compile(rf"([{_CJK}]+)|((?:(?![{_CJK}])\w)+)")
+
+
+def _groups(text):
+    """Yield ``(terms, is_cjk)`` for each word or CJK run of ``text``."""
+    text = unicodedata.normalize("NFKC", text).lower()
+    for cjk, word in _TERM.findall(text):
+        if cjk:
+            yield [cjk[i : i + 2] for i in range(max(1, len(cjk) - 1))], True
+        else:
+            yield [word], False
+
+
+def analyze(text):
+    """Return the index terms of a document.
+
+    A CJK run also contributes its last character as a unigram so that single-character queries
+    can match it by prefix.
+    """
+    terms = []
+    for group, is_cjk in _groups(text):
+        terms += group
+        if is_cjk and len(group[-1]) == 2:
+            terms.append(group[-1][1])
+    return " ".join(terms)
+
+
+def parse_query(text):
+    """Return the query as a list of phrases (each a list of terms) and whether each is a prefix."""
+    return [(group, is_cjk and len(group[0]) == 1) for group, is_cjk in _groups(text)]
+
+
+def encode_cursor(score, tweet_id):
+    return encode_token(repr(score), tweet_id)
+
+
+def decode_cursor(cursor):
+    try:
+        score, tweet_id = decode_token(cursor)
+        return float(score), int(tweet_id)
+    except ValueError as e:
+        raise BadRequest("Invalid cursor.") from e
+
+
+class SQLiteBackend:
+    def index(self, cursor, rows):
+        cursor.executemany(f"DELETE FROM {SQLITE_TABLE} WHERE rowid = %s", [(tweet_id,) for tweet_id, _ in rows])
+        cursor.executemany(
+            f"INSERT INTO {SQLITE_TABLE} (rowid, document) VALUES (%s, %s)",
+            [(tweet_id, analyze(content)) for tweet_id, content in rows],
+        )
+
+    def remove(self, cursor, tweet_ids):
+        cursor.executemany(f"DELETE FROM {SQLITE_TABLE} WHERE rowid = %s", [(tweet_id,) for tweet_id in tweet_ids])
+
+    def clear(self, cursor):
+        cursor.execute(f"DELETE FROM {SQLITE_TABLE}")
+
+    def search(self, cursor, phrases, limit, after):
+        match = " AND ".join(f'"{" ".join(terms)}"' + ("*" if prefix else "") for terms, prefix in phrases)
+        # bm25() is lower for better matches, so results are ordered ascending.
+        sql = f"SELECT rowid, bm25({SQLITE_TABLE}) AS score FROM {SQLITE_TABLE} WHERE {SQLITE_TABLE} MATCH %s"
+        params = [match]
+        if after:
+            sql += f" AND (bm25({SQLITE_TABLE}) > %s OR (bm25({SQLITE_TABLE}) = %s AND rowid < %s))"
+            params += [after[0], after[0], after[1]]
+        cursor.execute(sql + " ORDER BY score, rowid DESC LIMIT %s", params + [limit])
+        return [(tweet_id, score) for tweet_id, score in cursor.fetchall()]
+
+
+class PostgresBackend:
+    def index(self, cursor, rows):
+        cursor.executemany(
+            f"INSERT INTO {POSTGRES_TABLE} (tweet_id, document) VALUES (%s, to_tsvector('simple', %s)) "
+            "ON CONFLICT (tweet_id) DO UPDATE SET document = EXCLUDED.document",
+            [(tweet_id, analyze(content)) for tweet_id, content in rows],
+        )
+
+    def remove(self, cursor, tweet_ids):
+        cursor.execute(f"DELETE FROM {POSTGRES_TABLE} WHERE tweet_id = ANY(%s)", [list(tweet_ids)])
+
+    def clear(self, cursor):
+        cursor.execute(f"TRUNCATE {POSTGRES_TABLE}")
+
+    def search(self, cursor, phrases, limit, after):
+        query = " & ".join(
+            "(" + " <-> ".join(f"'{term}'" for term in terms) + (":*" if prefix else "") + ")"
+            for terms, prefix in phrases
+        )
+        sql = (
+            f"SELECT tweet_id, score FROM (SELECT tweet_id, ts_rank(document, q) AS score "
+            f"FROM {POSTGRES_TABLE}, to_tsquery('simple', %s) q WHERE document @@ q) ranked"
+        )
+        params = [query]
+        if after:
+            sql += " WHERE score < %s::real OR (score = %s::real AND tweet_id < %s)"
+            params += [after[0], after[0], after[1]]
+        cursor.execute(sql + " ORDER BY score DESC, tweet_id DESC LIMIT %s", params + [limit])
+        return [(tweet_id, float(score)) for tweet_id, score in cursor.fetchall()]
+
+
+def get_backend():
+    if connection.vendor == "sqlite":
+        return SQLiteBackend()
+    if connection.vendor == "postgresql":
+        return PostgresBackend()
+    raise NotImplementedError(f"Tweet search is not supported on {connection.vendor}.")
+
+
+def index_tweets(rows):
+    """(Re)index ``(tweet_id, content)`` rows."""
+    rows = list(rows)
+    if rows:
+        with connection.cursor() as cursor:
+            get_backend().index(cursor, rows)
+
+
+def remove_tweets(tweet_ids):
+    if tweet_ids:
+        with connection.cursor() as cursor:
+            get_backend().remove(cursor, tweet_ids)
+
+
+def remove_tweet(tweet_id):
+    remove_tweets([tweet_id])
+
+
+def clear_index():
+    with connection.cursor() as cursor:
+        get_backend().clear(cursor)
+
+
+def search(text, limit, cursor=None):
+    """Return up to ``limit`` ``(tweet_id, score)`` pairs matching ``text``, best first, after ``cursor``."""
+    phrases = parse_query(text)
+    if not phrases:
+        return []
+    # The index lives next to the tweets, so it is read from wherever they are (see mysite.replicas).
+    with connections[router.db_for_read(Tweet)].cursor() as db_cursor:
+        return get_backend().search(db_cursor, phrases, limit, cursor)
@@ -0,0 +1,110 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from accounts.models import FriendShip
+from mysite import counters
+
+from . import cards, conditional, search, tasks, timeline, trending, viewer_state
+from .models import Like, Tweet
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Tweet)
+def fan_out_tweet(sender, instance, created, **kwargs):
+    if created:
+        counters.adjust(User, instance.user_id, tweet_count=1)
+        timeline.add_own_tweet(instance)
+        conditional.invalidate_author(instance.user_id)
+        tasks.fan_out_tweet.enqueue(tweet_id=instance.pk, idempotency_key=f"fan-out:{instance.pk}")
+
+
+@receiver(post_save, sender=Tweet)
+def invalidate_tweet_card(sender, instance, created, **kwargs):
+    if not created:
+        cards.invalidate_tweet(instance.pk)
+
+
+@receiver(post_save, sender=Tweet)
+def index_tweet(sender, instance, **kwargs):
+    search.index_tweets([(instance.pk, instance.content)])
+
+
+@receiver(post_save, sender=Tweet)
+def record_hashtags(sender, instance, created, **kwargs):
+    if created:
+        trending.record_tweet(instance)
+
+
+@receiver(post_delete, sender=Tweet)
+def decrement_tweet_count(sender, instance, **kwargs):
+    counters.adjust(User, instance.user_id, tweet_count=-1)
+
+
+@receiver(post_delete, sender=Tweet)
+def remove_tweet_from_index(sender, instance, **kwargs):
+    search.remove_tweet(instance.pk)
+
+
+@receiver(post_delete, sender=Tweet)
+def invalidate_deleted_tweet(sender, instance, **kwargs):
+    cards.invalidate_tweet(instance.pk)
+    conditional.invalidate_author(instance.user_id)
+
+
+@receiver(post_save, sender=Like)
+def increment_like_count(sender, instance, created, **kwargs):
+    if created:
+        counters.adjust(Tweet, instance.tweet_id, like_count=1)
+        cards.invalidate_tweet(instance.tweet_id)
+        conditional.invalidate_viewer(instance.user_id)
+
+
+@receiver(post_delete, sender=Like)
+def decrement_like_count(sender, instance, **kwargs):
+    counters.adjust(Tweet, instance.tweet_id, like_count=-1)
+    cards.invalidate_tweet(instance.tweet_id)
+    conditional.invalidate_viewer(instance.user_id)
+
+
+@receiver(pre_save, sender=User)
+def check_author_card_fields(sender, instance, update_fields, **kwargs):
+    # Logins (last_login) and the other saves of a user leave the cards valid.
+    fields = [field for field in cards.AUTHOR_FIELDS if update_fields is None or field in update_fields]
+    instance._author_card_changed = (
+        instance.pk is not None
+        and bool(fields)
+        and User.objects.filter(pk=instance.pk)
+        .exclude(**{field: getattr(instance, field) for field in fields})
+        .exists()
+    )
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_cards(sender, instance, **kwargs):
+    if getattr(instance, "_author_card_changed", False):
+        cards.invalidate_author(instance.pk)
+
+
+@receiver(post_save, sender=FriendShip)
+def add_followee_to_timeline(sender, instance, created, **kwargs):
+    if created:
+        viewer_state.invalidate_following(instance.follower_id)
+        conditional.invalidate_viewer(instance.follower_id)
+        tasks.add_followee.enqueue(
+            follower_id=instance.follower_id,
+            following_id=instance.following_id,
+            idempotency_key=f"follow:{instance.pk}",
+        )
+
+
+@receiver(post_delete, sender=FriendShip)
+def remove_followee_from_timeline(sender, instance, **kwargs):
+    viewer_state.invalidate_following(instance.follower_id)
+    conditional.invalidate_viewer(instance.follower_id)
+    tasks.remove_followee.enqueue(
+        follower_id=instance.follower_id,
+        following_id=instance.following_id,
+        idempotency_key=f"unfollow:{instance.pk}",
+    )
@@ -0,0 +1,62 @@
+"""Live home-feed updates over Server-Sent Events (``tweets:stream``, served by the ASGI app).
+
+Each open stream subscribes to its viewer's feed channel, to which the fan-out task publishes the
+ids of the tweets it adds to the timeline, and to the author channels of the celebrities the
+viewer follows, whose tweets are not fanned out. Tweets arriving within
+``STREAM_COALESCE_DELAY`` of each other become one ``tweets`` event (``{"count", "ids"}``; the
+count includes tweets dropped from a full buffer), a comment is sent every ``STREAM_HEARTBEAT``
+seconds to keep proxies from closing an idle stream, and the stream ends after
+``STREAM_MAX_AGE`` seconds, when the browser reconnects and picks up follow changes.
+"""
+
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+
+from mysite.pubsub import get_broker
+
+
+def feed_channel(user_id):
+    return f"feed:{user_id}"
+
+
+def author_channel(user_id):
+    return f"author:{user_id}"
+
+
+def notify_followers(follower_ids, tweet_id):
+    """Tell the open streams of ``follower_ids`` about ``tweet_id`` once the transaction commits."""
+    messages = [(feed_channel(follower_id), tweet_id) for follower_id in follower_ids]
+    transaction.on_commit(lambda: get_broker().publish_many(messages))
+
+
+def notify_author_followers(tweet):
+    transaction.on_commit(lambda: get_broker().publish(author_channel(tweet.user_id), tweet.pk))
+
+
+async def subscribe(user):
+    from .timeline import celebrity_followee_ids
+
+    celebrity_ids = await sync_to_async(celebrity_followee_ids)(user)
+    channels = [feed_channel(user.pk)] + [author_channel(user_id) for user_id in celebrity_ids]
+    return get_broker().subscribe(channels, settings.STREAM_QUEUE_SIZE)
+
+
+async def events(subscription):
+    """Yield the SSE stream of ``subscription`` and close it when the stream ends."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.STREAM_MAX_AGE
+    try:
+        yield f"retry: {settings.STREAM_RETRY * 1000:.0f}\n\n"
+        while (remaining := deadline - loop.time()) > 0:
+            if not await subscription.wait(min(settings.STREAM_HEARTBEAT, remaining)):
+                yield ":\n\n"
+                continue
+            await asyncio.sleep(settings.STREAM_COALESCE_DELAY)
+            tweet_ids, dropped = subscription.drain()
+            yield f"event: tweets\ndata: {json.dumps({'count': len(tweet_ids) + dropped, 'ids': tweet_ids})}\n\n"
+    finally:
+        subscription.close()
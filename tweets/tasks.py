@@ -0,0 +1,47 @@
+"""Timeline maintenance run by the task workers.
+
+Each task re-reads the current state before acting, so a task that runs late (after the tweet was
+deleted or the follow undone) or twice does no harm.
+"""
+
+from accounts.models import FriendShip
+from tasks.queue import task
+
+from . import attachments, conditional, timeline, trending
+from .models import Tweet
+
+
+@task()
+def fan_out_tweet(tweet_id):
+    tweet = Tweet.objects.filter(pk=tweet_id).first()
+    if tweet is not None:
+        timeline.fan_out_tweet(tweet)
+
+
+@task()
+def refresh_trending():
+    trending.refresh()
+
+
+@task()
+def trim_timelines():
+    timeline.trim_timelines()
+
+
+@task()
+def make_variants(digest):
+    attachments.make_variants(digest)
+
+
+@task()
+def add_followee(follower_id, following_id):
+    if FriendShip.objects.filter(follower_id=follower_id, following_id=following_id).exists():
+        timeline.add_followee(follower_id, following_id)
+        conditional.invalidate_viewer(follower_id)
+
+
+@task()
+def remove_followee(follower_id, following_id):
+    if not FriendShip.objects.filter(follower_id=follower_id, following_id=following_id).exists():
+        timeline.remove_followee(follower_id, following_id)
+        conditional.invalidate_viewer(follower_id)
@@ -0,0 +1,207 @@
+"""Materialized home timelines.
+
+New tweets are pushed into a ``TimelineEntry`` row per follower (fan-out on write, run as a
+background task by ``tweets.tasks``), so reading a home feed is a single index range scan. Authors
+with more than ``TIMELINE_FANOUT_FOLLOWER_LIMIT`` followers are not fanned out; their tweets are
+pulled and merged in when the feed is read. Either way the open live streams of the followers are
+notified (see ``tweets.stream``). A timeline keeps its newest ``TIMELINE_MAX_ENTRIES`` entries; pushes
+do not trim, they queue a ``trim_timelines`` task at most once per ``TIMELINE_TRIM_INTERVAL``, which
+trims only the timelines more than ``TIMELINE_TRIM_SLACK`` entries over the cap.
+"""
+
+import asyncio
+import time
+from heapq import merge
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+
+from accounts.models import FriendShip, User
+
+from . import stream
+from .models import TimelineEntry, Tweet
+from .pagination import keyset_filter
+
+_requested_slot = None
+
+
+def _sort_key(tweet):
+    return (tweet.created_at, tweet.pk)
+
+
+def _batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def is_celebrity(user_id):
+    return User.objects.filter(pk=user_id, follower_count__gt=settings.TIMELINE_FANOUT_FOLLOWER_LIMIT).exists()
+
+
+def _celebrity_followees(user):
+    return User.objects.filter(
+        followers__follower=user, follower_count__gt=settings.TIMELINE_FANOUT_FOLLOWER_LIMIT
+    ).values_list("id", flat=True)
+
+
+def celebrity_followee_ids(user):
+    return list(_celebrity_followees(user))
+
+
+async def acelebrity_followee_ids(user):
+    return [user_id async for user_id in _celebrity_followees(user)]
+
+
+def _trim(owner_id):
+    """Delete the owner's entries beyond the newest ``TIMELINE_MAX_ENTRIES``; return how many were deleted."""
+    entries = TimelineEntry.objects.filter(owner_id=owner_id)
+    oldest_kept = entries.values_list("created_at", "tweet_id")[settings.TIMELINE_MAX_ENTRIES - 1 :][:1]
+    cursor = next(iter(oldest_kept), None)
+    if cursor is None:
+        return 0
+    return keyset_filter(entries, cursor, id_field="tweet_id").delete()[0]
+
+
+def trim_timelines():
+    """Trim every timeline more than ``TIMELINE_TRIM_SLACK`` entries over the cap; return the entries deleted.
+
+    One grouped count over the entries finds the long timelines, each of which is then trimmed with
+    an index range scan of its own, so the cost does not depend on how many tweets were fanned out.
+    """
+    limit = settings.TIMELINE_MAX_ENTRIES + settings.TIMELINE_TRIM_SLACK
+    owner_ids = (
+        TimelineEntry.objects.values("owner_id")
+        .annotate(entries=Count("pk"))
+        .filter(entries__gt=limit)
+        .values_list("owner_id", flat=True)
+    )
+    return sum(_trim(owner_id) for owner_id in list(owner_ids))
+
+
+def _request_trim():
+    """Queue a ``trim_timelines`` task, at most once per interval and process."""
+    global _requested_slot
+    slot = int(time.time() // settings.TIMELINE_TRIM_INTERVAL)
+    if slot != _requested_slot:
+        _requested_slot = slot
+        from .tasks import trim_timelines
+
+        trim_timelines.enqueue(idempotency_key=f"trim-timelines:{slot}")
+
+
+def _insert_entries(owner_ids, tweet):
+    for batch in _batched(owner_ids, settings.TIMELINE_FANOUT_BATCH_SIZE):
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(owner_id=owner_id, tweet_id=tweet.pk, created_at=tweet.created_at) for owner_id in batch],
+            ignore_conflicts=True,
+        )
+    _request_trim()
+
+
+def add_own_tweet(tweet):
+    _insert_entries([tweet.user_id], tweet)
+
+
+def fan_out_tweet(tweet):
+    """Push a new tweet into every follower's timeline unless the author is a celebrity."""
+    if is_celebrity(tweet.user_id):
+        stream.notify_author_followers(tweet)
+        return
+    follower_ids = FriendShip.objects.filter(following_id=tweet.user_id).values_list("follower_id", flat=True)
+    for batch in _batched(
+        follower_ids.iterator(chunk_size=settings.TIMELINE_FANOUT_BATCH_SIZE), settings.TIMELINE_FANOUT_BATCH_SIZE
+    ):
+        _insert_entries(batch, tweet)
+        stream.notify_followers(batch, tweet.pk)
+
+
+def add_followee(follower_id, following_id):
+    """Backfill the recent tweets of a newly followed user into the follower's timeline."""
+    if is_celebrity(following_id):
+        return
+    tweets = Tweet.objects.filter(user_id=following_id).values_list("id", "created_at")
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(owner_id=follower_id, tweet_id=tweet_id, created_at=created_at)
+            for tweet_id, created_at in tweets[: settings.TIMELINE_MAX_ENTRIES]
+        ],
+        ignore_conflicts=True,
+    )
+    _request_trim()
+
+
+def remove_followee(follower_id, following_id):
+    TimelineEntry.objects.filter(owner_id=follower_id, tweet__user_id=following_id).delete()
+
+
+def rebuild_timeline(user):
+    """Recreate a user's materialized timeline from the follow graph and return the number of entries."""
+    celebrity_ids = celebrity_followee_ids(user)
+    author_ids = [user.pk] + [
+        user_id
+        for user_id in FriendShip.objects.filter(follower=user).values_list("following_id", flat=True)
+        if user_id not in celebrity_ids
+    ]
+    tweets = Tweet.objects.filter(user_id__in=author_ids).values_list("id", "created_at")
+    entries = [
+        TimelineEntry(owner=user, tweet_id=tweet_id, created_at=created_at)
+        for tweet_id, created_at in tweets[: settings.TIMELINE_MAX_ENTRIES]
+    ]
+    with transaction.atomic():
+        TimelineEntry.objects.filter(owner=user).delete()
+        TimelineEntry.objects.bulk_create(entries, batch_size=settings.TIMELINE_FANOUT_BATCH_SIZE)
+    return len(entries)
+
+
+def _materialized(user, limit, cursor):
+    entries = keyset_filter(TimelineEntry.objects.filter(owner=user), cursor, id_field="tweet_id")
+    return entries.select_related("tweet__user")[:limit]
+
+
+def _pulled(celebrity_ids, limit, cursor):
+    return keyset_filter(Tweet.objects.filter(user_id__in=celebrity_ids), cursor).select_related("user")[:limit]
+
+
+def _merge(materialized, pulled, limit):
+    tweets = []
+    seen = set()
+    for tweet in merge(materialized, pulled, key=_sort_key, reverse=True):
+        if tweet.pk not in seen:
+            seen.add(tweet.pk)
+            tweets.append(tweet)
+        if len(tweets) == limit:
+            break
+    return tweets
+
+
+def get_home_timeline(user, limit, cursor=None, celebrity_ids=None):
+    """Return up to ``limit`` tweets of the user's home feed older than ``cursor``, newest first.
+
+    ``celebrity_ids`` may pass in :func:`celebrity_followee_ids`, when the caller already looked them up.
+    """
+    materialized = [entry.tweet for entry in _materialized(user, limit, cursor)]
+    if celebrity_ids is None:
+        celebrity_ids = celebrity_followee_ids(user)
+    if not celebrity_ids:
+        return materialized
+    return _merge(materialized, _pulled(celebrity_ids, limit, cursor), limit)
+
+
+async def aget_home_timeline(user, limit, cursor=None, celebrity_ids=None):
+    """Async :func:`get_home_timeline`; the materialized slice and the celebrity lookup run concurrently."""
+
+    async def materialized():
+        return [entry.tweet async for entry in _materialized(user, limit, cursor)]
+
+    async def lookup_celebrity_ids():
+        if celebrity_ids is not None:
+            return celebrity_ids
+        return await acelebrity_followee_ids(user)
+
+    materialized, celebrity_ids = await asyncio.gather(materialized(), lookup_celebrity_ids())
+    if not celebrity_ids:
+        return materialized
+    return _merge(materialized, [tweet async for tweet in _pulled(celebrity_ids, limit, cursor)], limit)
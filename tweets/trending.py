@@ -0,0 +1,291 @@
+"""Trending hashtags and most-liked tweets over a sliding window.
+
+Hashtags are extracted when a tweet is created and stored as :class:`~tweets.models.TweetHashtag`
+rows; likes are already rows. :func:`refresh` consumes the rows added since its previous run (a pk
+watermark per table, see :class:`_Cursor`) into :class:`WindowedCounts`: one :class:`SpaceSaving`
+top-K summary per minute for the last hour, merged into one per hour after that and dropped once
+older than ``TRENDING_WINDOW_HOURS``. A like counts once per user and tweet, unless it is liked again
+more than an hour after its previous like; unlikes are not subtracted. The state, which is stored
+whole on every refresh, is bounded however many distinct hashtags are used: at most
+``TRENDING_CAPACITY`` items per summary, the ``TRENDING_LIKED_PAIRS`` most recently liked pairs (a
+like of a pair forgotten early counts again) and ``TRENDING_RESCAN_PKS`` pks per cursor.
+
+The top entries are published as a snapshot in ``TRENDING_CACHE``, so the sidebar is one cache
+read. A snapshot older than ``TRENDING_REFRESH_INTERVAL`` queues a refresh (run inline with
+``TASKS_EAGER``). The aggregation state lives in the same cache; when it is lost it is rebuilt from
+the rows of the window. Like the other caches, it must be shared (Redis, memcached) for the task
+workers' refreshes to reach the web processes.
+"""
+
+import re
+import time
+import unicodedata
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import conditional
+from .models import Like, Tweet, TweetHashtag
+
+# Matched after NFKC normalization, which turns "＃" into "#"; "a#b" and URL fragments are not tags.
+HASHTAG = re.compile(r"(?<![\w/&#])#(\w+)")
+MAX_HASHTAGS = 10
+STATE_KEY = "trending:state:v2"
+SNAPSHOT_KEY = "trending:snapshot"
+LOCK_KEY = "trending:lock"
+LOCK_TIMEOUT = 60
+
+_requested_slot = None
+
+
+def _cache():
+    return caches[settings.TRENDING_CACHE]
+
+
+def extract_hashtags(text):
+    """The distinct hashtags of ``text``, normalized (NFKC, lowercase), in order of appearance."""
+    tags = []
+    for tag in HASHTAG.findall(unicodedata.normalize("NFKC", text)):
+        tag = tag.lower()[: TweetHashtag._meta.get_field("tag").max_length]
+        # "#1" is a number, not a topic.
+        if not tag.isdigit() and tag not in tags:
+            tags.append(tag)
+    return tags[:MAX_HASHTAGS]
+
+
+def _hashtags(tweet_id, content, created_at):
+    return [TweetHashtag(tweet_id=tweet_id, tag=tag, created_at=created_at) for tag in extract_hashtags(content)]
+
+
+def record_tweet(tweet):
+    TweetHashtag.objects.bulk_create(_hashtags(tweet.pk, tweet.content, tweet.created_at), ignore_conflicts=True)
+
+
+def backfill(batch_size=1000):
+    """Extract the hashtags of the tweets in the window that were inserted without the signals (seeds)."""
+    cutoff = datetime.fromtimestamp(time.time() - settings.TRENDING_WINDOW_HOURS * 60 * 60, timezone.utc)
+    rows = Tweet.objects.filter(created_at__gte=cutoff).values_list("pk", "content", "created_at")
+    batch = []
+    for row in rows.iterator(chunk_size=batch_size):
+        batch += _hashtags(*row)
+        if len(batch) >= batch_size:
+            TweetHashtag.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    TweetHashtag.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class SpaceSaving:
+    """Approximate top-K counts in at most ``capacity`` counters (the Space-Saving algorithm).
+
+    An item that is not tracked while every counter is taken replaces the smallest counter and
+    inherits its count, so counts are upper bounds; any item counted more than ``total / capacity``
+    times is guaranteed to be tracked.
+    """
+
+    __slots__ = ("capacity", "counts")
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}
+
+    def add(self, item, count=1):
+        counts = self.counts
+        if item in counts:
+            counts[item] += count
+        elif len(counts) < self.capacity:
+            counts[item] = count
+        else:
+            smallest = min(counts, key=counts.get)
+            counts[item] = counts.pop(smallest) + count
+
+    def update(self, counts):
+        # Largest first, so that the heavy hitters are not the ones evicted.
+        for item, count in sorted(counts.items(), key=lambda pair: pair[1], reverse=True):
+            self.add(item, count)
+
+    def top(self, k):
+        return sorted(self.counts.items(), key=lambda pair: (-pair[1], str(pair[0])))[:k]
+
+
+class WindowedCounts:
+    """Counts over the last ``window_hours``: minute summaries for the last hour, hour summaries before."""
+
+    def __init__(self, capacity, window_hours):
+        self.capacity = capacity
+        self.window_hours = window_hours
+        self.minutes = {}
+        self.hours = {}
+
+    def add(self, item, timestamp):
+        self.minutes.setdefault(int(timestamp // 60), SpaceSaving(self.capacity)).add(item)
+
+    def roll(self, now):
+        """Roll minute buckets older than an hour into their hour and drop what left the window."""
+        current_minute = int(now // 60)
+        oldest_hour = current_minute // 60 - self.window_hours
+        for minute in sorted(self.minutes):
+            if minute > current_minute - 60:
+                break
+            summary = self.minutes.pop(minute)
+            if minute // 60 >= oldest_hour:
+                self.hours.setdefault(minute // 60, SpaceSaving(self.capacity)).update(summary.counts)
+        for hour in [hour for hour in self.hours if hour < oldest_hour]:
+            del self.hours[hour]
+
+    def top(self, k):
+        merged = SpaceSaving(self.capacity)
+        for summary in [*self.hours.values(), *self.minutes.values()]:
+            merged.update(summary.counts)
+        return merged.top(k)
+
+
+class _Cursor:
+    """How far a table has been counted: a pk watermark, plus the pks counted just below it.
+
+    A row can commit after rows with a higher pk, so the last ``TRENDING_RESCAN_PKS`` pks before the
+    watermark are read again and the rows not yet in ``seen`` counted (never below ``floor``, where
+    counting started).
+    """
+
+    def __init__(self, watermark):
+        self.watermark = watermark
+        self.floor = watermark
+        self.seen = set()
+
+    def consume(self, model, fields, add):
+        """Call ``add(*fields, created_at)`` for every row of ``model`` not counted yet."""
+        queryset = model.objects.order_by("pk").values_list("pk", *fields, "created_at")
+        after = max(self.floor, self.watermark - settings.TRENDING_RESCAN_PKS)
+        while True:
+            rows = list(queryset.filter(pk__gt=after)[: settings.TRENDING_BATCH_SIZE])
+            for pk, *values in rows:
+                if pk not in self.seen:
+                    self.seen.add(pk)
+                    add(*values)
+            if rows:
+                after = rows[-1][0]
+            if len(rows) < settings.TRENDING_BATCH_SIZE:
+                break
+        self.watermark = max(self.watermark, after)
+        self.seen = {pk for pk in self.seen if pk > self.watermark - settings.TRENDING_RESCAN_PKS}
+
+
+class _State:
+    def __init__(self, now):
+        self.hashtags = WindowedCounts(settings.TRENDING_CAPACITY, settings.TRENDING_WINDOW_HOURS)
+        self.likes = WindowedCounts(settings.TRENDING_CAPACITY, settings.TRENDING_WINDOW_HOURS)
+        cutoff = datetime.fromtimestamp(now - settings.TRENDING_WINDOW_HOURS * 60 * 60, timezone.utc)
+        self.hashtag_cursor = _Cursor(_watermark(TweetHashtag, cutoff))
+        self.like_cursor = _Cursor(_watermark(Like, cutoff))
+        # (user_id, tweet_id) to the minute it was last liked in.
+        self.liked = {}
+
+    def add_hashtag(self, tag, created_at):
+        self.hashtags.add(tag, created_at.timestamp())
+
+    def add_like(self, user_id, tweet_id, created_at):
+        # Liking, unliking and liking again leaves a second row for the same pair.
+        timestamp = created_at.timestamp()
+        if (user_id, tweet_id) not in self.liked:
+            self.likes.add(tweet_id, timestamp)
+        self.liked[user_id, tweet_id] = max(self.liked.get((user_id, tweet_id), 0), int(timestamp // 60))
+
+    def roll(self, now):
+        self.hashtags.roll(now)
+        self.likes.roll(now)
+        # The pairs are remembered for an hour after their last like, like the minute buckets, and only
+        # the most recent ones when more were liked in that hour.
+        current_minute = int(now // 60)
+        liked = [(pair, minute) for pair, minute in self.liked.items() if minute > current_minute - 60]
+        if len(liked) > settings.TRENDING_LIKED_PAIRS:
+            liked = sorted(liked, key=lambda item: item[1])[-settings.TRENDING_LIKED_PAIRS :]
+        self.liked = dict(liked)
+
+
+def _watermark(model, cutoff):
+    """The pk of the newest row created before ``cutoff``, walking back from the newest rows."""
+    queryset = model.objects.order_by("-pk").values_list("pk", "created_at")
+    before = None
+    while True:
+        rows = list((queryset if before is None else queryset.filter(pk__lt=before))[: settings.TRENDING_BATCH_SIZE])
+        for pk, created_at in rows:
+            if created_at < cutoff:
+                return pk
+        if len(rows) < settings.TRENDING_BATCH_SIZE:
+            return 0
+        before = rows[-1][0]
+
+
+def _top_tweets(ranked):
+    tweets = Tweet.objects.select_related("user").in_bulk([tweet_id for tweet_id, _ in ranked])
+    return [
+        {"id": tweet_id, "username": tweets[tweet_id].user.username, "content": tweets[tweet_id].content, "likes": n}
+        for tweet_id, n in ranked
+        if tweet_id in tweets
+    ]
+
+
+def refresh(now=None):
+    """Consume the hashtags and likes added since the last refresh and publish a new snapshot.
+
+    Returns the snapshot, or ``None`` when another refresh is running.
+    """
+    cache = _cache()
+    if not cache.add(LOCK_KEY, True, LOCK_TIMEOUT):
+        return None
+    try:
+        now = time.time() if now is None else now
+        state = cache.get(STATE_KEY) or _State(now)
+        state.hashtag_cursor.consume(TweetHashtag, ["tag"], state.add_hashtag)
+        state.like_cursor.consume(Like, ["user_id", "tweet_id"], state.add_like)
+        state.roll(now)
+        count = settings.TRENDING_COUNT
+        snapshot = {
+            "hashtags": [{"tag": tag, "count": n} for tag, n in state.hashtags.top(count)],
+            # Some of the most liked tweets may have been deleted since.
+            "tweets": _top_tweets(state.likes.top(count * 2))[:count],
+            "updated_at": now,
+        }
+        previous = cache.get(SNAPSHOT_KEY)
+        cache.set_many({STATE_KEY: state, SNAPSHOT_KEY: snapshot}, None)
+        if previous is None or (previous["hashtags"], previous["tweets"]) != (
+            snapshot["hashtags"],
+            snapshot["tweets"],
+        ):
+            conditional.invalidate_trending()
+        return snapshot
+    finally:
+        cache.delete(LOCK_KEY)
+
+
+def _request_refresh(now):
+    """Queue a refresh, at most once per interval and process."""
+    global _requested_slot
+    slot = int(now // settings.TRENDING_REFRESH_INTERVAL)
+    if slot != _requested_slot:
+        _requested_slot = slot
+        from .tasks import refresh_trending
+
+        refresh_trending.enqueue(idempotency_key=f"trending:{slot}")
+
+
+def snapshot():
+    """The published ``{"hashtags", "tweets", "updated_at"}`` snapshot; empty lists before the first refresh."""
+    now = time.time()
+    published = _cache().get(SNAPSHOT_KEY)
+    if published is None or now - published["updated_at"] >= settings.TRENDING_REFRESH_INTERVAL:
+        _request_refresh(now)
+        published = _cache().get(SNAPSHOT_KEY, published)
+    return published or {"hashtags": [], "tweets": [], "updated_at": None}
+
+
+def invalidate():
+    """Drop the counts after hashtags or likes were deleted in bulk; the next refresh recounts the window."""
+    _cache().delete(STATE_KEY)
+
+
+def reset():
+    global _requested_slot
+    _requested_slot = None
+    _cache().delete_many([STATE_KEY, SNAPSHOT_KEY, LOCK_KEY])
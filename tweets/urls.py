@@ -1,14 +1,22 @@
-from django.urls import path
+from django.conf import settings
+from django.urls import path, re_path
 
 from . import views
 
 app_name = "tweets"
 
 urlpatterns = [
-    path("home/", views.HomeView.as_view(), name="home"),
-    # path('create/', views.TweetCreateView.as_view(), name='create'),
-    # path('<int:pk>/', views.TweetDetailView.as_view(), name='detail'),
-    # path('<int:pk>/delete/', views.TweetDeleteView.as_view(), name='delete'),
-    # path('<int:pk>/like/', views.LikeView, name='like'),
-    # path('<int:pk>/unlike/', views.UnlikeView, name='unlike'),
+    path("home/", (views.AsyncHomeView if settings.ASYNC_VIEWS else views.HomeView).as_view(), name="home"),
+    # Meant for the ASGI app: under WSGI every open stream would hold a worker thread.
+    path("stream/", views.FeedStreamView.as_view(), name="stream"),
+    path("create/", views.TweetCreateView.as_view(), name="create"),
+    path("search/", views.SearchView.as_view(), name="search"),
+    path("<int:pk>/", views.TweetDetailView.as_view(), name="detail"),
+    path("<int:pk>/delete/", views.TweetDeleteView.as_view(), name="delete"),
+    path("<int:pk>/like/", views.LikeView.as_view(), name="like"),
+    path("<int:pk>/unlike/", views.UnlikeView.as_view(), name="unlike"),
+    re_path(
+        r"^media/(?P<digest>[0-9a-f]{64})/(?P<variant>[a-z]+)$", views.AttachmentView.as_view(), name="attachment"
+    ),
+    path("cards/stats/", views.CardCacheStatsView.as_view(), name="card_cache_stats"),
 ]
@@ -0,0 +1,84 @@
+"""Per-viewer flags for a page of tweets, resolved in bulk.
+
+"Liked by me" is answered with one query per page. "I follow this author" is answered from the
+viewer's followee id set, which is cached and dropped whenever the viewer follows or unfollows.
+"""
+
+from django.conf import settings
+from django.core.cache import caches
+
+from accounts.models import FriendShip
+
+from .models import Like
+
+
+def _following_key(user_id):
+    return f"viewer-state:following:{user_id}"
+
+
+def invalidate_following(user_id):
+    caches[settings.VIEWER_STATE_CACHE].delete(_following_key(user_id))
+
+
+def _followees(user):
+    return FriendShip.objects.filter(follower=user).values_list("following_id", flat=True)
+
+
+def following_ids(user):
+    cache = caches[settings.VIEWER_STATE_CACHE]
+    key = _following_key(user.pk)
+    ids = cache.get(key)
+    if ids is None:
+        ids = frozenset(_followees(user))
+        cache.set(key, ids, settings.VIEWER_STATE_CACHE_TIMEOUT)
+    return ids
+
+
+async def afollowing_ids(user):
+    cache = caches[settings.VIEWER_STATE_CACHE]
+    key = _following_key(user.pk)
+    ids = await cache.aget(key)
+    if ids is None:
+        ids = frozenset([user_id async for user_id in _followees(user)])
+        await cache.aset(key, ids, settings.VIEWER_STATE_CACHE_TIMEOUT)
+    return ids
+
+
+class ViewerState:
+    def __init__(self, viewer, tweets=()):
+        self.viewer = viewer
+        self.liked_ids = set()
+        self._following_ids = None
+        if tweets:
+            self.resolve(tweets)
+
+    def _likes(self, tweets):
+        ids = [tweet.pk for tweet in tweets]
+        return Like.objects.filter(user=self.viewer, tweet_id__in=ids).values_list("tweet_id", flat=True)
+
+    def resolve(self, tweets):
+        if tweets:
+            self.liked_ids.update(self._likes(tweets))
+        return self
+
+    async def aresolve(self, tweets):
+        if tweets:
+            self.liked_ids.update([tweet_id async for tweet_id in self._likes(tweets)])
+        return self
+
+    async def aload_following(self):
+        """Load the followee set ahead of :meth:`follows` so it can overlap with other queries."""
+        self._following_ids = await afollowing_ids(self.viewer)
+        return self
+
+    @property
+    def following_ids(self):
+        if self._following_ids is None:
+            self._following_ids = following_ids(self.viewer)
+        return self._following_ids
+
+    def likes(self, tweet):
+        return tweet.pk in self.liked_ids
+
+    def follows(self, user):
+        return getattr(user, "pk", user) in self.following_ids
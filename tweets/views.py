@@ -1,6 +1,220 @@
-from django.contrib.auth.mixins import LoginRequiredMixin
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
+from django.db import transaction
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.template.response import TemplateResponse
+from django.urls import reverse, reverse_lazy
+from django.utils.decorators import method_decorator
+from django.utils.functional import cached_property
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from django.views.generic import CreateView, DeleteView, DetailView
 from django.views.generic.base import TemplateView
 
+from accounts.graph import who_to_follow
+from accounts.mixins import AsyncLoginRequiredMixin
+from mysite.ratelimit import RateLimitMixin
+
+from . import attachments, cards, search, stream, trending
+from .conditional import TRENDING_STAMP, ConditionalGetMixin, author_stamp
+from .forms import TweetForm
+from .models import Attachment, Like, TimelineEntry, Tweet
+from .pagination import KeysetPage, KeysetPaginationMixin
+from .timeline import acelebrity_followee_ids, aget_home_timeline, celebrity_followee_ids, get_home_timeline
+from .viewer_state import ViewerState
+
+
+class HomeView(LoginRequiredMixin, ConditionalGetMixin, KeysetPaginationMixin, TemplateView):
+    template_name = "tweets/home.html"
+
+    def get_validator(self):
+        return TimelineEntry.objects.filter(owner=self.request.user).values_list("pk", flat=True).first()
+
+    @cached_property
+    def celebrity_ids(self):
+        return celebrity_followee_ids(self.request.user)
+
+    def get_stamp_keys(self):
+        # Celebrity tweets are pulled in at read time rather than fanned out into the timeline.
+        celebrity_stamps = [author_stamp(user_id) for user_id in self.celebrity_ids]
+        return super().get_stamp_keys() + celebrity_stamps + [TRENDING_STAMP]
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        page_size = settings.TWEET_PAGE_SIZE
+        tweets = get_home_timeline(self.request.user, page_size + 1, self.get_cursor(), self.celebrity_ids)
+        page = KeysetPage(tweets, page_size)
+        viewer_state = ViewerState(self.request.user, page.object_list)
+        context["page_obj"] = page
+        context["tweet_list"] = page.object_list
+        context["card_list"] = cards.render_cards(page.object_list, viewer_state)
+        context["who_to_follow"] = who_to_follow(self.request.user, exclude=viewer_state.following_ids)
+        context["trending"] = trending.snapshot()
+        return context
+
+
+class AsyncHomeView(AsyncLoginRequiredMixin, ConditionalGetMixin, KeysetPaginationMixin, View):
+    """HomeView for the ASGI deployment, built on the async ORM."""
 
-class HomeView(LoginRequiredMixin, TemplateView):
     template_name = "tweets/home.html"
+    celebrity_ids = None
+
+    async def aget_validator(self):
+        return await TimelineEntry.objects.filter(owner=self.request.user).values_list("pk", flat=True).afirst()
+
+    async def aget_celebrity_ids(self):
+        if self.celebrity_ids is None:
+            self.celebrity_ids = await acelebrity_followee_ids(self.request.user)
+        return self.celebrity_ids
+
+    async def aget_stamp_keys(self):
+        celebrity_stamps = [author_stamp(user_id) for user_id in await self.aget_celebrity_ids()]
+        return self.get_stamp_keys() + celebrity_stamps + [TRENDING_STAMP]
+
+    async def get(self, request, *args, **kwargs):
+        page_size = settings.TWEET_PAGE_SIZE
+        viewer_state = ViewerState(request.user)
+        celebrity_ids, _ = await asyncio.gather(self.aget_celebrity_ids(), viewer_state.aload_following())
+        tweets = await aget_home_timeline(request.user, page_size + 1, self.get_cursor(), celebrity_ids)
+        page = KeysetPage(tweets, page_size)
+        await viewer_state.aresolve(page.object_list)
+        context = {
+            "view": self,
+            "page_obj": page,
+            "tweet_list": page.object_list,
+            "card_list": await sync_to_async(cards.render_cards)(page.object_list, viewer_state),
+            "who_to_follow": await sync_to_async(who_to_follow)(request.user, exclude=viewer_state.following_ids),
+            "trending": await sync_to_async(trending.snapshot)(),
+            "stream_url": reverse("tweets:stream"),
+        }
+        return TemplateResponse(request, self.template_name, context)
+
+
+class FeedStreamView(AsyncLoginRequiredMixin, View):
+    """Server-Sent Events announcing new tweets in the viewer's home feed; see ``tweets.stream``."""
+
+    async def get(self, request, *args, **kwargs):
+        subscription = await stream.subscribe(request.user)
+        response = StreamingHttpResponse(stream.events(subscription), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        # Keep nginx from buffering the events.
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+
+class SearchView(LoginRequiredMixin, TemplateView):
+    template_name = "tweets/search.html"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        query = self.request.GET.get("q", "").strip()
+        cursor = self.request.GET.get("cursor")
+        page_size = settings.TWEET_PAGE_SIZE
+        results = search.search(query, page_size + 1, search.decode_cursor(cursor) if cursor else None)
+        page, has_next = results[:page_size], len(results) > page_size
+        tweets = Tweet.objects.select_related("user").in_bulk([tweet_id for tweet_id, _ in page])
+        tweet_list = [tweets[tweet_id] for tweet_id, _ in page if tweet_id in tweets]
+        context["query"] = query
+        context["tweet_list"] = tweet_list
+        context["card_list"] = cards.render_cards(tweet_list, ViewerState(self.request.user, tweet_list))
+        context["next_cursor"] = None
+        if has_next:
+            tweet_id, score = page[-1]
+            context["next_cursor"] = search.encode_cursor(score, tweet_id)
+        return context
+
+
+# The CSRF check reads request.POST, so post() runs it once the upload handlers are in place.
+@method_decorator(csrf_exempt, name="dispatch")
+class TweetCreateView(LoginRequiredMixin, RateLimitMixin, CreateView):
+    form_class = TweetForm
+    template_name = "tweets/create.html"
+    success_url = reverse_lazy("tweets:home")
+
+    def post(self, request, *args, **kwargs):
+        if int(request.META.get("CONTENT_LENGTH") or 0) > attachments.max_request_size():
+            return HttpResponse("ファイルが大きすぎます。", status=413)
+        request.upload_handlers = [attachments.AttachmentUploadHandler(request)]
+        return csrf_protect(super().post)(request, *args, **kwargs)
+
+    def form_valid(self, form):
+        form.instance.user = self.request.user
+        # In one transaction, so that no card of the tweet is rendered (and cached) without its images.
+        with transaction.atomic():
+            response = super().form_valid(form)
+            attachments.attach(self.object, form.cleaned_data["attachments"])
+        return response
+
+
+class AttachmentView(LoginRequiredMixin, View):
+    """An attachment image or one of its ``ATTACHMENT_VARIANTS``, by digest; see ``tweets.attachments``."""
+
+    def get(self, request, digest, variant):
+        if variant != attachments.ORIGINAL and variant not in settings.ATTACHMENT_VARIANTS:
+            raise Http404
+        content_type = Attachment.objects.filter(digest=digest).values_list("content_type", flat=True).first()
+        if content_type is None:
+            raise Http404
+        return attachments.serve(request, digest, variant, content_type)
+
+
+class TweetDetailView(LoginRequiredMixin, ConditionalGetMixin, DetailView):
+    template_name = "tweets/detail.html"
+    queryset = Tweet.objects.select_related("user")
+
+    def get_validator(self):
+        # The card version stamps cover edits, likes and deletion, so no query is needed.
+        return self.kwargs["pk"]
+
+    def get_conditional_tweets(self, context):
+        return [context["object"]]
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        (context["card"],) = cards.render_cards([self.object], ViewerState(self.request.user, [self.object]))
+        return context
+
+
+class TweetDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
+    model = Tweet
+    success_url = reverse_lazy("tweets:home")
+    http_method_names = ["post"]
+
+    def test_func(self):
+        return self.get_object().user_id == self.request.user.pk
+
+
+class LikeView(LoginRequiredMixin, RateLimitMixin, View):
+    def post(self, request, *args, **kwargs):
+        tweet = get_object_or_404(Tweet, pk=kwargs["pk"])
+        with transaction.atomic():
+            Like.objects.get_or_create(user=request.user, tweet=tweet)
+        return _like_response(tweet, liked=True)
+
+
+class UnlikeView(LoginRequiredMixin, RateLimitMixin, View):
+    def post(self, request, *args, **kwargs):
+        tweet = get_object_or_404(Tweet, pk=kwargs["pk"])
+        with transaction.atomic():
+            # Locked, so that of two concurrent unlikes only one deletes the row and decrements like_count.
+            like = Like.objects.select_for_update().filter(user=request.user, tweet=tweet).first()
+            if like is not None:
+                like.delete()
+        return _like_response(tweet, liked=False)
+
+
+class CardCacheStatsView(LoginRequiredMixin, UserPassesTestMixin, View):
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get(self, request, *args, **kwargs):
+        return JsonResponse(cards.stats())
+
+
+def _like_response(tweet, liked):
+    tweet.refresh_from_db(fields=["like_count"])
+    return JsonResponse({"liked": liked, "like_count": tweet.like_count})